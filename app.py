@@ -3,19 +3,27 @@ Description :   Main entry point of the app. Manages the user interface (likely
                 (like file uploads, cleaning options), and coordinates calling functions from other modules
             *** ADD OPTION TO DROP UNWANTED COLUMNS ***
 """
+import time
 from pathlib import Path
 
 import streamlit as st
 import pandas as pd
-import os
 
-from mcar_test import is_mcar
+from mcar_test import little_mcar_test, pattern_statistics
 import cca
+import missingness
 import visualizations as VG
 import imputation as I
-import nan_mapping
+import batch_imputation
+import comparison
+import profiler
+import loader
+import cache
+import instrumentation
+import jobs
 
-import streamlit as st
+# Derived frames (imputation overlays, column selections) share memory with the session frame until written
+pd.set_option("mode.copy_on_write", True)
 
 st.set_page_config(
     page_title="Phantom Spectrum",
@@ -24,6 +32,26 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def get_result_cache() -> cache.ResultCache:
+    # One cache per server process: survives reruns and is shared between sessions
+    return cache.ResultCache()
+
+
+results = get_result_cache()
+
+
+@st.cache_resource
+def get_job_runner() -> jobs.JobRunner:
+    # One pool per server process on the shared result cache: identical requests from any session run once
+    return jobs.JobRunner(cache=results)
+
+
+runner = get_job_runner()
+# This session's background jobs by slot, and the slots this rerun asked for (the others are released at the end)
+session_jobs = st.session_state.setdefault("jobs", {})
+used_slots = set()
+
 st.markdown("""
 <div style="display: flex; align-items: baseline;">
     <h1 style="margin-right: 10px;">👻 Phantom Spectrum</h1>
@@ -41,52 +69,141 @@ st.title("🧹 Missing Data Analysis")
 # Sidebar for dataset selection                                                                                         Sidebar for dataset selection
 st.sidebar.header("📂 Dataset Options")
 use_default = st.sidebar.radio("Choose dataset source:", ("sample dataset (healthcare)", "Upload your own"))
+random_seed = int(st.sidebar.number_input("Random imputation seed", min_value=0, value=0, step=1))
+cache_stats = results.stats()
+st.sidebar.caption(f"Result cache: {cache_stats['entries']} entries, {cache_stats['bytes'] / 1024 ** 2:.1f} of "
+                   f"{cache_stats['max_bytes'] / 1024 ** 2:.0f} MB, {cache_stats['hits']} hits")
+job_stats = runner.stats()
+st.sidebar.caption(f"Background jobs: {job_stats['running']} running, {job_stats['pending']} queued, "
+                   f"{job_stats['deduplicated']} shared, {job_stats['cancelled']} cancelled")
+streaming_profile = st.sidebar.checkbox("Streaming profile only (for files larger than memory)")
+persist_arrow = st.sidebar.checkbox("Keep the working dataset as a memory-mapped Arrow file",
+                                    help="Later steps open the file without parsing or copying it.")
+
+# Instrumentation: every analysis function called during this rerun is timed (see the panel at the bottom). Recording
+# is per session: enable() starts a fresh recorder for this rerun's context only
+profiling = st.sidebar.checkbox("Profile this rerun", key="profiling")
+if profiling:
+    instrumentation.enable(memory=st.sidebar.checkbox("Also trace peak memory (slower)", key="profile_memory"))
+else:
+    instrumentation.disable()
+
+# Streaming mode: profile the file chunk by chunk and stop, the dataframe is never loaded
+if streaming_profile:
+    if use_default == "sample dataset (healthcare)":
+        source = Path(__file__).parent / "healthcare_dataset.csv"
+    else:
+        source = st.sidebar.file_uploader("Upload a CSV file", type=["csv"], key="stream_upload")
+    if source is None:
+        st.warning("Please upload a CSV file to proceed.")
+        st.stop()
+
+    progress_bar = st.progress(0.0, text="Profiling...")
 
-# Load the dataset based on user selection
-df = None
+    def show_progress(rows_done, bytes_done, total_bytes):
+        fraction = min(bytes_done / total_bytes, 1.0) if total_bytes else 0.0
+        progress_bar.progress(fraction, text=f"Profiled {rows_done:,} rows")
+
+    profile = profiler.profile_csv(source, progress=show_progress)
+    st.header("📊 Streaming Missingness Profile")
+    st.dataframe(profile.nan_percentage_per_column().to_frame(name="Missing (%)"))
+    st.info(f"Data loss percent: {profile.data_loss_percentage()}% of {profile.total_rows:,} rows")
+    st.subheader("Missingness patterns")
+    st.dataframe(profile.pattern_frequencies())
+    st.stop()
+
+# Dataset source; the file itself is only read on demand (preview rows, schema, then the kept columns)
+source = None
 
 if use_default == "sample dataset (healthcare)":
     current_dir = Path(__file__).parent
-    default_path = current_dir / "healthcare_dataset.csv"
-
-    # Load the dataset
-    df = pd.read_csv(default_path)
+    source = current_dir / "healthcare_dataset.csv"
     st.success("Using default dataset - healthcare_dataset.csv")
 
 else:
-    uploaded_file = st.sidebar.file_uploader("Upload a CSV file", type=["csv"])
+    uploaded_file = st.sidebar.file_uploader("Upload a CSV, Parquet or Feather/Arrow file",
+                                             type=loader.UPLOAD_TYPES)
     if uploaded_file is not None:
-        df = pd.read_csv(uploaded_file)
+        source = uploaded_file
         st.success("Uploaded custom dataset.")
     else:
         st.warning("Please upload a CSV file to proceed.")
 
 
+def background(slot: str, label: str, func, *args, **kwargs):
+    """
+    Result of func(*args, **kwargs), computed by a background job held in `slot`. While it runs a progress bar is
+    shown in its place, None is returned and the page polls; a change of inputs cancels the previous job.
+    """
+    used_slots.add(slot)
+    job = runner.track(session_jobs, slot, func, *args, **kwargs)
+    job.wait(jobs.GRACE_SECONDS)
+    if job.state == jobs.DONE:
+        return job.result
+    if job.state == jobs.FAILED:
+        st.error(f"{label} failed. {job.error}")
+        return None
+    text = f"{label}: {job.message or job.state} ({job.seconds:.1f}s)"
+    st.progress(job.fraction or 0.0, text=text)
+    return None
+
+
+def session_connected() -> bool:
+    # A closed tab's session is kept for a while in case it reconnects; its script should not poll meanwhile
+    from streamlit import runtime
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx is None or not runtime.exists() or runtime.get_instance().is_active_session(ctx.session_id)
+
+
+@instrumentation.instrument
+def save_session_frame(frame: pd.DataFrame):
+    # Either keep the frame in the session, or persist it and keep only the path of the mapped file
+    if persist_arrow:
+        st.session_state.df_path = str(loader.working_copy(frame))
+        st.session_state.pop("df", None)
+    else:
+        st.session_state.df = frame
+        st.session_state.pop("df_path", None)
+
+
+@instrumentation.instrument
+def session_frame() -> pd.DataFrame:
+    if "df_path" in st.session_state:
+        return results.call(loader.open_arrow, Path(st.session_state.df_path))
+    return st.session_state.df
+
 
+def is_numeric(column: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
 
 
+def is_plottable(column: pd.Series) -> bool:
+    # Numeric columns and text in any representation: object, categorical or Arrow-backed strings
+    return (is_numeric(column) or pd.api.types.is_object_dtype(column)
+            or isinstance(column.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(column))
+
 
 # Store app state using session_state                                                                                   Store app state using session_state
 if "step" not in st.session_state:
     st.session_state.step = "preview"
 
-# Step 1: Dataset loaded and showing preview
-if df is not None and st.session_state.step == "preview":
+# Step 1: Dataset selected and showing preview (only the first rows are read)
+if source is not None and st.session_state.step == "preview":
 
     st.header("📄 Dataset Preview")
-    st.dataframe(df.head())
+    st.dataframe(results.call(loader.preview_dataset, source))
 
     if st.button("Continue with dropping columns"):
         st.session_state.step = "drop_columns"
-        st.session_state.df = df  # Save to session
 
 
-if df is not None:
+if source is not None:
     try:
         st.header('❗Missing values in column, drop if 30-40%')
         st.markdown("**recommendation:** *drop if >30%, because the data loss will be more than 30%, which is not okay for CCA*")
-        df = nan_mapping.nan_decoding(df)
-        nan_percentages = cca.nan_percentage_per_column(df)
+        nan_percentages = results.call(loader.missing_percentages, source)
         st.dataframe(nan_percentages.to_frame(name="Missing (%)"))
     except:
         pass
@@ -96,26 +213,66 @@ if df is not None:
 if st.session_state.step == "drop_columns":
     st.subheader(" 🗑️ Drop Unnecessary Columns")
 
-    df = st.session_state.df  # Load the saved dataframe
+    all_columns = results.call(loader.dataset_columns, source)
 
-    columns_to_drop = st.multiselect("Select columns to drop:", df.columns.tolist())
+    # Optional row filter, pushed down to the reader with the column selection
+    with st.expander("Keep only rows where..."):
+        filter_col = st.selectbox("Column", [None] + all_columns, key="filter_col")
+        filter_op = st.selectbox("Condition", ["==", "!=", "<", "<=", ">", ">="], key="filter_op")
+        filter_value = st.text_input("Value", key="filter_value")
+    filters = None
+    if filter_col is not None and filter_value != "":
+        try:
+            filters = [(filter_col, filter_op, float(filter_value))]
+        except ValueError:
+            filters = [(filter_col, filter_op, filter_value)]
+
+    columns_to_drop = st.multiselect("Select columns to drop:", all_columns)
+    live_preview = st.toggle("Live what-if preview", value=True, key="live_preview",
+                             help="Reads every column once and keeps per-pattern statistics, so the MCAR test and "
+                                  "the data loss update as columns are toggled. Turn off to read only the kept "
+                                  "columns when dropping.")
+
+    # Per-pattern sufficient statistics of the full frame: any selection is evaluated without touching the rows
+    stats = None
+    if live_preview:
+        full_df = results.call(loader.load_dataset, source, filters=filters)
+        stats = background("pattern_statistics", "What-if statistics", pattern_statistics, full_df)
+        if stats is not None:
+            try:
+                preview = stats.little_mcar_test(columns_to_drop)
+                preview_mcar = f"{preview.is_mcar} (p-value = {preview.p_value:.4f})"
+            except ValueError as e:
+                preview_mcar = f"n/a ({e})"
+            st.caption(f"What-if: MCAR {preview_mcar}, data loss {stats.data_loss_percentage(columns_to_drop)}%")
 
     if st.button("Drop Selected Columns"):
-        df = df.drop(columns=columns_to_drop)
-        st.session_state.df = df  # Update session state
+        if live_preview:
+            # The dropped frame's missingness index is derived from the full frame's instead of rebuilt
+            df = missingness.drop_columns(full_df, columns_to_drop)
+        else:
+            # Dropped columns are never read from the file
+            kept = [col for col in all_columns if col not in columns_to_drop]
+            df = results.call(loader.load_dataset, source, columns=kept, filters=filters)
+        save_session_frame(df)
         st.success(f"Dropped columns: {', '.join(columns_to_drop)}")
 
         st.write("🔍 Updated Data Preview:")
         st.dataframe(df.head())
+        st.image(results.call(VG.missingness_png, df, "matrix"))
 
         # ✅ Run MCAR test AFTER drop
         try:
-            is_data_mcar = is_mcar(df)
+            mcar_result = stats.little_mcar_test(columns_to_drop) if stats else results.call(little_mcar_test, df)
+            is_data_mcar = (f"{mcar_result.is_mcar} (p-value = {mcar_result.p_value:.4f}, "
+                            f"dof = {mcar_result.degrees_of_freedom}, "
+                            f"{len(mcar_result.skipped)} of {len(mcar_result.patterns)} patterns skipped)")
         except Exception as e:
             is_data_mcar = f"MCAR test failed. {e}"
 
         try:
-            data_loss = cca.data_loss_percentage(df)
+            data_loss = (stats.data_loss_percentage(columns_to_drop) if stats
+                         else results.call(cca.data_loss_percentage, df))
         except:
             data_loss = "text failed..."
 
@@ -125,92 +282,168 @@ if st.session_state.step == "drop_columns":
 
     if st.button("Continue with handling missing values"):
         st.session_state.step = "handle_missing_value"
-        st.session_state.df = df  # Save to session
+        if "df" not in st.session_state and "df_path" not in st.session_state:
+            save_session_frame(results.call(loader.load_dataset, source, filters=filters))
 
 # Step 3: graph representation                                                                                          Step 3: graph representation
 if st.session_state.step == "handle_missing_value":
 
     col1, col2 = st.columns(2)
-    df = st.session_state.df
-    cca_fig = None
-    imp_fig = None
+    df = session_frame()
+    cca_png = None
+    imp_png = None
 
     with col1:
         st.subheader("Complete Case Analysis (CCA)")
         st.write("No missing data handling options here.")
-        cca_df = cca.complete_case_analysis(df)
+        cca_df = results.call(cca.complete_case_analysis, df)
 
         # Select column to plot for CCA
-        cca_cols = [c for c in cca_df.columns if cca_df[c].dtype in ['int64', 'float64', 'object']]
+        cca_cols = [c for c in cca_df.columns if is_plottable(cca_df[c])]
         cca_col = st.selectbox("Select CCA column to visualize:", cca_cols, key="cca_col")
 
         # Numeric or categorical graph choices
-        if cca_df[cca_col].dtype in ['int64', 'float64']:
-            graph_type = st.selectbox("Select graph type:", ['box', 'hist', 'qq'], key="cca_graph")
-            # call your numeric visualization here
-            fig = VG.visualize_numeric_distribution(cca_df, cca_col, graph_type)
+        if is_numeric(cca_df[cca_col]):
+            graph_type = st.selectbox("Select graph type:", VG.NUMERIC_METHODS, key="cca_graph")
         else:
-            graph_type = st.selectbox("Select graph type:", ['pie', 'bar', 'heatmap', 'treemap'], key="cca_graph_cat")
-            fig = VG.visualize_categorical_distribution(cca_df, cca_col, graph_type)
+            graph_type = st.selectbox("Select graph type:", VG.CATEGORICAL_METHODS, key="cca_graph_cat")
 
-        cca_fig = fig
+        # Rendered PNGs are cached on (column fingerprint, graph type)
+        cca_png = background("cca_png", "CCA plot", VG.distribution_png, cca_df[cca_col], graph_type)
 
     with col2:
         st.subheader("Imputation")
 
-        df = st.session_state.df.copy()
+        df = session_frame()
 
         # 1. Select any column
-        all_cols = [col for col in df.columns if df[col].dtype in ['int64', 'float64', 'object']]
+        all_cols = [col for col in df.columns if is_plottable(df[col])]
         imp_col = st.selectbox("Select column to work on:", all_cols, key="imp_col")
 
         # 2. If column has missing values, show imputation method options
+        #    Only the selected column is imputed; the overlay shares every other column with the session frame
         if df[imp_col].isnull().sum() > 0:
             st.warning(f"Column '{imp_col}' has {df[imp_col].isnull().sum()} missing values.")
 
-            if df[imp_col].dtype in ['int64', 'float64']:
-                imp_method = st.selectbox(
-                    "Select imputation method:",
-                    ["mean", "median", "mode", "KNN", "Random"],
-                    key="imp_method_num"
-                )
-                if imp_method == "KNN":
-                    imputed_df = I.fill_numeric_with_knn_imputer(df.copy(),imp_col)
-                elif imp_method == "Random":
-                    imputed_df = I.fill_with_random_values(df.copy(),imp_col)
-                else:
-                    imputed_df = I.fill_numeric_columns(df.copy(), imp_col, imp_method)
+            # Only the methods that can impute this column (no MICE for text with too many distinct values)
+            if is_numeric(df[imp_col]):
+                imp_method = st.selectbox("Select imputation method:", I.methods_for(df[imp_col]),
+                                          key="imp_method_num")
             else:
-                imp_method = st.selectbox(
-                    "Select imputation method:",
-                    ["mode", "new_category", "Random"],
-                    key="imp_method_cat"
-                )
-                if imp_method == "Random":
-                    imputed_df = I.fill_with_random_values(df.copy(), imp_col)
-                else:
-                    imputed_df = I.fill_missing_object_columns(df.copy(),imp_col,imp_method)
+                imp_method = st.selectbox("Select imputation method:", I.methods_for(df[imp_col]),
+                                          key="imp_method_cat")
+            imputed = background("imputed", f"{imp_method} imputation", I.impute_column, df, imp_col, imp_method,
+                                 seed=random_seed)
+            imputed_df = I.with_imputed(df, {imp_col: imputed}) if imputed is not None else None
 
         else:
             st.success("No missing values in this column.")
-            imputed_df = df.copy()
+            imputed_df = df
 
-        # 4. Visualization
-        if imputed_df[imp_col].dtype in ['int64', 'float64']:
-            graph_type = st.selectbox("Select graph type:", ['box', 'hist', 'qq'], key="imp_graph")
-            fig = VG.visualize_numeric_distribution(imputed_df, imp_col, graph_type)
+        # 4. Visualization, once the imputation is done (imputing keeps a column numeric or categorical)
+        if is_numeric(df[imp_col]):
+            graph_type = st.selectbox("Select graph type:", VG.NUMERIC_METHODS, key="imp_graph")
         else:
-            graph_type = st.selectbox("Select graph type:", ['pie', 'bar', 'heatmap', 'treemap'], key="imp_graph_cat")
-            fig = VG.visualize_categorical_distribution(imputed_df, imp_col, graph_type)
+            graph_type = st.selectbox("Select graph type:", VG.CATEGORICAL_METHODS, key="imp_graph_cat")
 
-        imp_fig = fig
+        if imputed_df is not None:
+            imp_png = background("imp_png", "Imputation plot", VG.distribution_png, imputed_df[imp_col], graph_type)
 
     # NEW ROW FOR FIGURES
     fig_col1, fig_col2 = st.columns(2)
     with fig_col1:
-        st.pyplot(cca_fig)
+        if cca_png is not None:
+            st.image(cca_png)
     with fig_col2:
-        st.pyplot(imp_fig)
-
-
-
+        if imp_png is not None:
+            st.image(imp_png)
+
+    # Where values are missing, from the same missingness index CCA and the MCAR test use.
+    # Expander bodies run even when collapsed, so the background jobs below only start once switched on
+    with st.expander("🧩 Missingness map"):
+        missing_view = st.radio("View:", VG.MISSINGNESS_METHODS, horizontal=True, key="missing_view")
+        if st.toggle("Draw the missingness map", key="show_missing_map"):
+            missing_png = background("missing_png", "Missingness map", VG.missingness_png, session_frame(),
+                                     missing_view)
+            if missing_png is not None:
+                st.image(missing_png)
+
+    # Every column of CCA and of each imputation against the original at once, ranked by distribution shift
+    with st.expander("📏 Compare CCA and imputations"):
+        compare_methods = st.multiselect("Imputation methods:",
+                                         list(dict.fromkeys(I.NUMERIC_METHODS + I.OBJECT_METHODS)),
+                                         default=comparison.DEFAULT_METHODS, key="compare_methods")
+        comparison_table = None
+        if st.toggle("Run the comparison", key="run_comparison"):
+            comparison_table = background("comparison", "Comparison", comparison.compare_methods, session_frame(),
+                                          tuple(compare_methods), seed=random_seed)
+        if comparison_table is not None:
+            st.caption("Shift is the KS statistic for numeric columns and the total variation distance for "
+                       "categorical ones; rank 1 is the closest to the original.")
+            st.dataframe(comparison.summarize(comparison_table))
+            st.dataframe(comparison_table, hide_index=True)
+
+    # Whole-dataset cleaning: one method per column, independent columns imputed concurrently
+    with st.expander("🧰 Impute every column"):
+        df = session_frame()
+        batch_num = st.selectbox("Default method for numeric columns:", I.NUMERIC_METHODS, index=1, key="batch_num")
+        batch_obj = st.selectbox("Default method for other columns:", I.OBJECT_METHODS, key="batch_obj")
+        plan = batch_imputation.default_plan(df, batch_num, batch_obj)
+        fallback = [col for col, method in plan.items() if not is_numeric(df[col]) and method != batch_obj]
+        if fallback:
+            st.caption(f"{batch_obj} cannot impute {', '.join(map(str, fallback))} (too many distinct values); "
+                       f"mode is used instead.")
+
+        plan_df = st.data_editor(
+            pd.DataFrame({"method": pd.Series(plan, dtype=object)}),
+            column_config={"method": st.column_config.SelectboxColumn(
+                "method", options=list(dict.fromkeys(I.NUMERIC_METHODS + I.OBJECT_METHODS)), required=True)},
+            key="batch_plan",
+        )
+        executor = st.radio("Run columns in:", ["thread", "process", "serial"], horizontal=True, key="batch_executor")
+
+        if st.button("Impute all columns"):
+            try:
+                # MICE columns warm-start from the previous run's fitted models when the frame still fits them
+                result = batch_imputation.impute_plan(df, plan_df["method"].to_dict(), executor=executor,
+                                                      seed=random_seed, warm_start=st.session_state.get("mice_state"))
+                st.success(f"Imputed {len(result.columns)} columns in {result.seconds:.2f}s.")
+                st.dataframe(result.timings)
+                if result.mice is not None:
+                    st.session_state.mice_state = result.mice.state
+                    n_iter = len(result.mice.iterations)
+                    st.caption(f"MICE: {n_iter} iteration{'s' if n_iter != 1 else ''}, "
+                               f"{'converged' if result.mice.converged else 'stopped at the iteration limit'}"
+                               f"{', warm-started' if result.mice.warm_started else ''}.")
+                    st.dataframe(result.mice.iterations, hide_index=True)
+                st.download_button("Download cleaned CSV", result.apply(df).to_csv(index=False).encode(),
+                                   file_name="cleaned_dataset.csv", mime="text/csv")
+            except Exception as e:
+                st.error(f"Imputation failed. {e}")
+
+
+# Where this rerun spent its time: instrumented calls (cache misses only) against the whole rerun
+if profiling:
+    with st.expander("⏱ Profiling"):
+        calls = instrumentation.spans_frame()
+        top_level = calls.loc[calls["depth"] == 0, "wall"].sum()
+        total = instrumentation.elapsed()
+        st.caption(f"{len(calls)} instrumented calls; {top_level:.2f}s of this {total:.2f}s rerun, the rest is "
+                   f"Streamlit rendering and uninstrumented code.")
+        st.dataframe(instrumentation.summary())
+        st.dataframe(calls, hide_index=True)
+        st.download_button("Download JSON", instrumentation.to_json(), file_name="profile.json",
+                           mime="application/json")
+        st.download_button("Download Chrome trace", instrumentation.to_chrome_trace(), file_name="trace.json",
+                           mime="application/json", help="Open in chrome://tracing or ui.perfetto.dev")
+
+# Jobs of slots this rerun no longer shows are released (cancelled unless another session shares them); while
+# any of the rest is unfinished the page reruns to pick up its progress. A session that ended releases them all;
+# one that stopped mid-rerun is closed by the runner once it has not been seen for jobs.SESSION_TIMEOUT seconds
+runner.prune(session_jobs, used_slots)
+if any(not job.finished for job in session_jobs.values()):
+    time.sleep(jobs.POLL_SECONDS)
+    if not session_connected():
+        runner.close(session_jobs)
+        st.stop()
+    st.rerun()
@@ -0,0 +1,311 @@
+"""
+Description :   Execution backends for CCA, the simple imputations (mean / median / mode / new_category) and NaN
+                statistics, so the same calls work on an in-memory frame or on a dataset larger than memory:
+            *    1. PandasBackend: the in-memory functions of cca.py, imputation.py and profiler.py
+            *    2. PartitionedBackend: Parquet partitions on disk, processed by a pool of local processes.
+                    Each worker reads one partition at a time; statistics are combined from mergeable
+                    per-partition summaries (exact sums for the mean, quantile sketches for the median,
+                    heavy-hitter counters for the mode) and results are written partition by partition,
+                    so peak memory is a few partitions whatever the dataset size.
+
+Methods:    get_backend(name: str, **options) -> PandasBackend | PartitionedBackend
+            PartitionedDataset.from_path(path) -> PartitionedDataset
+            partition_csv(source, directory, rows_per_partition: int, nan_indicator: list) -> PartitionedDataset
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import reduce
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import cca
+import imputation as I
+from nan_mapping import NAN_INDICATORS
+from profiler import MissingnessProfile
+from sketches import HeavyHitters, QuantileSketch
+
+# Methods every backend supports; KNN and the random methods need the whole column at once
+METHODS = ["mean", "median", "mode", "new_category"]
+
+
+def _check_plan(plan: dict):
+    unsupported = {col: method for col, method in plan.items() if method not in METHODS}
+    if unsupported:
+        raise ValueError(f"Methods not supported out of core: {unsupported}. Use one of {METHODS}.")
+
+
+@dataclass
+class PartitionedDataset:
+    """
+    A dataset stored as Parquet partitions: whole files, or groups of row groups of one large file.
+
+    Attributes:
+    - partitions (list): (path, row groups or None for the whole file) per partition.
+    """
+    partitions: list
+
+    @classmethod
+    def from_path(cls, path, row_groups_per_partition: int = 1) -> "PartitionedDataset":
+        """
+        A directory of Parquet files (one partition each, in name order) or a single Parquet file (partitioned
+        by its row groups).
+        """
+        path = Path(path)
+        if path.is_dir():
+            return cls([(str(file), None) for file in sorted(path.glob("*.parquet"))])
+        groups = pq.ParquetFile(path).metadata.num_row_groups
+        return cls([(str(path), list(range(start, min(start + row_groups_per_partition, groups))))
+                    for start in range(0, groups, row_groups_per_partition)])
+
+    def read(self, i: int, columns=None) -> pd.DataFrame:
+        path, row_groups = self.partitions[i]
+        if row_groups is None:
+            return pd.read_parquet(path, columns=columns)
+        return pq.ParquetFile(path).read_row_groups(row_groups, columns=columns).to_pandas()
+
+    @property
+    def columns(self) -> list:
+        return pq.ParquetFile(self.partitions[0][0]).schema_arrow.names if self.partitions else []
+
+    @property
+    def num_rows(self) -> int:
+        rows = 0
+        for path, row_groups in self.partitions:
+            metadata = pq.ParquetFile(path).metadata
+            groups = range(metadata.num_row_groups) if row_groups is None else row_groups
+            rows += sum(metadata.row_group(g).num_rows for g in groups)
+        return rows
+
+    def to_pandas(self) -> pd.DataFrame:
+        """
+        Concatenates every partition; only for results known to fit in memory.
+        """
+        return pd.concat([self.read(i) for i in range(len(self.partitions))], ignore_index=True)
+
+
+def _retype_as_text(paths: list, col: str):
+    # Rewrites a column of the partitions written so far as text
+    for path, _ in paths:
+        frame = pd.read_parquet(path)
+        frame[col] = frame[col].astype("string[pyarrow]")
+        frame.to_parquet(path, index=False)
+
+
+def partition_csv(source, directory, rows_per_partition: int = 1_000_000, nan_indicator=None,
+                  **read_csv_kwargs) -> PartitionedDataset:
+    """
+    Splits a CSV (optionally compressed) into Parquet partitions in one streaming pass, mapping the missing-value
+    sentinels to NaN. Numeric columns are stored as float64 and everything else as text, so every partition
+    shares one schema whatever its chunk contained.
+
+    A column is numeric if the first chunk parsed it as numbers. A later chunk holding text in it never turns that
+    text into NaN: a column with no value observed so far becomes text in every partition, any other is an error.
+
+    Raises:
+    - ValueError if a later chunk holds text in a column with numbers in an earlier one; pass dtype={column: str}
+      to read it as text.
+    """
+    if nan_indicator is None:
+        nan_indicator = NAN_INDICATORS
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    paths, numeric, observed = [], None, set()
+    with pd.read_csv(source, chunksize=rows_per_partition, na_values=nan_indicator, **read_csv_kwargs) as reader:
+        for i, chunk in enumerate(reader):
+            if numeric is None:
+                numeric = {col: pd.api.types.is_numeric_dtype(chunk[col]) and not pd.api.types.is_bool_dtype(chunk[col])
+                           for col in chunk.columns}
+
+            columns = {}
+            for col in chunk.columns:
+                if numeric[col]:
+                    values = pd.to_numeric(chunk[col], errors="coerce").astype(np.float64)
+                    # Step 1: Coercion must not add missing values; text in an all-missing column re-types it
+                    coerced = values.isna() & chunk[col].notna()
+                    if coerced.any():
+                        if col in observed:
+                            raise ValueError(
+                                f"Column '{col}' is numeric in earlier rows but holds '{chunk[col][coerced].iloc[0]}' "
+                                f"in partition {i}; pass dtype={{'{col}': str}} to read it as text")
+                        numeric[col] = False
+                        _retype_as_text(paths, col)
+                    elif values.notna().any():
+                        observed.add(col)
+                if not numeric[col]:
+                    values = chunk[col].astype("string[pyarrow]")
+                columns[col] = values
+            chunk = pd.DataFrame(columns)
+            path = directory / f"part-{i:05d}.parquet"
+            chunk.to_parquet(path, index=False)
+            paths.append((str(path), None))
+    return PartitionedDataset(paths)
+
+
+class PandasBackend:
+    """
+    In-memory execution on a pd.DataFrame, with the same methods as PartitionedBackend.
+    """
+    name = "pandas"
+
+    def nan_statistics(self, data: pd.DataFrame) -> MissingnessProfile:
+        return MissingnessProfile().update(data)
+
+    def complete_case_analysis(self, data: pd.DataFrame, output=None) -> pd.DataFrame:
+        result = cca.complete_case_analysis(data)
+        if output is not None:
+            result.to_parquet(output, index=False)
+        return result
+
+    def impute(self, data: pd.DataFrame, plan: dict, output=None) -> pd.DataFrame:
+        _check_plan(plan)
+        result = I.with_imputed(data, {col: I.impute_column(data, col, method) for col, method in plan.items()})
+        if output is not None:
+            result.to_parquet(output, index=False)
+        return result
+
+
+# Per-partition work. Top-level functions so the process pool can pickle them; each reads its own partition.
+
+def _partition_profile(dataset: PartitionedDataset, i: int) -> MissingnessProfile:
+    return MissingnessProfile().update(dataset.read(i))
+
+
+def _partition_cca(dataset: PartitionedDataset, i: int, output: str) -> str:
+    path = Path(output) / f"part-{i:05d}.parquet"
+    cca.complete_case_analysis(dataset.read(i)).to_parquet(path, index=False)
+    return str(path)
+
+
+def _partition_summaries(dataset: PartitionedDataset, i: int, plan: dict, quantile_size: int,
+                         capacity: int) -> dict:
+    # Column -> mergeable summary of what its method needs
+    frame = dataset.read(i, columns=list(plan))
+    summaries = {}
+    for col, method in plan.items():
+        column = frame[col]
+        if method == "mean":
+            values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+            summaries[col] = np.array([np.nansum(values), np.count_nonzero(~np.isnan(values))])
+        elif method == "median":
+            summaries[col] = QuantileSketch.from_values(column.to_numpy(dtype=np.float64, na_value=np.nan),
+                                                        quantile_size)
+        elif method == "mode":
+            summaries[col] = HeavyHitters.from_series(column, capacity)
+    return summaries
+
+
+def _fill(column: pd.Series, value) -> pd.Series:
+    if value is None or (isinstance(value, float) and np.isnan(value)) or not column.isnull().any():
+        return column
+    if isinstance(column.dtype, pd.CategoricalDtype) and value not in column.cat.categories:
+        column = column.cat.add_categories([value])
+    return column.fillna(value)
+
+
+def _partition_impute(dataset: PartitionedDataset, i: int, plan: dict, values: dict, output: str) -> str:
+    frame = dataset.read(i)
+    columns = {}
+    for col, method in plan.items():
+        if method == "new_category":
+            columns[col] = I.impute_object(frame[col], "new_category")
+        else:
+            columns[col] = _fill(frame[col], values[col])
+    path = Path(output) / f"part-{i:05d}.parquet"
+    I.with_imputed(frame, columns).to_parquet(path, index=False)
+    return str(path)
+
+
+class PartitionedBackend:
+    """
+    Out-of-core execution over a PartitionedDataset (or a path PartitionedDataset.from_path accepts).
+
+    Parameters:
+    - max_workers (int): Worker processes, defaults to the number of CPUs; 1 runs in this process.
+    - quantile_size (int): Points per median sketch; the median's rank error shrinks with it.
+    - heavy_hitters (int): Counters per mode sketch.
+    """
+    name = "partitioned"
+
+    def __init__(self, max_workers: int = None, quantile_size: int = 2048, heavy_hitters: int = 64):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.quantile_size = quantile_size
+        self.heavy_hitters = heavy_hitters
+
+    def _map(self, func, dataset: PartitionedDataset, *args) -> list:
+        indexes = range(len(dataset.partitions))
+        if self.max_workers == 1 or len(dataset.partitions) <= 1:
+            return [func(dataset, i, *args) for i in indexes]
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(dataset.partitions))) as pool:
+            return list(pool.map(func, [dataset] * len(indexes), indexes, *[[arg] * len(indexes) for arg in args]))
+
+    @staticmethod
+    def _dataset(data) -> PartitionedDataset:
+        return data if isinstance(data, PartitionedDataset) else PartitionedDataset.from_path(data)
+
+    @staticmethod
+    def _output(output) -> str:
+        if output is None:
+            raise ValueError("The partitioned backend writes its results: pass an output directory.")
+        Path(output).mkdir(parents=True, exist_ok=True)
+        return str(output)
+
+    def nan_statistics(self, data) -> MissingnessProfile:
+        """
+        Missingness profile (NaN counts, CCA row loss, pattern frequencies) merged from every partition.
+        """
+        return reduce(MissingnessProfile.merge, self._map(_partition_profile, self._dataset(data)),
+                      MissingnessProfile())
+
+    def complete_case_analysis(self, data, output) -> PartitionedDataset:
+        """
+        Drops incomplete rows partition by partition into `output`; returns the written partitions.
+        """
+        dataset = self._dataset(data)
+        return PartitionedDataset([(path, None) for path in self._map(_partition_cca, dataset, self._output(output))])
+
+    def fill_values(self, data, plan: dict) -> dict:
+        """
+        Column -> value used to fill it: exact mean, sketched median, sketched mode (None for new_category).
+        """
+        _check_plan(plan)
+        dataset = self._dataset(data)
+        summarized = {col: method for col, method in plan.items() if method != "new_category"}
+        partials = self._map(_partition_summaries, dataset, summarized, self.quantile_size, self.heavy_hitters)
+
+        values = {col: None for col in plan}
+        for col, method in summarized.items():
+            merged = reduce(lambda a, b: a + b, (partial[col] for partial in partials))
+            if method == "mean":
+                values[col] = merged[0] / merged[1] if merged[1] else np.nan
+            elif method == "median":
+                values[col] = merged.median()
+            else:
+                values[col] = merged.mode()
+        return values
+
+    def impute(self, data, plan: dict, output) -> PartitionedDataset:
+        """
+        Two passes: summaries of the planned columns from every partition, then every partition filled and
+        written to `output`. Returns the written partitions.
+        """
+        dataset = self._dataset(data)
+        values = self.fill_values(dataset, plan)
+        paths = self._map(_partition_impute, dataset, plan, values, self._output(output))
+        return PartitionedDataset([(path, None) for path in paths])
+
+
+BACKENDS = {PandasBackend.name: PandasBackend, PartitionedBackend.name: PartitionedBackend}
+
+
+def get_backend(name: str = "pandas", **options):
+    """
+    Backend by name ('pandas' or 'partitioned'), constructed with `options`.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Use one of {list(BACKENDS)}.")
+    return BACKENDS[name](**options)
@@ -0,0 +1,194 @@
+"""
+Description :   Runs an imputation plan (column -> method) over a whole dataframe, imputing independent columns
+                concurrently in a thread or process pool.
+
+                In process mode the numeric columns are handed to the workers through one shared-memory block
+                (and written back through another), so the frame is never pickled; only non-numeric columns
+                travel to the workers individually.
+
+                Columns planned for MICE depend on each other, so they are imputed together by one chained run
+                (mice.py) next to the pool, and that run can be warm-started from the previous one.
+
+Methods:    default_plan(df: pd.DataFrame, numeric_method: str, object_method: str) -> dict
+            impute_plan(df: pd.DataFrame, plan: dict, executor: str, max_workers: int, seed: int,
+                        warm_start: MICEState) -> BatchResult
+"""
+import contextvars
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import imputation as I
+
+
+@dataclass
+class BatchResult:
+    """
+    Attributes:
+    - columns (dict): Column name -> imputed pd.Series.
+    - timings (pd.DataFrame): One row per planned column with its method, missing count and seconds spent.
+    - seconds (float): Wall time of the whole run.
+    - mice (MICEResult): The chained run of the MICE columns (iteration costs, state for a warm start), if any.
+    """
+    columns: dict
+    timings: pd.DataFrame
+    seconds: float
+    mice: object = None
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Overlays the imputed columns on `df` (see imputation.with_imputed).
+        """
+        return I.with_imputed(df, self.columns)
+
+
+def _is_numeric(column: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
+
+
+def default_plan(df: pd.DataFrame, numeric_method: str = "median", object_method: str = "mode") -> dict:
+    """
+    Plan imputing every column with missing values: `numeric_method` for numeric columns,
+    `object_method` for the rest. Columns `object_method` cannot impute (MICE on text with too many distinct
+    values, see imputation.methods_for) get "mode" instead.
+    """
+    plan = {}
+    for col in df.columns:
+        if df[col].isnull().any():
+            method = numeric_method if _is_numeric(df[col]) else object_method
+            plan[col] = method if method in I.methods_for(df[col]) else "mode"
+    return plan
+
+
+def _impute_timed(df: pd.DataFrame, col, method: str, seed):
+    start = time.perf_counter()
+    imputed = I.impute_column(df, col, method, seed=seed)
+    return imputed, time.perf_counter() - start
+
+
+def _shared_worker(block_name: str, out_name: str, shape: tuple, numeric_cols: list, col, method: str, seed,
+                   column: pd.Series = None):
+    # Attach to the shared numeric block: a (columns, rows) array, one contiguous buffer per column
+    block = shared_memory.SharedMemory(name=block_name)
+    out = shared_memory.SharedMemory(name=out_name)
+    try:
+        values = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+        frame = pd.DataFrame({c: values[j] for j, c in enumerate(numeric_cols)}, copy=False)
+        if column is not None:
+            frame[col] = column
+
+        imputed, seconds = _impute_timed(frame, col, method, seed)
+
+        if column is None:
+            np.ndarray(shape, dtype=np.float64, buffer=out.buf)[numeric_cols.index(col)] = imputed.to_numpy()
+            return None, seconds
+        return imputed.reset_index(drop=True), seconds
+    finally:
+        block.close()
+        out.close()
+
+
+def _run_processes(df: pd.DataFrame, plan: dict, max_workers: int, seed) -> dict:
+    numeric_cols = [c for c in df.columns if _is_numeric(df[c])]
+    shape = (len(numeric_cols), len(df))
+    nbytes = max(int(np.prod(shape)) * 8, 1)
+
+    block = shared_memory.SharedMemory(create=True, size=nbytes)
+    out = shared_memory.SharedMemory(create=True, size=nbytes)
+    try:
+        values = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+        for j, c in enumerate(numeric_cols):
+            values[j] = df[c].to_numpy(dtype=np.float64, na_value=np.nan)
+
+        results = {}
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {}
+            for col, method in plan.items():
+                column = None if col in numeric_cols else df[col].reset_index(drop=True)
+                futures[col] = pool.submit(_shared_worker, block.name, out.name, shape, numeric_cols, col, method,
+                                           seed, column)
+
+            imputed_block = np.ndarray(shape, dtype=np.float64, buffer=out.buf)
+            for col, future in futures.items():
+                imputed, seconds = future.result()
+                if imputed is None:
+                    array = imputed_block[numeric_cols.index(col)].copy()
+                    if df[col].dtype == np.float32:
+                        array = array.astype(np.float32)
+                    imputed = pd.Series(array, name=col)
+                imputed.index = df.index
+                results[col] = (imputed, seconds)
+        return results
+    finally:
+        for shm in (block, out):
+            shm.close()
+            shm.unlink()
+
+
+def impute_plan(df: pd.DataFrame, plan: dict, executor: str = "thread", max_workers: int = None,
+                seed=None, warm_start=None) -> BatchResult:
+    """
+    Imputes every column of a plan, running independent columns concurrently.
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe, not modified.
+    - plan (dict): Column name -> method, any of imputation.NUMERIC_METHODS / imputation.OBJECT_METHODS.
+    - executor (str): 'thread', 'process' (shared-memory hand-off) or 'serial'.
+    - max_workers (int): Pool size, defaults to the number of CPUs.
+    - seed (int): Seed for the random methods.
+    - warm_start (MICEState): State of a previous run's MICE columns (BatchResult.mice.state).
+
+    Returns:
+    - BatchResult: Imputed columns and per-column timings.
+
+    Raises:
+    - ValueError: If a method is unknown or cannot impute its column (see imputation.methods_for).
+    """
+    unknown = {col: m for col, m in plan.items() if m not in I.NUMERIC_METHODS + I.OBJECT_METHODS}
+    if unknown:
+        raise ValueError(f"Unknown methods in plan: {unknown}.")
+    # Checked before anything runs, and the same for every executor: a text fill for a numeric column would not fit
+    # the float64 block the process workers write to
+    unsupported = {col: m for col, m in plan.items() if m not in I.methods_for(df[col])}
+    if unsupported:
+        raise ValueError(f"Methods not applicable to these columns: {unsupported}. "
+                         f"Numeric columns take {I.NUMERIC_METHODS}, the others {I.OBJECT_METHODS}.")
+    if executor not in ("process", "thread", "serial"):
+        raise ValueError(f"Unknown executor '{executor}'. Use 'thread', 'process' or 'serial'.")
+    max_workers = max_workers or os.cpu_count()
+
+    start = time.perf_counter()
+    mice_columns = [col for col, method in plan.items() if method == "MICE"]
+    independent = {col: method for col, method in plan.items() if method != "MICE"}
+    mice = None
+    if mice_columns:
+        from mice import impute_mice
+
+        mice = impute_mice(df, columns=mice_columns, warm_start=warm_start,
+                           max_workers=1 if executor == "serial" else max_workers)
+
+    if executor == "process":
+        results = _run_processes(df, independent, max_workers, seed)
+    elif executor == "thread":
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            # Each worker runs in a copy of the caller's context, so its calls are profiled with the caller's
+            futures = {col: pool.submit(contextvars.copy_context().run, _impute_timed, df, col, method, seed)
+                       for col, method in independent.items()}
+            results = {col: future.result() for col, future in futures.items()}
+    else:
+        results = {col: _impute_timed(df, col, method, seed) for col, method in independent.items()}
+    if mice is not None:
+        results.update({col: (mice.columns[col], mice.column_seconds[col]) for col in mice_columns})
+    seconds = time.perf_counter() - start
+
+    timings = pd.DataFrame({
+        "method": pd.Series(plan),
+        "missing": pd.Series({col: int(df[col].isnull().sum()) for col in plan}, dtype="int64"),
+        "seconds": pd.Series({col: results[col][1] for col in plan}, dtype="float64"),
+    })
+    return BatchResult({col: results[col][0] for col in plan}, timings, seconds, mice)
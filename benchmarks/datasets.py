@@ -0,0 +1,67 @@
+"""
+Description :   Synthetic and scaled-up datasets for the benchmarks.
+
+Methods:    make_synthetic(rows, numeric_columns, categorical_columns, missing_rate, mechanism, seed) -> pd.DataFrame
+            scaled_healthcare(factor: int) -> pd.DataFrame
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MECHANISMS = ["MCAR", "MAR", "MNAR"]
+HEALTHCARE_CSV = Path(__file__).resolve().parent.parent / "healthcare_dataset.csv"
+
+
+def _missing_mask(values: np.ndarray, driver: np.ndarray, missing_rate: float, mechanism: str,
+                  rng: np.random.Generator) -> np.ndarray:
+    """
+    Boolean mask with on average `missing_rate` missing entries in every column of `values`.
+
+    - MCAR: independent of the data.
+    - MAR: depends on the fully observed `driver` column (rows with a high driver value go missing more often).
+    - MNAR: depends on the value itself (high values go missing more often).
+    """
+    if mechanism not in MECHANISMS:
+        raise ValueError(f"Unknown mechanism '{mechanism}'. Use one of {MECHANISMS}.")
+    if mechanism == "MCAR":
+        return rng.random(values.shape) < missing_rate
+
+    # Logistic weight on the ranked score, rescaled so the expected missing rate stays at missing_rate
+    score = driver[:, None] if mechanism == "MAR" else values
+    ranks = score.argsort(axis=0).argsort(axis=0) / max(len(score) - 1, 1)
+    weight = 1 / (1 + np.exp(-6 * (ranks - 0.5)))
+    probability = np.clip(weight * missing_rate / weight.mean(axis=0), 0, 1)
+    return rng.random(values.shape) < np.broadcast_to(probability, values.shape)
+
+
+def make_synthetic(rows: int, numeric_columns: int = 6, categorical_columns: int = 3, missing_rate: float = 0.1,
+                   mechanism: str = "MCAR", seed: int = 0) -> pd.DataFrame:
+    """
+    Correlated numeric columns and low-cardinality categorical columns with missing values injected by the given
+    mechanism. Column 'driver' is always fully observed (it drives MAR missingness).
+    """
+    rng = np.random.default_rng(seed)
+    driver = rng.standard_normal(rows)
+    loadings = rng.uniform(0.2, 0.8, numeric_columns)
+    numeric = driver[:, None] * loadings + rng.standard_normal((rows, numeric_columns))
+    numeric[_missing_mask(numeric, driver, missing_rate, mechanism, rng)] = np.nan
+
+    frame = {"driver": driver}
+    frame.update({f"num_{j}": numeric[:, j] for j in range(numeric_columns)})
+
+    levels = np.array(["alpha", "beta", "gamma", "delta", "epsilon"])
+    for j in range(categorical_columns):
+        codes = np.clip((driver * (j + 1) + rng.standard_normal(rows)).round().astype(np.int64) + 2, 0, 4)
+        mask = _missing_mask(codes[:, None].astype(float), driver, missing_rate, mechanism, rng)[:, 0]
+        frame[f"cat_{j}"] = pd.Categorical.from_codes(np.where(mask, -1, codes), categories=levels)
+
+    return pd.DataFrame(frame)
+
+
+def scaled_healthcare(factor: int = 1) -> pd.DataFrame:
+    """
+    The bundled healthcare_dataset.csv as read by pd.read_csv (raw object columns), repeated `factor` times.
+    """
+    raw = pd.read_csv(HEALTHCARE_CSV)
+    return pd.concat([raw] * factor, ignore_index=True) if factor > 1 else raw
@@ -0,0 +1,72 @@
+"""
+Description :   Import-time budget for the app's cold start. Imports the modules app.py loads before the preview step
+                in a fresh interpreter under `python -X importtime`, then fails (exit code 1) if a heavy dependency
+                that should only load on first use is imported, or if the total import time exceeds the budget.
+
+Usage:      python benchmarks/import_time.py --budget-ms 1500
+            (tests/test_import_time.py runs the same checks; the budget only with pytest --timing)
+"""
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Imported by app.py at start-up
+APP_MODULES = ["streamlit", "pandas", "cca", "loader", "cache", "profiler", "mcar_test", "missingness", "imputation",
+               "batch_imputation", "comparison", "visualizations", "instrumentation", "jobs"]
+
+# Total import time allowed, in milliseconds
+BUDGET_MS = 1500.0
+
+# Must only be imported when a step that needs them runs
+DEFERRED = ["scipy", "sklearn", "matplotlib", "seaborn", "squarify"]
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_profile(modules: list) -> dict:
+    """
+    Imports `modules` in a fresh interpreter and returns {top-level package: cumulative microseconds}.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    profile = {}
+    for match in LINE.finditer(completed.stderr):
+        _, cumulative, indent, name = match.groups()
+        # Only outermost imports: their cumulative time already includes everything they pulled in
+        if len(indent) == 1:
+            package = name.split(".")[0]
+            profile[package] = profile.get(package, 0) + int(cumulative)
+    loaded = {m.group(4).split(".")[0] for m in LINE.finditer(completed.stderr)}
+    return {"cumulative_us": profile, "loaded": loaded}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="total import time allowed")
+    parser.add_argument("--modules", nargs="*", default=APP_MODULES)
+    parser.add_argument("--top", type=int, default=10, help="slowest packages listed")
+    args = parser.parse_args(argv)
+
+    result = import_profile(args.modules)
+    total_ms = sum(result["cumulative_us"].values()) / 1000
+
+    for package, us in sorted(result["cumulative_us"].items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{us / 1000:9.1f} ms  {package}")
+    print(f"{total_ms:9.1f} ms  total (budget {args.budget_ms:.0f} ms)")
+
+    failures = [f"'{name}' is imported at start-up" for name in DEFERRED if name in result["loaded"]]
+    if total_ms > args.budget_ms:
+        failures.append(f"import time {total_ms:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+Description :   Times and measures the peak memory of every analysis, imputation and plotting function on synthetic
+                (MCAR / MAR / MNAR) and scaled healthcare datasets, and writes the results to JSON so runs can be
+                compared for regressions.
+
+Usage:      python benchmarks/run_benchmarks.py --rows 10000 100000 --output results.json
+            python benchmarks/run_benchmarks.py --output new.json --compare results.json --threshold 1.25
+"""
+import argparse
+import json
+import platform
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import cca  # noqa: E402
+import comparison  # noqa: E402
+import imputation as I  # noqa: E402
+import loader  # noqa: E402
+import mcar_test  # noqa: E402
+import mice  # noqa: E402
+import missingness  # noqa: E402
+import nan_mapping  # noqa: E402
+import visualizations as VG  # noqa: E402
+from datasets import MECHANISMS, make_synthetic, scaled_healthcare  # noqa: E402
+
+
+@dataclass
+class Case:
+    """
+    A benchmarked call. `setup(frame)` builds the arguments outside the timed region, once per repeat, so
+    functions that modify their input always start from a fresh copy.
+    """
+    name: str
+    func: object
+    setup: object
+    inputs: str = "compact"  # 'compact' (decoded frame) or 'raw' (object columns as read from CSV)
+
+
+def _numeric_col(df):
+    return next(c for c in df.columns if c.startswith("num_") or c == "Age")
+
+
+def _object_col(df):
+    return next(c for c in df.columns if c.startswith("cat_") or c == "Gender")
+
+
+def _cases() -> list:
+    num, obj = _numeric_col, _object_col
+    cases = [
+        Case("nan_mapping.nan_decoding", nan_mapping.nan_decoding, lambda df: (df.copy(),), "raw"),
+        Case("nan_mapping.decode_nans", nan_mapping.decode_nans, lambda df: (df,), "raw"),
+        # Shallow copies: a new frame object, so the missingness index is built inside the timed call
+        Case("missingness.missingness_index", missingness.missingness_index, lambda df: (df.copy(deep=False),)),
+        Case("cca.complete_case_analysis", cca.complete_case_analysis, lambda df: (df.copy(deep=False),)),
+        Case("cca.data_loss_percentage", cca.data_loss_percentage, lambda df: (df.copy(deep=False),)),
+        Case("cca.nan_percentage_per_column", cca.nan_percentage_per_column, lambda df: (df.copy(deep=False),)),
+        Case("mcar_test.is_mcar", mcar_test.is_mcar, lambda df: (df.copy(deep=False),)),
+        Case("mcar_test.pattern_statistics", mcar_test.pattern_statistics, lambda df: (df.copy(deep=False),)),
+        # What-if after dropping one column, from statistics built outside the timed call
+        Case("mcar_test.PatternStatistics.little_mcar_test", mcar_test.PatternStatistics.little_mcar_test,
+             lambda df: (mcar_test.pattern_statistics(df), [num(df)])),
+        # Comparison of candidates built outside the timed call
+        Case("comparison.compare_distributions", comparison.compare_distributions,
+             lambda df: (df.copy(deep=False), comparison.imputation_candidates(df, seed=0))),
+        Case("imputation.impute_random", I.impute_random, lambda df: (df[num(df)], 0)),
+        Case("imputation.impute_random_columns", I.impute_random_columns, lambda df: (df, None, 0, True)),
+        Case("imputation.impute_knn", I.impute_knn, lambda df: (df, num(df))),
+        Case("mice.impute_mice", mice.impute_mice, lambda df: (df,)),
+        Case("imputation.impute_numeric", I.impute_numeric, lambda df: (df[num(df)], "median")),
+        Case("imputation.impute_object", I.impute_object, lambda df: (df[obj(df)], "new_category")),
+        Case("imputation.impute_column", I.impute_column, lambda df: (df, num(df), "mean")),
+        Case("imputation.with_imputed", I.with_imputed,
+             lambda df: (df, {num(df): I.impute_numeric(df[num(df)], "mean")})),
+        Case("imputation.fill_with_random_values", I.fill_with_random_values, lambda df: (df, obj(df), 0)),
+        Case("imputation.fill_numeric_with_knn_imputer", I.fill_numeric_with_knn_imputer,
+             lambda df: (df, num(df))),
+        Case("imputation.fill_numeric_columns", I.fill_numeric_columns, lambda df: (df, num(df), "mean")),
+        Case("imputation.fill_missing_object_columns", I.fill_missing_object_columns,
+             lambda df: (df, obj(df), "mode")),
+    ]
+    for method in VG.NUMERIC_METHODS:
+        cases.append(Case(f"visualizations.visualize_numeric_distribution[{method}]", VG.visualize_numeric_distribution,
+                          lambda df, m=method: (df, num(df), m)))
+    for method in VG.CATEGORICAL_METHODS:
+        cases.append(Case(f"visualizations.visualize_categorical_distribution[{method}]",
+                          VG.visualize_categorical_distribution, lambda df, m=method: (df, obj(df), m)))
+    cases.append(Case("visualizations.distribution_png[hist]", VG.distribution_png, lambda df: (df[num(df)], "hist")))
+    for method in VG.MISSINGNESS_METHODS:
+        cases.append(Case(f"visualizations.missingness_png[{method}]", VG.missingness_png,
+                          lambda df, m=method: (df.copy(deep=False), m)))
+    return cases
+
+
+def _datasets(args):
+    """
+    Yields (label, raw frame, compact frame). Synthetic raw frames are the compact ones written out as strings,
+    as pd.read_csv would return them.
+    """
+    for rows in args.rows:
+        for mechanism in args.mechanisms:
+            compact = make_synthetic(rows, args.numeric_columns, args.categorical_columns, args.missing_rate,
+                                     mechanism)
+            yield f"synthetic-{mechanism}-{rows}", lambda c=compact: c.astype(str).replace("nan", "?"), compact
+    for factor in args.healthcare_scale:
+        raw = scaled_healthcare(factor)
+        yield f"healthcare-x{factor}", lambda r=raw: r, loader.compact_dataframe(raw)
+
+
+def measure(case: Case, frame: pd.DataFrame, repeat: int) -> dict:
+    """
+    Runs a case `repeat` times. Wall time comes from runs without tracing; peak memory from one extra traced run.
+    """
+    seconds = []
+    for _ in range(repeat):
+        args = case.setup(frame)
+        start = time.perf_counter()
+        case.func(*args)
+        seconds.append(time.perf_counter() - start)
+
+    args = case.setup(frame)
+    tracemalloc.start()
+    try:
+        case.func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds_median": float(np.median(seconds)), "seconds_min": float(np.min(seconds)),
+            "peak_bytes": int(peak)}
+
+
+def compare(results: list, baseline_path: str, threshold: float) -> list:
+    """
+    Returns the (name, dataset, old seconds, new seconds) of cases at least `threshold` times slower than the
+    baseline run.
+    """
+    baseline = json.loads(Path(baseline_path).read_text())
+    old = {(r["name"], r["dataset"]): r["seconds_median"] for r in baseline["results"] if "seconds_median" in r}
+    regressions = []
+    for r in results:
+        before = old.get((r["name"], r["dataset"]))
+        if before and "seconds_median" in r and r["seconds_median"] > before * threshold:
+            regressions.append((r["name"], r["dataset"], before, r["seconds_median"]))
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="*", default=[10_000, 100_000])
+    parser.add_argument("--mechanisms", nargs="*", default=MECHANISMS, choices=MECHANISMS)
+    parser.add_argument("--numeric-columns", type=int, default=6)
+    parser.add_argument("--categorical-columns", type=int, default=3)
+    parser.add_argument("--missing-rate", type=float, default=0.1)
+    parser.add_argument("--healthcare-scale", type=int, nargs="*", default=[1, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", help="regular expression selecting the benchmarked functions")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slow-down ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    cases = [c for c in _cases() if not args.only or re.search(args.only, c.name)]
+    results = []
+    for label, raw, compact in _datasets(args):
+        raw_frame = raw() if any(c.inputs == "raw" for c in cases) else None
+        for case in cases:
+            frame = raw_frame if case.inputs == "raw" else compact
+            record = {"name": case.name, "dataset": label, "rows": len(frame), "columns": frame.shape[1]}
+            try:
+                record.update(measure(case, frame, args.repeat))
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+            results.append(record)
+            timing = record.get("error") or (f"{record['seconds_median']:9.4f}s "
+                                             f"{record['peak_bytes'] / 1024 ** 2:9.1f} MB")
+            print(f"{label:<28} {case.name:<62} {timing}", flush=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "arguments": vars(args),
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for name, dataset, before, after in regressions:
+            print(f"REGRESSION {name} on {dataset}: {before:.4f}s -> {after:.4f}s ({after / before:.2f}x)")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
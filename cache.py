@@ -0,0 +1,222 @@
+"""
+Description :   Result cache shared across Streamlit reruns. Results are keyed on a fast content fingerprint of
+                the dataframe plus the function and its other arguments, and evicted least-recently-used once the
+                cache exceeds its memory budget.
+
+Methods:    fingerprint(obj) -> str
+            ResultCache(max_bytes: int).call(func, *args, **kwargs)
+"""
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import types
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Fingerprints of live pandas objects, so an unchanged frame is hashed once per session, not once per rerun
+_fingerprints = {}
+
+
+def _hash_array(digest, array: np.ndarray):
+    digest.update(str(array.dtype).encode())
+    digest.update(np.ascontiguousarray(array).view(np.uint8))
+
+
+def _hash_column(digest, column: pd.Series):
+    digest.update(str(column.dtype).encode())
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        _hash_array(digest, column.cat.codes.to_numpy())
+        _hash_array(digest, pd.util.hash_pandas_object(column.cat.categories).to_numpy())
+    elif isinstance(column.dtype, np.dtype) and column.dtype.kind in "biufcmM":
+        _hash_array(digest, column.to_numpy())
+    else:
+        _hash_array(digest, pd.util.hash_pandas_object(column, index=False).to_numpy())
+
+
+def _fingerprint_pandas(obj) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(type(obj).__name__.encode())
+    if isinstance(obj.index, pd.RangeIndex):
+        digest.update(repr((obj.index.start, obj.index.stop, obj.index.step)).encode())
+    else:
+        _hash_array(digest, pd.util.hash_pandas_object(obj.index).to_numpy())
+
+    if isinstance(obj, pd.Series):
+        digest.update(repr(obj.name).encode())
+        _hash_column(digest, obj)
+    else:
+        for i, name in enumerate(obj.columns):
+            digest.update(repr(name).encode())
+            _hash_column(digest, obj.iloc[:, i])
+    return digest.hexdigest()
+
+
+def fingerprint(obj) -> str:
+    """
+    Content fingerprint of a dataframe, series, array, file or plain value.
+
+    Dataframes are hashed from their raw column buffers (categorical codes, numeric arrays) and the result is
+    remembered for as long as the object lives, so frames must not be modified in place after being cached.
+    Paths are fingerprinted from their name, size and modification time rather than their contents. Other
+    objects are hashed from their attributes (dataclasses and the like) or else their pickled state.
+
+    Raises:
+    - TypeError if an object can be neither hashed by content nor pickled.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        entry = _fingerprints.get(id(obj))
+        if entry is not None and entry[0]() is obj:
+            return entry[1]
+        key = id(obj)
+        value = _fingerprint_pandas(obj)
+        _fingerprints[key] = (weakref.ref(obj, lambda _, key=key: _fingerprints.pop(key, None)), value)
+        return value
+
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(obj, np.ndarray):
+        _hash_array(digest, obj)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        digest.update(obj)
+    elif isinstance(obj, Path):
+        stat = obj.stat()
+        digest.update(repr((str(obj.resolve()), stat.st_size, stat.st_mtime_ns)).encode())
+    elif hasattr(obj, "getbuffer"):
+        # In-memory uploads (Streamlit UploadedFile, BytesIO)
+        digest.update(obj.getbuffer())
+    elif isinstance(obj, (list, tuple)):
+        digest.update(type(obj).__name__.encode())
+        for item in obj:
+            digest.update(fingerprint(item).encode())
+    elif isinstance(obj, dict):
+        for name, item in sorted(obj.items(), key=lambda kv: repr(kv[0])):
+            digest.update(repr(name).encode())
+            digest.update(fingerprint(item).encode())
+    elif isinstance(obj, (set, frozenset)):
+        digest.update(type(obj).__name__.encode())
+        for item in sorted(fingerprint(item) for item in obj):
+            digest.update(item.encode())
+    elif isinstance(obj, pd.Index):
+        digest.update(repr((type(obj).__name__, str(obj.dtype), obj.name)).encode())
+        _hash_array(digest, pd.util.hash_pandas_object(obj).to_numpy())
+    elif obj is None or isinstance(obj, (str, int, float, complex, np.generic)):
+        digest.update(repr(obj).encode())
+    elif hasattr(obj, "__dict__") and not callable(obj):
+        # Result and option objects (dataclasses and the like) by their attributes
+        digest.update(f"{type(obj).__module__}.{type(obj).__qualname__}".encode())
+        digest.update(fingerprint(vars(obj)).encode())
+    else:
+        # Anything else by its pickled state: reprs of arrays and frames are truncated ("...") and would collide
+        try:
+            digest.update(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception as e:
+            raise TypeError(f"Cannot fingerprint a {type(obj).__name__} argument by content: {e}") from e
+    return digest.hexdigest()
+
+
+def sizeof(value, _seen: set = None) -> int:
+    """
+    Approximate resident size of a cached value in bytes: pandas and numpy objects, anything exposing `nbytes`, and
+    the containers and result objects (their attributes) holding them, each object counted once.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+        # Shared by the whole process, not owned by the cached value
+        return 0
+    if isinstance(getattr(value, "nbytes", None), int):
+        return value.nbytes
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sizeof(item, _seen) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k, _seen) + sizeof(v, _seen) for k, v in value.items())
+    if hasattr(value, "__dict__"):
+        # Result objects (dataclasses and the like): their attributes, recursively
+        return sys.getsizeof(value) + sizeof(vars(value), _seen)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of function results under a memory budget.
+
+    Parameters:
+    - max_bytes (int): Memory budget; defaults to the PHANTOM_CACHE_MB environment variable, else 512 MB.
+      Values larger than the whole budget are returned but not stored.
+    """
+
+    def __init__(self, max_bytes: int = None):
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("PHANTOM_CACHE_MB", 512)) * 1024 ** 2
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, func, *args, **kwargs) -> tuple:
+        return (func.__module__, func.__qualname__, fingerprint(args), fingerprint(kwargs))
+
+    def get(self, key, default=None):
+        """
+        The value stored under `key`, else `default`; counted as a hit or a miss.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        size = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted
+
+    def call(self, func, *args, **kwargs):
+        """
+        Returns func(*args, **kwargs), computing it only if the same function has not already been called on
+        arguments with the same fingerprints. Exceptions are not cached.
+        """
+        key = self.key(func, *args, **kwargs)
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        value = func(*args, **kwargs)
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.current_bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
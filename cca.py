@@ -1,11 +1,20 @@
 """
 Description :   Contains logic for Complete Case Analysis CCA
+
+                Every function reads the dataframe's shared missingness index (missingness.py), so the frame is
+                scanned for missing values once, whichever of them runs first.
 """
+import numpy as np
 import pandas as pd
 
+from instrumentation import instrument
+from missingness import missingness_index
+
+@instrument
 def complete_case_analysis(data: pd.DataFrame):
-    return data.dropna()
+    return data.take(np.flatnonzero(missingness_index(data).complete_rows()))
 
+@instrument
 def data_loss_percentage(dataframe):
     """
     Returns the percentage of rows that would be dropped using Complete Case Analysis (CCA).
@@ -18,12 +27,9 @@ def data_loss_percentage(dataframe):
     -------
     float : Data loss percentage due to CCA
     """
-    rows_with_na = dataframe[dataframe.isnull().any(axis=1)]
-    no_of_rows = rows_with_na.shape[0]
-    total_rows = dataframe.shape[0]
-    data_loss = (no_of_rows / total_rows) * 100
-    return round(data_loss, 2)
+    return missingness_index(dataframe).data_loss_percentage()
 
+@instrument
 def nan_percentage_per_column(dataframe):
     """
     Returns the percentage of NaN values for each column in the DataFrame.
@@ -36,5 +42,4 @@ def nan_percentage_per_column(dataframe):
     -------
     pd.Series : Percentage of NaNs per column, rounded to 2 decimal places.
     """
-    total_rows = len(dataframe)
-    return round((dataframe.isnull().sum() / total_rows) * 100, 2)
+    return missingness_index(dataframe).nan_percentage_per_column()
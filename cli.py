@@ -0,0 +1,95 @@
+"""
+Description :   Command-line entry point running the cleaning pipeline (pipeline.py) on one or many CSV, Parquet or
+                Feather/Arrow files without Streamlit, e.g. for nightly batch jobs.
+
+Usage:      python cli.py extracts/*.csv --out cleaned/ --workers 8
+            python cli.py data.csv --out cleaned/ --strategy impute --plan plan.json --drop "Unnamed: 0" --plots
+            python cli.py data.parquet --out cleaned/ --where "Age >= 18" --where "Gender == Female"
+            python cli.py huge.csv.gz --out cleaned/ --partitioned --rows-per-partition 2000000 --workers 8
+"""
+import argparse
+import json
+import re
+import sys
+
+import pipeline
+
+
+def parse_condition(text: str) -> tuple:
+    """
+    Parses "column op value" (op one of == != < <= > >=) into a pyarrow filter tuple; numeric values become
+    floats.
+    """
+    match = re.fullmatch(r"\s*(.+?)\s*(==|!=|<=|>=|<|>)\s*(.+?)\s*", text)
+    if match is None:
+        raise argparse.ArgumentTypeError(f"expected 'column op value', got '{text}'")
+    column, op, value = match.groups()
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+    return column, op, value
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="input CSV, compressed CSV, Parquet or Feather/Arrow files")
+    parser.add_argument("--out", required=True, help="output directory for Parquet files and JSON reports")
+    parser.add_argument("--strategy", choices=["auto", "cca", "impute"], default="auto")
+    parser.add_argument("--plan", help="JSON file mapping column -> imputation method")
+    parser.add_argument("--drop", nargs="*", default=[], help="columns to drop before the analysis (never read)")
+    parser.add_argument("--where", type=parse_condition, action="append", default=[],
+                        help="row condition such as 'Age >= 18', pushed down to the reader; repeat to AND them")
+    parser.add_argument("--max-loss", type=float, default=10.0,
+                        help="highest CCA data loss (%%) for which CCA is recommended")
+    parser.add_argument("--numeric-method", default="median")
+    parser.add_argument("--object-method", default="mode")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int, help="files processed in parallel (default: CPU count)")
+    parser.add_argument("--plots", action="store_true", help="write before/after plots of imputed columns")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="process each file out of core, partition by partition (--workers partitions at once); "
+                             "no MCAR test, plots, --drop or --where, and only mean/median/mode/new_category")
+    parser.add_argument("--rows-per-partition", type=int, default=1_000_000,
+                        help="rows per partition when --partitioned splits a CSV")
+    args = parser.parse_args(argv)
+
+    plan = None
+    if args.plan:
+        with open(args.plan) as f:
+            plan = json.load(f)
+
+    # Sources that would overwrite each other's outputs are rejected before anything runs
+    try:
+        if args.partitioned:
+            reports = pipeline.run_many(
+                args.sources, args.out, workers=args.workers, partitioned=True, strategy=args.strategy, plan=plan,
+                max_loss=args.max_loss, numeric_method=args.numeric_method, object_method=args.object_method,
+                rows_per_partition=args.rows_per_partition,
+            )
+        else:
+            reports = pipeline.run_many(
+                args.sources, args.out, workers=args.workers, strategy=args.strategy, plan=plan,
+                drop_columns=args.drop, filters=args.where or None, max_loss=args.max_loss,
+                numeric_method=args.numeric_method, object_method=args.object_method, seed=args.seed,
+                plots=args.plots,
+            )
+    except ValueError as e:
+        parser.error(str(e))
+
+    failed = 0
+    for report in reports:
+        if report.error:
+            failed += 1
+            print(f"FAILED  {report.source}: {report.error}", file=sys.stderr)
+        else:
+            mcar = report.mcar.get("p_value")
+            mcar = f"p={mcar:.4f}" if mcar is not None else "n/a"
+            print(f"OK      {report.source} -> {report.output} ({report.rows_written:,}/{report.rows:,} rows, "
+                  f"loss {report.data_loss}%, MCAR {mcar}, {report.recommendation}, "
+                  f"{sum(report.seconds.values()):.2f}s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""
+Description :   Distribution-shift metrics between the original data and its cleaned versions (CCA and each
+                imputation method), for every column at once instead of one plot at a time:
+            *    1. Numeric columns: Kolmogorov-Smirnov statistic, Wasserstein distance, mean shift (in original
+                    standard deviations) and variance ratio
+            *    2. Categorical columns: total variation distance and chi-square test of homogeneity
+                The original values of a column are sorted, with prefix sums (and its categories counted), once
+                and shared by every candidate. An imputation differs from them by its imputed values and CCA by
+                its dropped rows, so the numeric metrics of either cost O(changed rows x log rows).
+
+Methods:    compare_distributions(original: pd.DataFrame, candidates: dict) -> pd.DataFrame
+            imputation_candidates(df: pd.DataFrame, methods: list, seed: int) -> dict
+            compare_methods(df: pd.DataFrame, methods: list, seed: int) -> pd.DataFrame
+            summarize(table: pd.DataFrame) -> pd.DataFrame
+"""
+import numpy as np
+import pandas as pd
+
+import cca
+import imputation as I
+
+# Compared by default: the imputations that run in one pass over a column
+DEFAULT_METHODS = ["mean", "median", "mode", "new_category", "Random"]
+
+COLUMNS = ["column", "kind", "candidate", "rows", "shift", "rank", "ks", "wasserstein", "mean_shift",
+           "variance_ratio", "total_variation", "chi_square", "p_value"]
+
+
+def _is_numeric(column: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
+
+
+def _merge_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Linear merge of two sorted arrays
+    return np.insert(a, np.searchsorted(a, b), b)
+
+
+def _ks_wasserstein(a: np.ndarray, b: np.ndarray) -> tuple:
+    # Both ECDFs evaluated at every value of the pooled sample, from the two sorted samples
+    pooled = _merge_sorted(a, b)
+    cdf_a = np.searchsorted(a, pooled, side="right") / len(a)
+    cdf_b = np.searchsorted(b, pooled, side="right") / len(b)
+    gap = np.abs(cdf_a - cdf_b)
+    return float(gap.max()), float(np.sum(gap[:-1] * np.diff(pooled)))
+
+
+class _Reference:
+    """
+    The original column prepared once for all candidates: its observed values sorted, with prefix sums
+    (numeric), or its category codes and counts (categorical).
+    """
+
+    def __init__(self, column: pd.Series):
+        self.numeric = _is_numeric(column)
+        if self.numeric:
+            self.values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+            self.observed = np.isfinite(self.values)
+            positions = np.flatnonzero(self.observed)
+            self.sorted_positions = positions[np.argsort(self.values[positions])]
+            self.sorted = self.values[self.sorted_positions]
+            self.prefix = np.concatenate(([0.0], np.cumsum(self.sorted)))
+            self.mean = self.sorted.mean() if len(self.sorted) else np.nan
+            self.scatter = float(((self.sorted - self.mean) ** 2).sum()) if len(self.sorted) else np.nan
+        else:
+            self.codes, self.categories = _codes(column)
+            self.counts = np.bincount(self.codes[self.codes >= 0], minlength=len(self.categories))
+
+    def _integral(self, x: np.ndarray) -> np.ndarray:
+        # Integral of the reference ECDF from -inf to x
+        k = np.searchsorted(self.sorted, x, side="right")
+        return (k * x - self.prefix[k]) / len(self.sorted)
+
+    def against(self, sample: np.ndarray) -> tuple:
+        """
+        KS statistic and Wasserstein distance between the reference and a sorted sample, in
+        O(len(sample) log n): between two distinct sample values the sample's ECDF is a constant c, so the
+        reference ECDF (monotone) is compared at the interval ends, and the area between them splits where
+        the reference ECDF crosses c.
+        """
+        a, n = self.sorted, len(self.sorted)
+        values, counts = np.unique(sample, return_counts=True)
+        cumulative = np.cumsum(counts)
+        m = cumulative[-1]
+
+        # KS: both ECDFs just before and at every sample value
+        below = np.searchsorted(a, values, side="left") / n
+        at = np.searchsorted(a, values, side="right") / n
+        ks = max(np.abs(below - (cumulative - counts) / m).max(), np.abs(at - cumulative / m).max())
+
+        # Wasserstein: left tail, where the sample's ECDF is 0, and right tail, where it is 1
+        area = self._integral(values[:1])[0]
+        if a[-1] > values[-1]:
+            area += (a[-1] - values[-1]) - (self._integral(a[-1:])[0] - self._integral(values[-1:])[0])
+
+        # Between consecutive sample values, c = cumulative / m; the reference reaches c at its k-th value
+        left, right, c = values[:-1], values[1:], cumulative[:-1] / m
+        k = -(-cumulative[:-1] * n // m)
+        crossing = np.clip(a[np.maximum(k - 1, 0)], left, right)
+        g_left, g_cross, g_right = self._integral(left), self._integral(crossing), self._integral(right)
+        area += np.sum(c * (crossing - left) - (g_cross - g_left) + (g_right - g_cross) - c * (right - crossing))
+        return float(ks), float(area)
+
+
+def _codes(column: pd.Series) -> tuple:
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy().astype(np.int64), pd.Index(column.cat.categories)
+    codes, uniques = pd.factorize(column)
+    return codes.astype(np.int64), pd.Index(uniques)
+
+
+def _direct_metrics(reference: _Reference, b: np.ndarray, distances) -> dict:
+    # Metrics of a sorted candidate sample compared as a whole
+    a = reference.sorted
+    if not len(a) or not len(b):
+        return {"rows": len(b)}
+    ks, wasserstein = distances(b)
+    std_a = np.sqrt(reference.scatter / len(a))
+    return {"rows": len(b), "ks": ks, "wasserstein": wasserstein,
+            "mean_shift": (b.mean() - reference.mean) / std_a if std_a > 0 else 0.0,
+            "variance_ratio": b.var() / std_a ** 2 if std_a > 0 else np.nan}
+
+
+def _numeric_metrics(reference: _Reference, values: np.ndarray, positions, aligned: bool) -> dict:
+    a = reference.sorted
+    if aligned and np.array_equal(values[reference.observed], reference.values[reference.observed]):
+        # Imputation: the candidate is the reference plus its imputed values
+        delta = values[~reference.observed]
+        delta, sign = np.sort(delta[np.isfinite(delta)]), 1
+    elif positions is not None and np.array_equal(values, reference.values[positions], equal_nan=True):
+        # Row subset (CCA): the candidate is the reference minus the dropped rows, already in sorted order
+        kept = np.zeros(len(reference.values), dtype=bool)
+        kept[positions] = True
+        in_order = kept[reference.sorted_positions]
+        if 2 * in_order.sum() < len(a):
+            # Most rows dropped: the kept ones are the smaller sample
+            return _direct_metrics(reference, reference.sorted[in_order], reference.against)
+        delta, sign = reference.sorted[~in_order], -1
+    else:
+        return _direct_metrics(reference, np.sort(values[np.isfinite(values)]),
+                               lambda b: _ks_wasserstein(a, b))
+
+    rows = len(a) + sign * len(delta)
+    if not len(a) or not rows:
+        return {"rows": rows}
+
+    # F_candidate - F_reference = +-(len(delta) / rows) * (F_delta - F_reference), in both directions
+    ks, wasserstein = reference.against(delta) if len(delta) else (0.0, 0.0)
+    scale = len(delta) / rows
+
+    # Moments from the reference's, shifted by the added or removed values
+    centered = delta - reference.mean
+    shift = sign * centered.sum() / rows
+    variance = (reference.scatter + sign * (centered ** 2).sum()) / rows - shift ** 2
+    variance_a = reference.scatter / len(a)
+    return {
+        "rows": rows,
+        "ks": ks * scale,
+        "wasserstein": wasserstein * scale,
+        "mean_shift": shift / np.sqrt(variance_a) if variance_a > 0 else 0.0,
+        "variance_ratio": max(variance, 0.0) / variance_a if variance_a > 0 else np.nan,
+    }
+
+
+def _categorical_metrics(reference: _Reference, column: pd.Series) -> dict:
+    from scipy.stats import chi2
+
+    # Candidate counts on the original categories, plus any new ones (e.g. 'Missing')
+    codes, categories = _codes(column)
+    mapping = reference.categories.get_indexer(categories)
+    new = mapping < 0
+    mapping[new] = len(reference.categories) + np.arange(new.sum())
+    codes = codes[codes >= 0]
+    counts = np.bincount(mapping[codes], minlength=len(reference.categories) + int(new.sum()))
+    original = np.zeros_like(counts)
+    original[:len(reference.counts)] = reference.counts
+    if not original.sum() or not counts.sum():
+        return {"rows": int(counts.sum())}
+
+    total_variation = 0.5 * np.abs(original / original.sum() - counts / counts.sum()).sum()
+
+    # Chi-square test of homogeneity on the 2 x categories table
+    table = np.vstack((original, counts))[:, (original + counts) > 0].astype(np.float64)
+    expected = table.sum(axis=1, keepdims=True) * table.sum(axis=0, keepdims=True) / table.sum()
+    statistic = float(((table - expected) ** 2 / expected).sum())
+    dof = table.shape[1] - 1
+    return {
+        "rows": int(counts.sum()),
+        "total_variation": float(total_variation),
+        "chi_square": statistic,
+        "p_value": float(chi2.sf(statistic, dof)) if dof > 0 else 1.0,
+    }
+
+
+def compare_distributions(original: pd.DataFrame, candidates: dict) -> pd.DataFrame:
+    """
+    Distribution shift of every column of every candidate against the original.
+
+    A candidate with the original's rows (an imputation) is compared on the columns it imputed; one with fewer
+    rows (CCA) on every column, since dropping rows shifts complete columns too.
+
+    Parameters:
+    - original (pd.DataFrame): Data with missing values; its observed values are the reference.
+    - candidates (dict): Name -> cleaned pd.DataFrame with the original's columns.
+
+    Returns:
+    - pd.DataFrame: One row per (column, candidate) with the metrics of its kind, and `shift` (KS for numeric
+      columns, total variation for categorical ones) and `rank` (1 = closest to the original, per column),
+      sorted by column and rank.
+    """
+    missing = original.isnull().any()
+    comparable = [col for col in original.columns if not pd.api.types.is_datetime64_any_dtype(original[col])]
+    references = {}
+    rows = []
+    for name, candidate in candidates.items():
+        # Where the candidate's rows sit in the original, when its index says so
+        positions = None
+        aligned = candidate.index.equals(original.index)
+        if aligned:
+            positions = np.arange(len(original))
+        elif original.index.is_unique:
+            positions = original.index.get_indexer(candidate.index)
+            if (positions < 0).any():
+                positions = None
+
+        subset = len(candidate) != len(original)
+        for col in comparable:
+            if col not in candidate.columns or not (subset or missing[col]) or candidate[col].isnull().any():
+                continue
+            reference = references.get(col)
+            if reference is None:
+                reference = references[col] = _Reference(original[col])
+            if reference.numeric:
+                metrics = _numeric_metrics(reference, candidate[col].to_numpy(dtype=np.float64, na_value=np.nan),
+                                           positions, aligned)
+            else:
+                metrics = _categorical_metrics(reference, candidate[col])
+            rows.append({"column": col, "kind": "numeric" if reference.numeric else "categorical",
+                         "candidate": name, **metrics})
+
+    table = pd.DataFrame(rows, columns=[c for c in COLUMNS if c not in ("shift", "rank")])
+    table.insert(4, "shift", table["ks"].where(table["kind"] == "numeric", table["total_variation"]))
+    table.insert(5, "rank", table.groupby("column")["shift"].rank(method="min").astype("Int64"))
+    order = {col: k for k, col in enumerate(original.columns)}
+    return (table.sort_values(["column", "rank"], key=lambda s: s.map(order) if s.name == "column" else s)
+            .reset_index(drop=True))
+
+
+def imputation_candidates(df: pd.DataFrame, methods=None, seed=None, progress=None) -> dict:
+    """
+    CCA and one imputed frame per method. Each method imputes the columns it applies to (imputation.methods_for)
+    and leaves the rest untouched.
+    `progress(methods_done, methods, message)` is called after each method if given.
+    """
+    if methods is None:
+        methods = DEFAULT_METHODS
+    candidates = {"CCA": cca.complete_case_analysis(df)}
+    missing = df.columns[df.isnull().any()]
+    for done, method in enumerate(methods, 1):
+        columns = {}
+        for col in missing:
+            if method in I.methods_for(df[col]) and df[col].notnull().any():
+                columns[col] = I.impute_column(df, col, method, seed=seed)
+        if columns:
+            candidates[method] = I.with_imputed(df, columns)
+        if progress is not None:
+            progress(done, len(methods), f"{method} imputed")
+    return candidates
+
+
+def compare_methods(df: pd.DataFrame, methods=None, seed=None, progress=None) -> pd.DataFrame:
+    """
+    compare_distributions of CCA and every method of `methods` (see imputation_candidates) against `df`.
+    `progress` is reported to while the candidates are imputed.
+    """
+    return compare_distributions(df, imputation_candidates(df, methods, seed, progress))
+
+
+def summarize(table: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per candidate, best first: mean rank over the columns it was compared on, mean shift, the number of
+    columns where it ranked first and the largest shift it caused.
+    """
+    grouped = table.groupby("candidate")
+    return pd.DataFrame({
+        "mean_rank": grouped["rank"].mean().astype(float),
+        "mean_shift": grouped["shift"].mean(),
+        "best_on": grouped["rank"].apply(lambda ranks: int((ranks == 1).sum())),
+        "worst_shift": grouped["shift"].max(),
+        "columns": grouped.size(),
+    }).sort_values(["mean_rank", "mean_shift"])
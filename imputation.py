@@ -1,80 +1,354 @@
 """
-Description :   Implements various imputation techniques (Mean, Median, Mode, KNN).
+Description :   Implements various imputation techniques (Mean, Median, Mode, KNN, MICE).
                 Lets you apply different methods column-wise.
+
+                The impute_* functions return only the imputed column and never copy the dataframe; use
+                with_imputed to overlay imputed columns on the original frame. The fill_* functions keep the
+                older whole-frame interface on top of them, returning a new frame: the input is never written to,
+                so the caches keyed on it (missingness.missingness_index, cache.fingerprint) stay valid.
 """
+import zlib
+
+import numpy as np
 import pandas as pd
-from sklearn.impute import KNNImputer
-import random
 
-def fill_with_random_values(df: pd.DataFrame, col=None) -> pd.DataFrame:
+from instrumentation import instrument
+
+NUMERIC_METHODS = ["mean", "median", "mode", "KNN", "MICE", "Random", "Random (weighted)"]
+OBJECT_METHODS = ["mode", "new_category", "MICE", "Random", "Random (weighted)"]
+
+
+def methods_for(column: pd.Series) -> list:
     """
-    Fills missing values in all columns
-    with random values from that column's existing unique values.
+    Methods that can impute the column: NUMERIC_METHODS for numeric columns, OBJECT_METHODS otherwise, without
+    "MICE" for text columns with too many distinct values to model (see mice.can_model).
     """
+    if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+        return NUMERIC_METHODS
+    from mice import can_model
 
-    unique_vals = df[col].dropna().unique().tolist()
-    df[col] = df[col].apply(
-        lambda x: random.choice(unique_vals) if pd.isnull(x) else x
-    )
+    return OBJECT_METHODS if can_model(column) else [m for m in OBJECT_METHODS if m != "MICE"]
 
-    return df
 
+def _column_rng(seed, col) -> np.random.Generator:
+    # Seeded per column name, so a column's draws do not depend on which other columns are imputed with it
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng([seed, zlib.crc32(str(col).encode())])
 
-def fill_numeric_with_knn_imputer(df: pd.DataFrame, col=None) -> pd.DataFrame:
+
+@instrument
+def impute_random(column: pd.Series, seed=None, weighted: bool = False) -> pd.Series:
     """
-    Fills missing values in numeric columns using KNN imputation.
-    Automatically chooses n_neighbors based on dataset size.
+    Returns the column with missing values replaced by random draws, all made in one vectorized call.
 
     Parameters:
-    - df (pd.DataFrame): Input dataframe.
+    - column (pd.Series): Column to impute.
+    - seed (int): Seed of the numpy Generator; the same seed always gives the same output.
+    - weighted (bool): False draws uniformly from the column's existing unique values, True draws from the
+      observed values so the imputed values follow the empirical distribution.
 
     Returns:
-    - pd.DataFrame: DataFrame with numeric columns imputed.
+    - pd.Series: The imputed column.
     """
+    missing = column.isnull().to_numpy()
+    n_missing = int(missing.sum())
+    if n_missing == 0:
+        return column
+    if n_missing == len(column):
+        raise ValueError(f"Column '{column.name}' has no observed values to sample from.")
 
-    # Auto-select n_neighbors: 5% of rows, at least 2, at most 5
-    n_neighbors = min(5, max(2, int(len(df) * 0.05)))
+    rng = _column_rng(seed, column.name)
 
-    # Apply KNN only on numeric columns
-    imputer = KNNImputer(n_neighbors=n_neighbors)
-    imputed_values = imputer.fit_transform(df[[col]])
-    df[col] = imputed_values
+    # Categoricals sample their integer codes, everything else samples the values themselves
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        values = column.cat.codes.to_numpy().copy()
+    else:
+        values = column.to_numpy()
+    observed = values[~missing]
+    pool = observed if weighted else pd.unique(observed)
+    draws = pool[rng.integers(0, len(pool), size=n_missing)]
 
-    return df
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        values[missing] = draws
+        return pd.Series(pd.Categorical.from_codes(values, dtype=column.dtype), index=column.index,
+                         name=column.name)
 
+    imputed = column.copy()
+    imputed.iloc[np.flatnonzero(missing)] = draws
+    return imputed
 
-def fill_numeric_columns(df: pd.DataFrame, col=None, method: str = 'mean') -> pd.DataFrame:
+
+@instrument
+def impute_random_columns(df: pd.DataFrame, columns=None, seed=None, weighted: bool = False) -> dict:
     """
-    Fills missing values in numeric (int/float) columns using the specified method.
+    Random imputation of many columns in one call.
 
     Parameters:
-    - df (pd.DataFrame): Input dataframe.
-    - method (str): Method to fill missing values. Options: 'mean', 'median', or 'mode'.
+    - df (pd.DataFrame): Input dataframe, not modified.
+    - columns (list): Columns to impute, defaults to every column with missing values.
+    - seed (int): See impute_random.
+    - weighted (bool): See impute_random.
+
+    Returns:
+    - dict: Column name -> imputed pd.Series, ready for with_imputed.
+    """
+    if columns is None:
+        columns = df.columns[df.isnull().any()].tolist()
+    return {col: impute_random(df[col], seed=seed, weighted=weighted) for col in columns}
+
+
+def _float_dtype(column: pd.Series):
+    # Keep float32 columns compact; everything else comes back as float64
+    return np.float32 if column.dtype == np.float32 else np.float64
+
+
+@instrument
+def impute_knn(df: pd.DataFrame, col, n_neighbors: int = None, features=None, block_size: int = 10_000,
+               max_donors: int = None, seed=None, progress=None) -> pd.Series:
+    """
+    Returns column `col` of `df` with missing values filled by the mean of its K nearest neighbours,
+    searched on the other numeric columns.
+
+    Only rows where `col` is missing are queried, in blocks, against a KD-tree (ball tree for wide feature
+    sets) built on the rows where `col` is observed. Features are standardized; missing feature values are
+    treated as the feature mean. Without any feature column this falls back to the column mean, which is
+    what KNN on the column alone amounts to.
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe, not modified.
+    - col: Numeric column to impute.
+    - n_neighbors (int): Defaults to 5% of rows, at least 2, at most 5 (capped at the number of donor rows).
+    - features (list): Feature columns, defaults to every other numeric column.
+    - block_size (int): Missing rows queried per block; bounds the memory of the neighbour search.
+    - max_donors (int): If set, the index is built on a random sample of this many donor rows
+      (approximate neighbours, much faster on very large frames).
+    - seed (int): Seed for the donor sample.
+    - progress (callable): Optional progress(rows_done, missing_rows, message) called after every block.
+
+    Returns:
+    - pd.Series: The imputed column.
+
+    Raises:
+    - ValueError: If `col` has no observed values, or fewer donor rows than `n_neighbors`.
+    """
+    target = df[col]
+    missing = target.isnull().to_numpy()
+    if not missing.any():
+        return target
+
+    donors = np.flatnonzero(~missing)
+    if max_donors is not None and max_donors < 1:
+        raise ValueError(f"max_donors must be at least 1, got {max_donors}.")
+    available = len(donors) if max_donors is None else min(len(donors), max_donors)
+    if available == 0:
+        raise ValueError(f"Column '{col}' has no observed values to use as neighbours.")
+
+    # Auto-select n_neighbors: 5% of rows, at least 2, at most 5, and no more than there are donors
+    if n_neighbors is None:
+        n_neighbors = min(5, max(2, int(len(df) * 0.05)), available)
+    elif not 1 <= n_neighbors <= available:
+        raise ValueError(f"n_neighbors must be between 1 and the {available} donor rows of column '{col}', "
+                         f"got {n_neighbors}.")
+
+    if features is None:
+        features = [c for c in df.columns
+                    if c != col and pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+    values = target.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    imputed = values.copy()
+    if not features:
+        imputed[missing] = values[donors].mean()
+        return pd.Series(imputed, index=df.index, name=col).astype(_float_dtype(target))
+
+    # Standardized feature matrix; missing feature values sit at the mean (0)
+    X = df[features].to_numpy(dtype=np.float64, na_value=np.nan)
+    X = (X - np.nanmean(X, axis=0)) / np.where(np.nanstd(X, axis=0) > 0, np.nanstd(X, axis=0), 1.0)
+    X = np.nan_to_num(X, nan=0.0)
+
+    if max_donors is not None and len(donors) > max_donors:
+        donors = np.sort(np.random.default_rng(seed).choice(donors, size=max_donors, replace=False))
+
+    from sklearn.neighbors import BallTree, KDTree
+
+    tree_class = KDTree if len(features) <= 15 else BallTree
+    tree = tree_class(X[donors])
+    k = n_neighbors
+    donor_values = values[donors]
+
+    targets = np.flatnonzero(missing)
+    for start in range(0, len(targets), block_size):
+        rows = targets[start:start + block_size]
+        neighbours = tree.query(X[rows], k=k, return_distance=False)
+        imputed[rows] = donor_values[neighbours].mean(axis=1)
+        if progress is not None:
+            progress(start + len(rows), len(targets), f"KNN imputed {start + len(rows):,} of {len(targets):,} rows")
+
+    return pd.Series(imputed, index=df.index, name=col).astype(_float_dtype(target))
+
+
+@instrument
+def impute_numeric(column: pd.Series, method: str = 'mean', progress=None) -> pd.Series:
+    """
+    Returns the numeric column with missing values filled using 'mean', 'median' or 'mode'.
+    `progress(1, 1, message)` is called once the column is filled if given.
+    """
+    if not column.isnull().any():
+        return column
+
+    if method == 'mean':
+        value = column.mean()
+    elif method == 'median':
+        value = column.median()
+    elif method == 'mode':
+        value = column.mode()[0]
+    else:
+        raise ValueError(f"Unknown method '{method}'. Use 'mean', 'median', or 'mode'.")
+    imputed = column.fillna(value)
+    if progress is not None:
+        progress(1, 1, f"{method} imputed")
+    return imputed
+
+
+@instrument
+def impute_object(column: pd.Series, method: str = 'mode') -> pd.Series:
+    """
+    Returns the object/categorical column with missing values filled using:
+        - 'mode': the column's mode.
+        - 'new_category': the string 'Missing'.
+    """
+    if not column.isnull().any():
+        return column
+
+    if method == 'mode':
+        return column.fillna(column.mode()[0])
+    elif method == 'new_category':
+        if isinstance(column.dtype, pd.CategoricalDtype) and 'Missing' not in column.cat.categories:
+            column = column.cat.add_categories('Missing')
+        return column.fillna('Missing')
+    else:
+        raise ValueError(f"Unknown method '{method}'. Choose 'mode' or 'new_category'.")
+
+
+@instrument
+def impute_column(df: pd.DataFrame, col, method: str, seed=None, progress=None) -> pd.Series:
+    """
+    Imputes a single column with any of the methods offered in the app.
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe, not modified.
+    - col: Column to impute.
+    - method (str): One of NUMERIC_METHODS for numeric columns or OBJECT_METHODS otherwise.
+    - seed (int): Seed for the random methods.
+    - progress (callable): Optional progress(done, total, message), passed to the KNN, MICE and numeric
+      imputations.
 
     Returns:
-    - pd.DataFrame: DataFrame with missing values in numeric columns filled.
+    - pd.Series: The imputed column only.
+    """
+    column = df[col]
+    if method == "KNN":
+        return impute_knn(df, col, progress=progress)
+    if method == "MICE":
+        return impute_mice_column(df, col, progress=progress)
+    if method in ("Random", "Random (weighted)"):
+        return impute_random(column, seed=seed, weighted=method == "Random (weighted)")
+    if pd.api.types.is_numeric_dtype(column) and method != "new_category":
+        return impute_numeric(column, method, progress=progress)
+    return impute_object(column, method)
+
+
+@instrument
+def impute_mice_column(df: pd.DataFrame, col, progress=None) -> pd.Series:
+    """
+    Returns column `col` of `df` imputed by chained equations over every column with missing values
+    (see mice.py). The run is shared by all columns of the same frame, so imputing them one at a time costs
+    one run; `progress` is reported to by the run that computes it.
+    """
+    column = df[col]
+    if not column.isnull().any():
+        return column
+
+    from mice import impute_mice, mice_result
+
+    result = mice_result(df, progress=progress)
+    if col not in result.columns:
+        return impute_mice(df, columns=[col], progress=progress).columns[col]
+    return result.columns[col]
+
+
+@instrument
+def with_imputed(df: pd.DataFrame, columns: dict) -> pd.DataFrame:
     """
+    Lightweight overlay of imputed columns on the base frame.
+
+    Only the patched columns are new; every other column shares memory with `df`. With pandas Copy-on-Write
+    enabled (as the app does) writes to the overlay never reach the base frame. The column index (names, dtype,
+    duplicates) and attrs are those of `df`.
 
+    Parameters:
+    - df (pd.DataFrame): Base dataframe.
+    - columns (dict): Column name -> imputed pd.Series (or a pd.DataFrame for a duplicated name, one column per
+      occurrence).
 
-    if df[col].isnull().any():
-        if method == 'mean':
-            value = df[col].mean()
-        elif method == 'median':
-            value = df[col].median()
-        elif method == 'mode':
-            value = df[col].mode()[0]
-        else:
-            raise ValueError(f"Unknown method '{method}'. Use 'mean', 'median', or 'mode'.")
-        df[col].fillna(value, inplace=True)
+    Returns:
+    - pd.DataFrame: The overlay, with the same column order as `df`.
+    """
+    out = df.copy(deep=False)
+    for col, values in columns.items():
+        # Replaced by position: a duplicated name patches each of its columns
+        positions = np.arange(df.shape[1])[df.columns.get_loc(col)]
+        for k, position in enumerate(np.atleast_1d(positions)):
+            out.isetitem(int(position), values.iloc[:, k] if isinstance(values, pd.DataFrame) else values)
+    return out
 
-    return df
 
+@instrument
+def fill_with_random_values(df: pd.DataFrame, col=None, seed=None, weighted: bool = False) -> pd.DataFrame:
+    """
+    Fills missing values in all columns
+    with random values from that column's existing unique values.
+    Returns a new dataframe (see with_imputed); `df` is not modified.
+    """
+    return with_imputed(df, {col: impute_random(df[col], seed=seed, weighted=weighted)})
+
+
+@instrument
+def fill_numeric_with_knn_imputer(df: pd.DataFrame, col=None) -> pd.DataFrame:
+    """
+    Fills missing values in numeric columns using KNN imputation on the other numeric columns.
+    Automatically chooses n_neighbors based on dataset size.
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe, not modified.
+
+    Returns:
+    - pd.DataFrame: A new dataframe with the numeric column imputed.
+    """
+    return with_imputed(df, {col: impute_knn(df, col)})
+
+
+@instrument
+def fill_numeric_columns(df: pd.DataFrame, col=None, method: str = 'mean') -> pd.DataFrame:
+    """
+    Fills missing values in numeric (int/float) columns using the specified method.
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe, not modified.
+    - method (str): Method to fill missing values. Options: 'mean', 'median', or 'mode'.
+
+    Returns:
+    - pd.DataFrame: A new dataframe with missing values in numeric columns filled.
+    """
+    return with_imputed(df, {col: impute_numeric(df[col], method)})
+
+@instrument
 def fill_missing_object_columns(df: pd.DataFrame, col=None, method = 'mode') -> pd.DataFrame:
     """
     Fills missing values in object-type columns using the specified method.
 
     Parameters:
-    - df (pd.DataFrame): Input dataframe.
+    - df (pd.DataFrame): Input dataframe, not modified.
     - method (str): Method to fill missing values. Options:
         - 'mode': Replaces missing values with the column's mode.
         - 'new_category': Replaces missing values with the string 'Missing'.
@@ -82,13 +356,4 @@ def fill_missing_object_columns(df: pd.DataFrame, col=None, method = 'mode') ->
     Returns:
     - pd.DataFrame: A new dataframe with missing values filled in object columns.
     """
-
-    if df[col].isnull().any():
-        if method == 'mode':
-            mode_value = df[col].mode()[0]
-            df[col].fillna(mode_value, inplace=True)
-        elif method == 'new_category':
-            df[col].fillna('Missing', inplace=True)
-        else:
-            raise ValueError(f"Unknown method '{method}'. Choose 'mode' or 'new_category'.")
-    return df
+    return with_imputed(df, {col: impute_object(df[col], method)})
@@ -0,0 +1,305 @@
+"""
+Description :   Lightweight instrumentation of the app's hot paths. Every public function of the analysis modules
+                is wrapped by @instrument, and app.py wraps its steps in span(); while recording is enabled each
+                call records:
+            *    1. wall time and CPU time (of the calling thread only; worker threads it starts are not counted)
+            *    2. peak memory delta (tracemalloc; optional, as tracing slows allocations down)
+            *    3. input size: rows and bytes of the dataframes / series / arrays it was given
+                Spans nest; the recorder exports them as JSON or in the Chrome trace format (chrome://tracing,
+                Perfetto). While disabled, a wrapped call costs one flag check.
+
+                Recording is per context (contextvars): enable() starts a recorder for the calling thread or task,
+                so each app session profiles only its own reruns, and threads started with a copy of the context
+                (see jobs.JobRunner) record into it too. PHANTOM_PROFILE=1 (PHANTOM_PROFILE=memory to also trace
+                memory) enables one process-wide recorder for contexts that did not call enable() / disable().
+                CPU time is the calling thread's own; the memory peak comes from tracemalloc, which is process-wide,
+                so it also counts what other threads allocate meanwhile. Spans share that one peak: nested spans of a
+                thread fold a child's peak into its parent's, but a span on another thread (or session) resets it
+                too, so concurrent spans under-report their peaks.
+
+Methods:    instrument(func) -> func
+            span(name: str, *inputs) -> context manager
+            enable(memory: bool), disable(), reset()
+            spans() -> list, spans_frame() -> pd.DataFrame, summary() -> pd.DataFrame, elapsed() -> float
+            to_json() -> str, to_chrome_trace() -> str
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, fields
+
+
+@dataclass
+class Span:
+    """
+    One recorded call.
+
+    Attributes:
+    - name (str): module.function, or the step name given to span().
+    - start (float): Seconds since the recorder was enabled or reset.
+    - wall, cpu (float): Wall seconds and CPU seconds of the calling thread.
+    - memory (int): Peak traced memory above the memory at entry, in bytes (None when not traced).
+    - rows (int): Largest row count among the inputs (None without tabular inputs).
+    - input_bytes (int): Total size of the tabular inputs, in bytes.
+    - thread (int): Thread id.
+    - depth (int): Nesting level within its thread; 0 for outermost calls.
+    - error (str): Exception type if the call raised.
+    """
+    name: str
+    start: float
+    wall: float
+    cpu: float
+    memory: int
+    rows: int
+    input_bytes: int
+    thread: int
+    depth: int
+    error: str = None
+
+
+class _Recorder:
+    """
+    Spans recorded in one context since it was enabled or reset.
+    """
+
+    def __init__(self, memory: bool):
+        self.memory = memory
+        self.spans = []
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        if memory:
+            _hold_tracing()
+            weakref.finalize(self, _release_tracing)
+
+
+class _Tracing:
+    # Recorders tracing memory; tracemalloc is stopped when the last one goes, if it was started here
+    users = 0
+    started = False
+    lock = threading.Lock()
+
+
+def _hold_tracing():
+    with _Tracing.lock:
+        _Tracing.users += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _Tracing.started = True
+
+
+def _release_tracing():
+    with _Tracing.lock:
+        _Tracing.users -= 1
+        if _Tracing.users == 0 and _Tracing.started:
+            tracemalloc.stop()
+            _Tracing.started = False
+
+
+_recorder = contextvars.ContextVar("instrumentation_recorder")
+# Recorder of contexts that never called enable() / disable(): the PHANTOM_PROFILE one, if set
+_process_recorder = None
+_local = threading.local()
+
+
+def _current():
+    return _recorder.get(_process_recorder)
+
+
+def enable(memory: bool = False):
+    """
+    Starts a new recorder for the calling context; with `memory`, it also traces the peak memory of every span.
+    """
+    _recorder.set(_Recorder(memory))
+
+
+def disable():
+    """
+    Stops recording in the calling context.
+    """
+    _recorder.set(None)
+
+
+def is_enabled() -> bool:
+    return _current() is not None
+
+
+def reset():
+    """
+    Forgets the spans recorded in the calling context and restarts its clock.
+    """
+    recorder = _current()
+    if recorder is not None:
+        with recorder.lock:
+            recorder.spans = []
+            recorder.origin = time.perf_counter()
+
+
+def _input_size(values) -> tuple:
+    # Rows and bytes of dataframes, series and arrays; bytes of files given by path or upload
+    rows, size = None, 0
+    for value in values:
+        if hasattr(value, "memory_usage") and hasattr(value, "shape"):
+            usage = value.memory_usage(index=False, deep=False)
+            size += int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+        elif hasattr(value, "nbytes") and hasattr(value, "shape"):
+            size += int(value.nbytes)
+        else:
+            if isinstance(value, os.PathLike) and os.path.isfile(value):
+                size += os.path.getsize(value)
+            elif isinstance(getattr(value, "size", None), int):
+                size += value.size
+            continue
+        if value.shape:
+            rows = max(rows or 0, int(value.shape[0]))
+    return rows, size
+
+
+@contextmanager
+def span(name: str, *inputs):
+    """
+    Records the enclosed block as one span; `inputs` are the dataframes / arrays it works on, for the input size.
+    A no-op while recording is disabled.
+    """
+    recorder = _current()
+    if recorder is None:
+        yield
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    rows, input_bytes = _input_size(inputs)
+
+    # Peak memory: a child resets the tracemalloc peak, so its peak is folded into its parent's on exit
+    tracing = recorder.memory and tracemalloc.is_tracing()
+    frame = [0, 0]
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        frame = [current, current]
+        tracemalloc.reset_peak()
+    stack.append(frame)
+
+    error = None
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        wall_end, cpu_end = time.perf_counter(), time.thread_time()
+        stack.pop()
+        memory = None
+        if tracing and tracemalloc.is_tracing():
+            peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+            memory = peak - frame[0]
+            if stack:
+                stack[-1][1] = max(stack[-1][1], peak)
+        record = Span(name, wall - recorder.origin, wall_end - wall, cpu_end - cpu, memory, rows, input_bytes,
+                      threading.get_ident(), len(stack), error)
+        with recorder.lock:
+            recorder.spans.append(record)
+
+
+def instrument(func):
+    """
+    Decorator recording every call of `func` as a span named module.function while recording is enabled.
+    """
+    # A script run as __main__ (the Streamlit app) is named after its file
+    module = func.__module__
+    if module == "__main__":
+        module = os.path.splitext(os.path.basename(func.__code__.co_filename))[0]
+    name = f"{module}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _recorder.get(_process_recorder) is None:
+            return func(*args, **kwargs)
+        with span(name, *args, *kwargs.values()):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def spans() -> list:
+    """
+    Spans recorded in the calling context.
+    """
+    recorder = _current()
+    if recorder is None:
+        return []
+    with recorder.lock:
+        return list(recorder.spans)
+
+
+def elapsed() -> float:
+    """
+    Seconds since the calling context's recorder was enabled or reset.
+    """
+    recorder = _current()
+    return time.perf_counter() - recorder.origin if recorder is not None else 0.0
+
+
+def spans_frame():
+    """
+    The recorded spans as a dataframe, in start order.
+    """
+    import pandas as pd
+
+    return pd.DataFrame([asdict(s) for s in spans()], columns=[f.name for f in fields(Span)]).sort_values("start")
+
+
+def summary():
+    """
+    One row per span name, slowest first: calls, total and largest wall / CPU seconds, largest memory peak and
+    input rows.
+    """
+    import pandas as pd
+
+    records = spans_frame()
+    if records.empty:
+        return pd.DataFrame(columns=["calls", "wall", "max_wall", "cpu", "memory", "rows"])
+    grouped = records.groupby("name")
+    return pd.DataFrame({
+        "calls": grouped.size(),
+        "wall": grouped["wall"].sum(),
+        "max_wall": grouped["wall"].max(),
+        "cpu": grouped["cpu"].sum(),
+        "memory": grouped["memory"].max(),
+        "rows": grouped["rows"].max(),
+    }).sort_values("wall", ascending=False)
+
+
+def to_json() -> str:
+    return json.dumps([asdict(s) for s in spans()], indent=2)
+
+
+def to_chrome_trace() -> str:
+    """
+    The spans as complete ('X') events of the Chrome trace event format, in microseconds.
+    """
+    pid = os.getpid()
+    events = [{
+        "name": s.name,
+        "cat": s.name.split(".")[0],
+        "ph": "X",
+        "ts": round(s.start * 1e6, 3),
+        "dur": round(s.wall * 1e6, 3),
+        "pid": pid,
+        "tid": s.thread,
+        "args": {"cpu_ms": round(s.cpu * 1e3, 3), "memory_bytes": s.memory, "rows": s.rows,
+                 "input_bytes": s.input_bytes, "error": s.error},
+    } for s in spans()]
+    return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+
+
+if os.environ.get("PHANTOM_PROFILE"):
+    _process_recorder = _Recorder(memory=os.environ["PHANTOM_PROFILE"].lower() == "memory")
@@ -0,0 +1,303 @@
+"""
+Description :   Background jobs for the app's long computations (MCAR statistics, imputations, plots, comparisons), so
+                a rerun never blocks on them:
+            *    1. a job is keyed like a ResultCache entry (function plus argument fingerprints): a result already
+                    cached is returned at once, and a request identical to one in flight joins it instead of
+                    starting another, across sessions too
+            *    2. jobs run on a thread pool shared by the server process (numpy, pandas and scikit-learn release
+                    the GIL in their heavy loops, and arguments are not copied to reach the workers)
+            *    3. functions with a `progress` parameter get progress(done, total, message), which the page polls
+            *    4. a session holds one job per slot; when a slot's inputs change its previous job is released and,
+                    unless another session holds it, cancelled: dropped if it has not started, otherwise stopped at
+                    its next progress report (a function that never reports runs to completion and is cached)
+            *    5. a session that ends, or is not seen for `session_timeout` seconds, has all its jobs released
+
+Methods:    JobRunner(max_workers: int, cache: ResultCache, session_timeout: float).submit(func, *args, **kwargs) -> Job
+            JobRunner.track(slots: dict, slot: str, func, *args, **kwargs) -> Job
+            JobRunner.release(job: Job), JobRunner.prune(slots: dict, keep), JobRunner.close(slots: dict)
+"""
+import contextvars
+import inspect
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import ResultCache
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = "pending", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# How often a page with unfinished jobs reruns to pick up their progress, and how long a rerun waits for a new job
+# before showing it as running (quick jobs then render in the same rerun, without a progress bar flashing)
+POLL_SECONDS = 0.5
+GRACE_SECONDS = 0.25
+# A session whose page has not rerun for this long is taken as closed (a page with unfinished jobs reruns every
+# POLL_SECONDS, so only sessions with nothing running can reach it)
+SESSION_TIMEOUT = 15 * 60
+
+
+class JobCancelled(Exception):
+    """
+    Raised by Job.report inside a job whose result is no longer wanted.
+    """
+
+
+class Job:
+    """
+    One background computation.
+
+    Attributes:
+    - key (tuple): ResultCache key of the computation.
+    - name (str): module.function, for display.
+    - state (str): PENDING, RUNNING, DONE, FAILED or CANCELLED.
+    - done, total (float): Progress last reported by the function (total is None until it reports).
+    - message (str): Progress message last reported.
+    - result: Return value once DONE.
+    - error (Exception): Raised exception once FAILED.
+    - holders (int): Sessions holding the job; it is cancelled when the last one releases it.
+    """
+
+    def __init__(self, key: tuple, name: str):
+        self.key = key
+        self.name = name
+        self.state = PENDING
+        self.done = 0
+        self.total = None
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.holders = 0
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.ended = None
+        self._cancel = threading.Event()
+        self._ended = threading.Event()
+        self._future = None
+
+    @classmethod
+    def completed(cls, key: tuple, name: str, result) -> "Job":
+        job = cls(key, name)
+        job.state, job.result = DONE, result
+        job.started = job.ended = job.submitted
+        job._ended.set()
+        return job
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED
+
+    @property
+    def fraction(self) -> float:
+        """
+        Share of the work reported done, None if the function has not reported any.
+        """
+        if not self.total:
+            return None
+        return min(max(self.done / self.total, 0.0), 1.0)
+
+    @property
+    def seconds(self) -> float:
+        """
+        Running time so far, or until the job ended.
+        """
+        if self.started is None:
+            return 0.0
+        return (self.ended or time.perf_counter()) - self.started
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def report(self, done, total, message: str = ""):
+        """
+        Progress callback given to the function as `progress`.
+
+        Raises:
+        - JobCancelled if the job was cancelled, which ends it.
+        """
+        self.done, self.total, self.message = done, total, message
+        if self._cancel.is_set():
+            raise JobCancelled(self.name)
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Blocks until the job ended; returns False on timeout.
+        """
+        return self._ended.wait(timeout)
+
+    def __repr__(self):
+        progress = f", {self.fraction:.0%}" if self.fraction is not None else ""
+        return f"Job({self.name}, {self.state}{progress})"
+
+
+def _accepts_progress(func) -> bool:
+    try:
+        return "progress" in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+class JobRunner:
+    """
+    Thread pool of deduplicated, cancellable background jobs whose results go to a ResultCache.
+
+    Parameters:
+    - max_workers (int): Concurrent jobs, defaults to the number of CPUs (at most 4).
+    - cache (ResultCache): Where results are looked up and stored; a private cache by default.
+    - session_timeout (float): Seconds after its last prune when a session's jobs are released by another's.
+    """
+
+    def __init__(self, max_workers: int = None, cache: ResultCache = None, session_timeout: float = SESSION_TIMEOUT):
+        self.cache = cache if cache is not None else ResultCache()
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.session_timeout = session_timeout
+        self.deduplicated = 0
+        self.cancelled = 0
+        self._jobs = {}
+        # id(slots) -> (slots, time of its last prune), for every session holding jobs
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+
+    def submit(self, func, *args, **kwargs) -> Job:
+        """
+        Starts func(*args, **kwargs) in the background, or returns the job already computing it, or a finished
+        job if the result is cached. The caller holds the returned job until it calls release.
+        """
+        key = self.cache.key(func, *args, **kwargs)
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        missing = object()
+        value = self.cache.get(key, missing)
+        if value is not missing:
+            return Job.completed(key, name, value)
+
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                # Joining a job whose last holder just left revives it, unless it already stopped
+                job._cancel.clear()
+                job.holders += 1
+                self.deduplicated += 1
+                return job
+
+            job = self._jobs[key] = Job(key, name)
+            job.holders = 1
+            # In a copy of the submitter's context, so a profiled session records the jobs it started
+            job._future = self._executor.submit(contextvars.copy_context().run, self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job: Job, func, args, kwargs):
+        job.state, job.started = RUNNING, time.perf_counter()
+        try:
+            if job._cancel.is_set():
+                raise JobCancelled(job.name)
+            if _accepts_progress(func):
+                kwargs = {**kwargs, "progress": job.report}
+            value = func(*args, **kwargs)
+        except JobCancelled:
+            job.state = CANCELLED
+            self.cancelled += 1
+        except Exception as e:
+            job.error, job.state = e, FAILED
+        else:
+            # Kept even if the job was cancelled meanwhile: the work is done and the inputs may come back
+            self.cache.put(job.key, value)
+            job.result, job.state = value, DONE
+        finally:
+            job.ended = time.perf_counter()
+            with self._lock:
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+            job._ended.set()
+
+    def release(self, job: Job):
+        """
+        Drops the caller's hold on `job`; the last holder leaving cancels it if it has not finished.
+        """
+        with self._lock:
+            job.holders = max(job.holders - 1, 0)
+            if job.holders or job.finished:
+                return
+            job._cancel.set()
+            if job._future is not None and job._future.cancel():
+                # Never started: end it here, as _run will not
+                job.state, job.ended = CANCELLED, time.perf_counter()
+                self.cancelled += 1
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+                job._ended.set()
+
+    def track(self, slots: dict, slot: str, func, *args, **kwargs) -> Job:
+        """
+        The job computing func(*args, **kwargs) for `slot` of a session's `slots` (e.g. st.session_state):
+        unchanged inputs keep the slot's job, changed ones release the previous job and submit the new one.
+        A cancelled job is resubmitted; a failed one is kept, so a failing request is not retried every rerun.
+        """
+        key = self.cache.key(func, *args, **kwargs)
+        job = slots.get(slot)
+        if job is not None and job.key == key and job.state != CANCELLED:
+            return job
+        if job is not None:
+            self.release(job)
+        job = slots[slot] = self.submit(func, *args, **kwargs)
+        return job
+
+    def prune(self, slots: dict, keep):
+        """
+        Releases and forgets the jobs of every slot not in `keep` (the slots the current rerun asked for), at the
+        end of a session's rerun. Also closes the sessions that have not pruned for `session_timeout` seconds,
+        so a tab closed mid-run neither keeps its jobs running for nobody nor pins their results.
+        """
+        for slot in [slot for slot in slots if slot not in keep]:
+            self.release(slots.pop(slot))
+
+        now = time.monotonic()
+        with self._lock:
+            if slots:
+                self._sessions[id(slots)] = (slots, now)
+            else:
+                self._sessions.pop(id(slots), None)
+            expired = [other for other, seen in self._sessions.values() if now - seen > self.session_timeout]
+        for other in expired:
+            self.close(other)
+
+    def close(self, slots: dict):
+        """
+        Releases and forgets every job of a session's `slots`, when the session ended.
+        """
+        with self._lock:
+            self._sessions.pop(id(slots), None)
+        for slot in list(slots):
+            job = slots.pop(slot, None)
+            if job is not None:
+                self.release(job)
+
+    def active(self) -> list:
+        """
+        Jobs pending or running, oldest first.
+        """
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.submitted)
+
+    def stats(self) -> dict:
+        jobs = self.active()
+        return {"running": sum(job.state == RUNNING for job in jobs),
+                "pending": sum(job.state == PENDING for job in jobs),
+                "deduplicated": self.deduplicated, "cancelled": self.cancelled, "workers": self.max_workers,
+                "sessions": len(self._sessions)}
+
+    def shutdown(self, wait: bool = True):
+        """
+        Cancels every job and stops the pool.
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+            for job in jobs:
+                job._cancel.set()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        for job in jobs:
+            if job._future.cancelled():
+                job.state, job.ended = CANCELLED, time.perf_counter()
+                job._ended.set()
@@ -0,0 +1,314 @@
+"""
+Description :   Memory-compact dataset loading. Parses with the pyarrow engine, maps missing-value sentinels at
+                parse time and stores the frame in its narrowest representation:
+            *    1. Low-cardinality text (Gender, Blood Type, ...) as categoricals
+            *    2. High-cardinality text as Arrow-backed strings instead of Python objects
+            *    3. Numerics downcast to int8/16/32 or float32 when lossless
+
+                Reads CSV (optionally gzip/bz2/zip/xz/zstd compressed), Parquet and Feather/Arrow IPC files, with
+                column projection and row filters: unselected columns are never converted (CSV) or never read
+                (Parquet, Arrow), and Parquet row groups excluded by the filter statistics are skipped. A decoded
+                frame can be persisted as an uncompressed Arrow file and opened again memory-mapped, without
+                parsing or copying.
+
+Methods:    load_dataset(source, nan_indicator: list, category_threshold: float, columns: list, filters: list)
+                -> pd.DataFrame
+            compact_dataframe(df: pd.DataFrame, nan_indicator: list, category_threshold: float) -> pd.DataFrame
+            dataset_columns(source) -> list
+            preview_dataset(source, rows: int) -> pd.DataFrame
+            missing_percentages(source) -> pd.Series
+            save_arrow(df: pd.DataFrame, path) -> Path
+            open_arrow(path) -> pd.DataFrame
+            working_copy(df: pd.DataFrame, directory) -> Path
+"""
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import cache
+import nan_mapping
+from instrumentation import instrument, span
+
+# File suffix -> format, and compressed-CSV suffix -> pandas compression name
+FORMATS = {".csv": "csv", ".txt": "csv", ".parquet": "parquet", ".pq": "parquet", ".feather": "arrow",
+           ".arrow": "arrow", ".ipc": "arrow"}
+COMPRESSIONS = {".gz": "gzip", ".bz2": "bz2", ".zip": "zip", ".xz": "xz", ".zst": "zstd"}
+
+# Upload types accepted by the app
+UPLOAD_TYPES = ["csv", "txt", "gz", "bz2", "zip", "xz", "zst", "parquet", "pq", "feather", "arrow", "ipc"]
+
+# Where working_copy writes, unless told otherwise
+WORKDIR = Path(os.environ.get("PHANTOM_WORKDIR", Path(tempfile.gettempdir()) / "phantom_spectrum"))
+
+
+def _clean_column_names(columns) -> list:
+    # The pyarrow engine leaves blank headers empty where the C engine would write "Unnamed: i"
+    names, seen = [], set()
+    for i, name in enumerate(columns):
+        name = str(name) if str(name).strip() else f"Unnamed: {i}"
+        candidate, k = name, 0
+        while candidate in seen:
+            k += 1
+            candidate = f"{name}.{k}"
+        seen.add(candidate)
+        names.append(candidate)
+    return names
+
+
+@instrument
+def compact_dataframe(df: pd.DataFrame, nan_indicator=None, category_threshold: float = 0.5,
+                      map_sentinels: bool = True) -> pd.DataFrame:
+    """
+    Converts a dataframe to its compact representation (see module description).
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe, not modified.
+    - nan_indicator (list): Strings treated as missing, defaults to nan_mapping.NAN_INDICATORS.
+    - category_threshold (float): See nan_mapping.decode_nans.
+    - map_sentinels (bool): Set to False when the sentinels were already mapped at parse time.
+
+    Returns:
+    - pd.DataFrame: Compact dataframe.
+    """
+    df, _ = nan_mapping.decode_nans(df, nan_indicator, map_sentinels=map_sentinels,
+                                    category_threshold=category_threshold)
+
+    text_columns = [col for col in df.columns if df[col].dtype == object]
+    if text_columns:
+        df = df.astype({col: "string[pyarrow]" for col in text_columns})
+    return df
+
+
+def detect_format(source) -> tuple:
+    """
+    Returns (format, compression) from the file name of a path or an upload: format is 'csv', 'parquet' or
+    'arrow'; compression is a pandas compression name for compressed CSV, else None. Unknown names are CSV.
+    """
+    suffixes = [suffix.lower() for suffix in Path(str(getattr(source, "name", source))).suffixes]
+    compression = COMPRESSIONS.get(suffixes[-1]) if suffixes else None
+    if compression:
+        suffixes = suffixes[:-1]
+    file_format = FORMATS.get(suffixes[-1], "csv") if suffixes else "csv"
+    return file_format, compression if file_format == "csv" else None
+
+
+def _rewind(source):
+    # Uploads are read several times (columns, preview, load)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+
+def _arrow_reader(source) -> pa.ipc.RecordBatchFileReader:
+    # Paths are memory-mapped, so reading the table maps the file instead of copying it
+    if isinstance(source, (str, os.PathLike)):
+        return pa.ipc.open_file(pa.memory_map(str(source)))
+    return pa.ipc.open_file(pa.BufferReader(_rewind(source).read()))
+
+
+def _csv_header(source, compression) -> list:
+    # Header names exactly as written (blank headers stay blank), which is what the pyarrow engine matches
+    header = pd.read_csv(_rewind(source), header=None, nrows=1, dtype=str, keep_default_na=False,
+                         compression=compression)
+    return header.iloc[0].tolist() if len(header) else []
+
+
+def _filter_columns(filters) -> list:
+    # Column names used by a filter in pyarrow's DNF form: [(col, op, value), ...] or [[...], [...]]
+    if not filters:
+        return []
+    groups = filters if isinstance(filters[0], list) else [filters]
+    return list(dict.fromkeys(col for group in groups for col, _, _ in group))
+
+
+def _filter_frame(df: pd.DataFrame, filters) -> pd.DataFrame:
+    # Only the filtered columns go through Arrow; the surviving row positions select the rows
+    columns = _filter_columns(filters)
+    table = pa.Table.from_pandas(df[columns], preserve_index=False)
+    table = table.append_column("__row", pa.array(np.arange(len(df))))
+    rows = table.filter(pq.filters_to_expression(filters)).column("__row").to_numpy()
+    return df.take(rows).reset_index(drop=True)
+
+
+@instrument
+def dataset_columns(source) -> list:
+    """
+    Column names of a dataset (as load_dataset names them), read from the header or schema only.
+    """
+    file_format, compression = detect_format(source)
+    if file_format == "parquet":
+        names = pq.ParquetFile(_rewind(source)).schema_arrow.names
+    elif file_format == "arrow":
+        names = _arrow_reader(source).schema.names
+    else:
+        names = _csv_header(source, compression)
+    return _clean_column_names(names)
+
+
+@instrument
+def preview_dataset(source, rows: int = 5, nan_indicator=None) -> pd.DataFrame:
+    """
+    First `rows` rows of a dataset, without reading the rest of the file. Values are not type-decoded.
+    """
+    if nan_indicator is None:
+        nan_indicator = nan_mapping.NAN_INDICATORS
+
+    file_format, compression = detect_format(source)
+    if file_format == "parquet":
+        batch = next(pq.ParquetFile(_rewind(source)).iter_batches(batch_size=rows), None)
+        df = batch.to_pandas() if batch is not None else pd.DataFrame(columns=dataset_columns(source))
+    elif file_format == "arrow":
+        df = _arrow_reader(source).read_all().slice(0, rows).to_pandas()
+    else:
+        df = pd.read_csv(_rewind(source), nrows=rows, na_values=nan_indicator, compression=compression)
+    df.columns = dataset_columns(source)
+    return df
+
+
+@instrument
+def missing_percentages(source, nan_indicator=None) -> pd.Series:
+    """
+    Same output as cca.nan_percentage_per_column, without building the dataframe: Parquet null counts come
+    from the file metadata, Arrow files are scanned memory-mapped and CSV files are streamed in chunks.
+    """
+    file_format, compression = detect_format(source)
+    names = dataset_columns(source)
+
+    if file_format == "parquet":
+        metadata = pq.ParquetFile(_rewind(source)).metadata
+        statistics = [[metadata.row_group(i).column(j).statistics for j in range(metadata.num_columns)]
+                      for i in range(metadata.num_row_groups)]
+        if all(stat is not None and stat.has_null_count for group in statistics for stat in group):
+            counts = np.array([sum(group[j].null_count for group in statistics) for j in range(len(names))],
+                              dtype=np.int64)
+        else:
+            # Written without statistics: count from the data
+            counts = np.array([column.null_count for column in pq.read_table(_rewind(source)).columns])
+        total = metadata.num_rows
+    elif file_format == "arrow":
+        table = _arrow_reader(source).read_all()
+        counts = np.array([column.null_count + (pc.sum(pc.is_nan(column)).as_py() or 0
+                                                if pa.types.is_floating(column.type) else 0)
+                           for column in table.columns])
+        total = table.num_rows
+    else:
+        import profiler
+
+        profile = profiler.profile_csv(_rewind(source), nan_indicator=nan_indicator, compression=compression)
+        counts = np.array(list(profile.nan_counts.values()))
+        total = profile.total_rows
+
+    counts = pd.Series(counts, index=names, dtype="int64")
+    return round((counts / total) * 100, 2) if total else counts.astype(np.float64)
+
+
+@instrument
+def load_dataset(source, nan_indicator=None, category_threshold: float = 0.5, columns=None, filters=None,
+                 **read_csv_kwargs) -> pd.DataFrame:
+    """
+    Loads a CSV, compressed CSV, Parquet or Feather/Arrow file into a compact dataframe.
+
+    Parameters:
+    - source: Path or file-like object (e.g. a Streamlit upload) of the file; the format comes from its name.
+    - nan_indicator (list): Strings treated as missing, defaults to nan_mapping.NAN_INDICATORS.
+    - category_threshold (float): See nan_mapping.decode_nans.
+    - columns (list): Columns to load, as named by dataset_columns; defaults to every column.
+    - filters (list): Rows to keep, in pyarrow's DNF form, e.g. [("Age", ">=", 18)]. Pushed down to the
+      Parquet reader; applied right after parsing, before any decoding, for the other formats.
+    - read_csv_kwargs: Passed through to pd.read_csv.
+
+    Returns:
+    - pd.DataFrame: Compact dataframe with missing values decoded to NaN.
+    """
+    if nan_indicator is None:
+        nan_indicator = nan_mapping.NAN_INDICATORS
+
+    file_format, compression = detect_format(source)
+    names = dataset_columns(source) if columns is not None or filters else None
+    extra = [col for col in _filter_columns(filters) if columns is not None and col not in columns]
+    wanted = None if columns is None else list(columns) + extra
+
+    if file_format in ("parquet", "arrow"):
+        if file_format == "parquet":
+            with span("pyarrow.parquet.read_table"):
+                table = pq.read_table(_rewind(source), columns=wanted, filters=filters or None)
+        else:
+            table = _arrow_reader(source).read_all()
+            if wanted is not None:
+                table = table.select(wanted)
+            if filters:
+                table = table.filter(pq.filters_to_expression(filters))
+        # Without the pandas metadata, so columns come back as a CSV parse would give them (nullable Int64 with
+        # nulls as float64, string as object) and go through the same sentinel mapping and narrowing
+        df = table.to_pandas(ignore_metadata=True)
+        df.columns = _clean_column_names(df.columns)
+        map_sentinels = True
+    else:
+        read_csv_kwargs.setdefault("engine", "pyarrow")
+        read_csv_kwargs.setdefault("compression", compression)
+        if wanted is not None:
+            # The pyarrow engine matches raw header names
+            raw = dict(zip(names, _csv_header(source, compression)))
+            read_csv_kwargs["usecols"] = [raw[col] for col in wanted]
+        with span("pandas.read_csv"):
+            df = pd.read_csv(_rewind(source), na_values=nan_indicator, **read_csv_kwargs)
+        df.columns = wanted if wanted is not None else _clean_column_names(df.columns)
+        if filters:
+            df = _filter_frame(df, filters)
+        map_sentinels = False
+
+    if extra:
+        df = df.drop(columns=extra)
+    return compact_dataframe(df, nan_indicator, category_threshold=category_threshold, map_sentinels=map_sentinels)
+
+
+@instrument
+def save_arrow(df: pd.DataFrame, path) -> Path:
+    """
+    Writes a decoded frame as an uncompressed Arrow IPC file, the layout open_arrow can map without copying.
+    Float columns keep NaN as values rather than Arrow nulls, so they come back as numpy arrays over the map.
+    The file is written next to `path` first and renamed, so readers never see a partial file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, col in enumerate(df.columns):
+        if pd.api.types.is_float_dtype(df[col].dtype):
+            table = table.set_column(i, table.field(i), pa.array(df[col].to_numpy(), from_pandas=False))
+
+    partial = path.with_name(f"{path.name}.{os.getpid()}.partial")
+    with pa.OSFile(str(partial), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(partial, path)
+    return path
+
+
+@instrument
+def open_arrow(path) -> pd.DataFrame:
+    """
+    Opens a file written by save_arrow memory-mapped. Numeric columns are read-only numpy views of the map
+    and text columns are Arrow-backed strings over it; only categorical codes are materialized.
+    """
+    table = _arrow_reader(Path(path)).read_all()
+    return table.to_pandas(split_blocks=True, types_mapper={pa.string(): pd.StringDtype("pyarrow"),
+                                                            pa.large_string(): pd.StringDtype("pyarrow")}.get)
+
+
+@instrument
+def working_copy(df: pd.DataFrame, directory=None) -> Path:
+    """
+    Persists a frame with save_arrow under its content fingerprint (cache.fingerprint) and returns the path.
+    An identical frame maps to the same file, which is then reused instead of written again.
+
+    Parameters:
+    - df (pd.DataFrame): Decoded frame.
+    - directory: Target directory, defaults to $PHANTOM_WORKDIR or <tmp>/phantom_spectrum.
+    """
+    path = Path(directory or WORKDIR) / f"{cache.fingerprint(df)}.arrow"
+    return path if path.exists() else save_arrow(df, path)
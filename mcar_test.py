@@ -1,94 +1,461 @@
 """
 Description :   Performs Little’s MCAR test to statistically test whether missing values are
                 Missing Completely At Random (MCAR), helping justify if CCA is a valid choice.
+
+Methods:    little_mcar_test(data: pd.DataFrame, alpha: float) -> MCARResult
+            pattern_statistics(data: pd.DataFrame) -> PatternStatistics
+            is_mcar(data: pd.DataFrame) -> bool
 """
+import warnings
+from dataclasses import dataclass
+
 import pandas as pd
 import numpy as np
-from scipy.stats import chi2
-from sklearn.covariance import EmpiricalCovariance
 
+from instrumentation import instrument
+from missingness import missingness_index, pattern_codes
 
-def is_mcar(data: pd.DataFrame) -> bool:
+# Each pattern is tested against the pooled covariance sub-block of its observed columns, in correlation form;
+# a sub-block with a Cholesky pivot below RCOND is treated as singular and refactorized with a ridge on the diagonal
+RCOND = 1e-10
+JITTER_ATTEMPTS = 4
+
+# EM for the pooled maximum-likelihood mean and covariance: stops once no entry (in standard deviations) moves by
+# more than EM_TOL, or after EM_MAX_ITER iterations
+EM_TOL = 1e-6
+EM_MAX_ITER = 200
+
+# Patterns with no observed column carry nothing to test and are only listed in MCARResult.skipped; the other
+# reasons drop rows the test could have used, and are also warned about
+UNTESTABLE = ("no observed columns",)
+
+
+@dataclass
+class MCARResult:
     """
-    Approximate Little's MCAR test.
+    Outcome of Little's MCAR test.
+
+    Attributes:
+    - statistic (float): Little's d2: over the patterns, n_j (mean_j - mu)' inv(sigma) (mean_j - mu) on the
+      pattern's observed columns, with mu and sigma the pooled maximum-likelihood (EM) estimates.
+    - degrees_of_freedom (int): Observed columns summed over the tested patterns, minus the number of columns.
+    - p_value (float): Upper tail probability of the statistic under a Chi-squared distribution.
+    - alpha (float): Significance level used by `is_mcar`.
+    - patterns (pd.DataFrame): One row per missingness pattern with its size, contribution, the ridge added to
+      its covariance sub-block (0 when it factorized as is) and, when the pattern could not be used, the reason.
+    - em_iterations (int): EM iterations run for the pooled estimates.
+    """
+    statistic: float
+    degrees_of_freedom: int
+    p_value: float
+    alpha: float
+    patterns: pd.DataFrame
+    em_iterations: int = 0
+
+    @property
+    def is_mcar(self) -> bool:
+        return self.p_value > self.alpha
+
+    @property
+    def skipped(self) -> pd.DataFrame:
+        """
+        The patterns left out of the statistic, with the reason.
+        """
+        return self.patterns[self.patterns["skipped"].notna()]
+
+
+@instrument
+def little_mcar_test(data: pd.DataFrame, alpha: float = 0.05) -> MCARResult:
+    """
+    Little's MCAR test, grouping rows by bit-packed missingness pattern in a single pass. The pooled mean and
+    covariance are estimated by EM from the per-pattern means and scatter matrices, without revisiting the rows.
+    Every numeric column that is not entirely missing takes part, complete ones included (missingness that depends
+    on them is what the test detects); patterns that cannot be used are listed in MCARResult.skipped, and those
+    dropped for their values (non-finite, singular) rather than for having nothing observed (UNTESTABLE) are also
+    reported with a RuntimeWarning.
 
     Parameters:
     - data: pd.DataFrame with missing values
+    - alpha: significance level used to decide MCAR
 
     Returns:
-    - True if data is likely MCAR (p-value > 0.05)
-    - False if data is likely NOT MCAR (p-value <= 0.05)
+    - MCARResult with the statistic, degrees of freedom, p-value and per-pattern diagnostics
 
     Raises:
     - ValueError if not enough missing data patterns or data to perform test.
     """
 
-    # Step 1: Keep only columns with at least some missing data but not all missing
-    df = data.copy()
-    df = df.loc[:, df.isnull().any() & ~df.isnull().all()]
+    # Step 1: Keep the numeric columns that are not entirely missing; at least one must have missing values
+    index = missingness_index(data)
+    numeric = _numeric_columns(data)
+    keep = _test_columns(index, numeric)
+
+    # Step 2: Group rows by missingness pattern, derived from the shared index without rescanning the frame
+    groups = index.subset(keep)
+
+    # Step 3: Per-pattern means and scatter matrices of the kept columns in one pass over the rows
+    values, infinite = _finite_values(data, np.flatnonzero(keep))
+    means, scatter, nonfinite = _pattern_moments(values, infinite, groups.row_patterns, groups.pattern_counts)
+
+    return _mcar_result(data.columns[keep].to_numpy(), groups.pattern_masks, groups.pattern_counts,
+                        means, scatter, nonfinite, alpha)
+
+
+def _test_columns(index, numeric: np.ndarray) -> np.ndarray:
+    keep = numeric & (index.null_counts < index.n_rows)
+    if not (keep & (index.null_counts > 0)).any():
+        raise ValueError("Need at least one numeric column with missing values for MCAR test.")
+    return keep
+
+
+def _numeric_columns(data: pd.DataFrame) -> np.ndarray:
+    return np.array([pd.api.types.is_numeric_dtype(dtype) for dtype in data.dtypes], dtype=bool)
+
+
+def _finite_values(data: pd.DataFrame, positions: np.ndarray) -> tuple:
+    # Dense float matrix of the given columns with missing and infinite entries zeroed, and where the infinite
+    # entries were
+    values = np.empty((len(data), len(positions)))
+    for k, j in enumerate(positions):
+        values[:, k] = data.iloc[:, j].to_numpy(dtype=np.float64, na_value=np.nan)
+    infinite = np.isinf(values)
+    values[~np.isfinite(values)] = 0.0
+    return values, infinite
+
+
+def _pattern_moments(values: np.ndarray, infinite: np.ndarray, row_patterns: np.ndarray, counts: np.ndarray) -> tuple:
+    # Rows sorted by pattern once; every pattern is then a contiguous block, centered on its own mean so the
+    # scatter matrix (one matmul) carries no cancellation error. Single-row patterns have a zero scatter matrix
+    # and are not touched, so their part of the zeroed array is never paged in
+    n_patterns, width = len(counts), values.shape[1]
+    order = np.argsort(row_patterns, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+    ordered = values[order]
+
+    means = np.zeros((n_patterns, width))
+    scatter = np.zeros((n_patterns, width, width))
+    nonfinite = np.zeros((n_patterns, width), dtype=bool)
+    if n_patterns:
+        means = np.add.reduceat(ordered, starts, axis=0) / counts[:, None]
+        nonfinite = np.logical_or.reduceat(infinite[order], starts, axis=0)
+    for g in np.flatnonzero(counts > 1):
+        block = ordered[starts[g]:starts[g] + counts[g]] - means[g]
+        scatter[g] = block.T @ block
+    return means, scatter, nonfinite
+
+
+def _forward_substitution(lower: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+    # Solves lower @ x = rhs for a stack of lower triangular matrices, one batched row-times-block product per row
+    solution = np.empty_like(rhs)
+    for k in range(lower.shape[-1]):
+        solution[:, k] = (rhs[:, k] - (lower[:, k, None, :k] @ solution[:, :k])[:, 0]) / lower[:, k, k, None]
+    return solution
+
+
+def _cholesky(corr: np.ndarray) -> tuple:
+    """
+    Lower Cholesky factors of a stack of correlation matrices, adding a growing ridge to the diagonal of those
+    that are singular or ill-conditioned.
+
+    Parameters:
+    - corr (np.ndarray): Array (groups, p, p) of correlation matrices (unit diagonal).
+
+    Returns:
+    - (factors, jitter, ok): the factors, the ridge added to each matrix and whether it could be factorized.
+    """
+    n_groups, p, _ = corr.shape
+    factors = np.zeros_like(corr)
+    jitter = np.zeros(n_groups)
+    ok = np.zeros(n_groups, dtype=bool)
+
+    # Step 1: One batched factorization; numpy rejects the whole stack if any matrix is not positive definite
+    try:
+        factors = np.linalg.cholesky(corr)
+        pivots = np.diagonal(factors, axis1=1, axis2=2) ** 2
+        ok = pivots.min(axis=1) > RCOND
+    except np.linalg.LinAlgError:
+        pass
 
-    if df.shape[1] < 2:
-        raise ValueError("Need at least two columns with missing values for MCAR test.")
+    # Step 2: The remaining matrices one by one, with a ridge growing a hundredfold per attempt
+    for g in np.flatnonzero(~ok):
+        for attempt in range(JITTER_ATTEMPTS):
+            ridge = RCOND * 100.0 ** attempt
+            try:
+                factors[g] = np.linalg.cholesky(corr[g] + ridge * np.eye(p))
+            except np.linalg.LinAlgError:
+                continue
+            jitter[g], ok[g] = ridge, True
+            break
 
-    # Step 2: Create a matrix indicating missingness (1 = missing, 0 = observed)
-    missing_indicator = df.isnull().astype(int)
+    return factors, jitter, ok
 
-    # Step 3: Identify unique missing data patterns in the dataset
-    unique_patterns = missing_indicator.drop_duplicates()
 
-    test_statistic = 0
-    degrees_of_freedom = 0
+def _blocks(observed: np.ndarray, ids: np.ndarray, k: int) -> tuple:
+    # Observed column positions (first k) then missing ones, per pattern of `ids`, all with k observed columns
+    order = np.argsort(~observed[ids], axis=1, kind="stable")
+    return order, order[:, :k], order[:, k:]
 
-    # Step 4: For each missing data pattern group:
-    for _, pattern_row in unique_patterns.iterrows():
-        # Find rows matching this missing pattern
-        mask = (missing_indicator == pattern_row.values).all(axis=1)
-        group = df[mask]
 
-        # Skip groups with too few rows to analyze
-        if len(group) < 2:
-            continue
+def _sub(matrix: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    # Stack of sub-blocks matrix[rows[g]][:, cols[g]]
+    return matrix[rows[:, :, None], cols[:, None, :]]
 
-        # Step 5: Select only observed (non-missing) columns for this group
-        observed_data = group.dropna(axis=1)
 
-        # Need at least two columns observed to calculate covariance
-        if observed_data.shape[1] < 2:
-            continue
+def _em_estimates(observed: np.ndarray, counts: np.ndarray, means: np.ndarray, scatters: np.ndarray) -> tuple:
+    """
+    Maximum-likelihood mean and covariance of a multivariate normal from per-pattern sufficient statistics, by EM.
+
+    Parameters:
+    - observed (np.ndarray): Boolean (patterns, columns), True where the pattern observes the column.
+    - counts (np.ndarray): Rows per pattern.
+    - means (np.ndarray): Array (patterns, columns) of means over the observed entries.
+    - scatters (np.ndarray): Array (patterns, columns, columns) of cross-products about the pattern means.
+
+    Returns:
+    - (mu, sigma, iterations)
+    """
+    n_rows, p = counts.sum(), observed.shape[1]
+    groups = {k: np.flatnonzero(observed.sum(axis=1) == k) for k in np.unique(observed.sum(axis=1))}
+    blocks = {k: _blocks(observed, ids, k) for k, ids in groups.items()}
 
-        try:
-            # Calculate mean vector of observed data
-            mean_vector = observed_data.mean().values
+    # Step 1: Start from the available-case means and variances, no correlations
+    weights = observed * counts[:, None]
+    mu = (means * weights).sum(axis=0) / np.maximum(weights.sum(axis=0), 1)
+    spread = (np.diagonal(scatters, axis1=1, axis2=2) + weights * (means - mu) ** 2).sum(axis=0)
+    sigma = np.diag(spread / np.maximum(weights.sum(axis=0), 1))
 
-            # Calculate covariance matrix of observed data
-            cov_matrix = EmpiricalCovariance().fit(observed_data).covariance_
+    iteration = 0
+    for iteration in range(1, EM_MAX_ITER + 1):
+        shift = np.zeros(p)
+        scatter = np.zeros((p, p))
+        for k, ids in groups.items():
+            order, o, m = blocks[k]
+            n = counts[ids].astype(np.float64)
+            g = np.arange(len(ids))
 
-            # Calculate inverse of covariance matrix (use pseudo-inverse for stability)
-            inv_cov_matrix = np.linalg.pinv(cov_matrix)
+            # Step 2 (E): regression of the missing columns on the observed ones under the current estimates,
+            # then the pattern's expected mean and scatter on every column
+            sigma_oo = _sub(sigma, o, o) + RCOND * np.eye(k)
+            sigma_om = _sub(sigma, o, m)
+            solved = np.linalg.solve(sigma_oo, sigma_om)
+            slope = solved.transpose(0, 2, 1)
+            conditional = _sub(sigma, m, m) - sigma_om.transpose(0, 2, 1) @ solved
 
-            # Center the observed data by subtracting mean vector
-            centered_data = observed_data - mean_vector
+            deviation_o = np.take_along_axis(means[ids], o, axis=1) - mu[o]
+            deviation = np.concatenate([deviation_o, (slope @ deviation_o[:, :, None])[:, :, 0]], axis=1)
+            scatter_oo = scatters[ids][g[:, None, None], o[:, :, None], o[:, None, :]]
+            cross = slope @ scatter_oo
+            block = np.concatenate([
+                np.concatenate([scatter_oo, cross.transpose(0, 2, 1)], axis=2),
+                np.concatenate([cross, cross @ slope.transpose(0, 2, 1) + n[:, None, None] * conditional], axis=2),
+            ], axis=1) + n[:, None, None] * deviation[:, :, None] * deviation[:, None, :]
 
-            # Compute Mahalanobis distances squared for all rows in the group
-            # Using einsum for efficient matrix multiplication
-            mahalanobis_sq = np.einsum('ij,jk,ik->i', centered_data.values, inv_cov_matrix, centered_data.values)
+            # Back from (observed, missing) order to column order
+            full = np.empty_like(block)
+            full[g[:, None, None], order[:, :, None], order[:, None, :]] = block
+            scatter += full.sum(axis=0)
+            np.add.at(shift, order, n[:, None] * deviation)
 
-            # Sum of Mahalanobis distances squared contributes to test statistic
-            test_statistic += mahalanobis_sq.sum()
+        # Step 3 (M): pooled mean and covariance of the completed statistics
+        shift /= n_rows
+        new_sigma = scatter / n_rows - np.outer(shift, shift)
+        change = max(np.abs(shift).max(), np.abs(new_sigma - sigma).max())
+        mu, sigma = mu + shift, new_sigma
+        if change <= EM_TOL:
+            break
+    return mu, sigma, iteration
 
-            # Degrees of freedom accumulate: number of observations * number of variables
-            degrees_of_freedom += observed_data.shape[0] * observed_data.shape[1]
 
-        except Exception as e:
-            # If any error occurs (e.g., singular matrix), skip this group
-            continue
+def _mcar_result(columns, pattern_masks, counts, means, scatters, nonfinite, alpha) -> MCARResult:
+    n_patterns = len(counts)
+    observed = ~pattern_masks
+    skipped = np.full(n_patterns, None, dtype=object)
+    contribution = np.full(n_patterns, np.nan)
+    jitter = np.zeros(n_patterns)
+    dof = np.zeros(n_patterns, dtype=np.int64)
 
-    # Step 6: Check if we have valid degrees of freedom to perform test
-    if degrees_of_freedom == 0:
+    # Step 4: Patterns the estimates can use
+    skipped[(nonfinite & observed).any(axis=1)] = "non-finite values"
+    skipped[observed.sum(axis=1) == 0] = "no observed columns"
+    used = np.flatnonzero(pd.isnull(skipped))
+    if len(used) == 0:
         raise ValueError("Insufficient complete data to perform MCAR test.")
 
-    # Step 7: Calculate p-value from Chi-squared distribution
-    p_value = 1 - chi2.cdf(test_statistic, df=degrees_of_freedom)
+    # Step 5: Pooled mean and covariance by EM, in standard deviations of the observed values so one tolerance fits
+    # every column (the statistic does not depend on the scale)
+    weights = observed[used] * counts[used, None]
+    center = (means[used] * weights).sum(axis=0) / np.maximum(weights.sum(axis=0), 1)
+    spread = (np.diagonal(scatters[used], axis1=1, axis2=2) + weights * (means[used] - center) ** 2).sum(axis=0)
+    scale = np.sqrt(spread / np.maximum(weights.sum(axis=0), 1))
+    scale[scale <= RCOND * np.abs(center)] = 1.0
+    scale[scale == 0] = 1.0
+    means = np.where(observed, (means - center) / scale, 0.0)
+    scatters = scatters / np.outer(scale, scale)
+    mu, sigma, em_iterations = _em_estimates(observed[used], counts[used], means[used], scatters[used])
 
-    # Step 8: Return True if p-value > 0.05 (fail to reject MCAR), else False
-    return p_value > 0.05
+    # Step 6: d2 contribution n_j r' inv(sigma_oo) r of every pattern, r its mean deviation on the observed columns;
+    # sigma_oo = D C D with C = L L' a correlation matrix, so the contribution is n_j |inv(L) inv(D) r|^2
+    n_observed = observed.sum(axis=1)
+    for k in np.unique(n_observed[used]):
+        ids = used[n_observed[used] == k]
+        _, o, _ = _blocks(observed, ids, k)
+        sigma_oo = _sub(sigma, o, o)
+        sd = np.sqrt(np.clip(np.diagonal(sigma_oo, axis1=1, axis2=2), 0.0, None))
+        sd[sd == 0] = 1.0
+        corr = sigma_oo / (sd[:, :, None] * sd[:, None, :])
+        factors, ridge, ok = _cholesky(corr)
+        skipped[ids[~ok]] = "singular covariance"
+
+        residual = (np.take_along_axis(means[ids], o, axis=1) - mu[o]) / sd
+        ids, factors, residual = ids[ok], factors[ok], residual[ok]
+        z = _forward_substitution(factors, residual[:, :, None].copy())[:, :, 0]
+        contribution[ids] = counts[ids] * (z ** 2).sum(axis=1)
+        jitter[ids] = ridge[ok]
+        dof[ids] = k
+
+    tested = pd.isnull(skipped)
+    test_statistic = float(np.nansum(contribution))
+    degrees_of_freedom = int(dof.sum()) - int(observed[tested].any(axis=0).sum())
+
+    patterns = pd.DataFrame({
+        "missing_columns": [tuple(columns[m]) for m in pattern_masks],
+        "n_rows": counts,
+        "n_observed": n_observed,
+        "statistic": contribution,
+        "degrees_of_freedom": dof,
+        "jitter": jitter,
+        "skipped": skipped,
+    })
+
+    # Step 7: Report the patterns left out rather than dropping them silently
+    left_out = patterns["skipped"].notna() & ~patterns["skipped"].isin(UNTESTABLE)
+    if left_out.any():
+        reasons = patterns.loc[left_out, "skipped"].value_counts()
+        warnings.warn(f"MCAR test skipped {int(left_out.sum())} of {n_patterns} missingness patterns "
+                      f"({int(patterns.loc[left_out, 'n_rows'].sum())} rows): "
+                      + ", ".join(f"{count} {reason}" for reason, count in reasons.items()),
+                      RuntimeWarning)
+
+    # Step 8: Check if we have valid degrees of freedom to perform test (a single tested pattern has none)
+    if degrees_of_freedom <= 0:
+        raise ValueError("Insufficient complete data to perform MCAR test.")
+
+    # Step 9: Calculate p-value from Chi-squared distribution
+    from scipy.stats import chi2
+
+    p_value = float(chi2.sf(test_statistic, df=degrees_of_freedom))
+
+    return MCARResult(test_statistic, degrees_of_freedom, p_value, alpha, patterns, em_iterations)
+
+
+@dataclass
+class PatternStatistics:
+    """
+    Sufficient statistics of the MCAR test for every missingness pattern of the full frame: row count, means
+    and scatter matrices (cross-products about the pattern mean) of the numeric columns.
+
+    Dropping columns only merges patterns, and a merged group's scatter matrix is the sum of its members'
+    scatter matrices plus n_i (mean_i - mean)(mean_i - mean)^T for every member (the pairwise update, which
+    loses no precision to cancellation). So the test, and the CCA data
+    loss, for any subset of columns costs O(patterns x columns^2) without touching the rows, which is what
+    lets the app preview them while columns are toggled.
+
+    Memory grows with patterns x numeric columns^2; for very wide frames with many distinct patterns use
+    little_mcar_test on the reduced frame instead.
+
+    Attributes:
+    - index (MissingnessIndex): Shared missingness index of the frame.
+    - numeric (np.ndarray): Boolean per column, True for numeric columns.
+    - means (np.ndarray): Array (patterns, numeric columns) of means over observed entries (0 elsewhere).
+    - scatter (np.ndarray): Array (patterns, numeric columns, numeric columns) of centered cross-products.
+    - nonfinite (np.ndarray): Boolean (patterns, numeric columns), True where an observed value is infinite.
+    """
+    index: object
+    numeric: np.ndarray
+    means: np.ndarray
+    scatter: np.ndarray
+    nonfinite: np.ndarray
+
+    @classmethod
+    @instrument
+    def from_frame(cls, data: pd.DataFrame) -> "PatternStatistics":
+        """
+        One pass over the numeric columns: rows are sorted by pattern once and every statistic is a block sum.
+        """
+        index = missingness_index(data)
+        numeric = _numeric_columns(data)
+        values, infinite = _finite_values(data, np.flatnonzero(numeric))
+        means, scatter, nonfinite = _pattern_moments(values, infinite, index.row_patterns, index.pattern_counts)
+        return cls(index, numeric, means, scatter, nonfinite)
+
+    @instrument
+    def data_loss_percentage(self, dropped=()) -> float:
+        """
+        CCA data loss without the `dropped` columns (see MissingnessIndex.data_loss_percentage).
+        """
+        return self.index.data_loss_percentage(dropped)
+
+    @instrument
+    def little_mcar_test(self, dropped=(), alpha: float = 0.05) -> MCARResult:
+        """
+        little_mcar_test of the frame without the `dropped` columns, from the per-pattern statistics.
+        Matches the frame-based test up to floating point rounding.
+
+        Raises:
+        - ValueError as little_mcar_test.
+        """
+        index = self.index
+        dropped = set(dropped)
+        active = np.array([col not in dropped for col in index.columns], dtype=bool)
+
+        # Step 1: Numeric columns not entirely missing, among those not dropped
+        keep = _test_columns(index, active & self.numeric)
+
+        # Step 2: Merge patterns that only differ in the other columns and add up their statistics
+        pattern_masks, merge, _ = pattern_codes(index.pattern_masks[:, keep])
+        n_groups = len(pattern_masks)
+        counts = np.bincount(merge, weights=index.pattern_counts, minlength=n_groups).astype(np.int64)
+
+        kept = keep[self.numeric]
+        width = int(kept.sum())
+        weights = index.pattern_counts[:, None]
+        member_means = self.means[:, kept]
+        means = np.zeros((n_groups, width))
+        np.add.at(means, merge, member_means * weights)
+        means /= counts[:, None]
+
+        deviation = member_means - means[merge]
+        scatter = np.zeros((n_groups, width, width))
+        np.add.at(scatter, merge, self.scatter[:, kept][:, :, kept]
+                  + weights[:, :, None] * deviation[:, :, None] * deviation[:, None, :])
+        nonfinite = np.zeros((n_groups, width), dtype=bool)
+        np.logical_or.at(nonfinite, merge, self.nonfinite[:, kept])
+
+        names = np.array(index.columns, dtype=object)[keep]
+        return _mcar_result(names, pattern_masks, counts, means, scatter, nonfinite, alpha)
+
+
+@instrument
+def pattern_statistics(data: pd.DataFrame) -> PatternStatistics:
+    """
+    PatternStatistics.from_frame, as a plain function so it can go through cache.ResultCache.call.
+    """
+    return PatternStatistics.from_frame(data)
+
+
+@instrument
+def is_mcar(data: pd.DataFrame) -> bool:
+    """
+    Approximate Little's MCAR test.
+
+    Parameters:
+    - data: pd.DataFrame with missing values
+
+    Returns:
+    - True if data is likely MCAR (p-value > 0.05)
+    - False if data is likely NOT MCAR (p-value <= 0.05)
+
+    Raises:
+    - ValueError if not enough missing data patterns or data to perform test.
+    """
+    return little_mcar_test(data, alpha=0.05).is_mcar
@@ -0,0 +1,362 @@
+"""
+Description :   Multivariate imputation by chained equations (MICE): each column with missing values is modelled on
+                the other columns in turn, using the latest imputations of its predictors, and the cycle repeats
+                until the imputations stop changing.
+            *    1. Numeric columns: ridge regression, solved in closed form
+            *    2. Categorical and text columns (as produced by nan_mapping.nan_decoding): a linear one-vs-rest
+                    least-squares classifier on the category codes; they enter other models one-hot encoded and
+                    are filled with their own categories
+            *    3. Each column is modelled on the predictors correlated with it (see MIN_CORRELATION), so columns
+                    that do not predict each other are fitted concurrently in waves; the waves keep the visiting
+                    order between dependent columns, so the result is the same as the serial chain
+            *    4. A previous run's MICEState warm-starts the next run on a slightly changed frame: its
+                    imputations seed the rows it already saw and its models seed the rest
+
+Methods:    impute_mice(df: pd.DataFrame, columns: list, max_iter: int, tol: float, ...) -> MICEResult
+            mice_result(df: pd.DataFrame, **options) -> MICEResult
+            can_model(column: pd.Series) -> bool
+"""
+import os
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# Text columns with more distinct values than this (names, ids...) are neither modelled nor used as predictors
+MAX_CATEGORIES = 50
+
+# Predictors whose absolute correlation with a column (after the initial fill) is below this are left out of its
+# model: they add little to it, and every predictor left out is a dependency less between the waves
+MIN_CORRELATION = 0.05
+
+
+@dataclass
+class MICEState:
+    """
+    Fitted state of a run, enough to warm-start the next one.
+
+    Attributes:
+    - layout (list): (column, categories or None for numeric) of every modelled column, in design order.
+    - means, stds (dict): Standardization of each numeric column.
+    - models (dict): Target column -> (predictor columns, predictor means, weights, target means).
+    - imputed (dict): Target column -> pd.Series of the imputed values, indexed by row label.
+    """
+    layout: list
+    means: dict
+    stds: dict
+    models: dict = field(default_factory=dict)
+    imputed: dict = field(default_factory=dict)
+
+
+@dataclass
+class MICEResult:
+    """
+    Attributes:
+    - columns (dict): Column name -> imputed pd.Series, ready for imputation.with_imputed.
+    - state (MICEState): Fitted state, to pass as `warm_start` to a later run.
+    - iterations (pd.DataFrame): Cost of every iteration: wall and CPU seconds, largest change of a column's
+      imputations (mean absolute change in standard deviations for numeric columns, share of changed categories
+      otherwise) and number of waves.
+    - column_seconds (dict): Column name -> seconds spent fitting and predicting it over all iterations.
+    - converged (bool): True if the changes fell below `tol` before `max_iter`.
+    - warm_started (bool): True if the `warm_start` state fitted this frame and was used.
+    """
+    columns: dict
+    state: MICEState
+    iterations: pd.DataFrame
+    column_seconds: dict
+    converged: bool
+    warm_started: bool = False
+
+
+def _codes(column: pd.Series) -> tuple:
+    # Category codes (-1 where missing) and the categories they index
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy().astype(np.int64), column.cat.categories
+    codes, uniques = pd.factorize(column, sort=True)
+    return codes.astype(np.int64), pd.Index(uniques)
+
+
+def can_model(column: pd.Series) -> bool:
+    """
+    True if impute_mice can model the column: numeric, boolean, or categorical / text with at most MAX_CATEGORIES
+    values.
+    """
+    if pd.api.types.is_numeric_dtype(column):
+        return True
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return 0 < len(column.cat.categories) <= MAX_CATEGORIES
+    if pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column):
+        return 0 < column.nunique() <= MAX_CATEGORIES
+    return False
+
+
+def _layout(df: pd.DataFrame) -> list:
+    # Modelled columns: numeric, boolean (as 0/1) and categorical / text with at most MAX_CATEGORIES values
+    layout = []
+    for col in df.columns:
+        column = df[col]
+        if can_model(column):
+            layout.append((col, None if pd.api.types.is_numeric_dtype(column) else list(_codes(column)[1])))
+    return layout
+
+
+def _fit_predict(X: np.ndarray, predictors: np.ndarray, observed: np.ndarray, missing: np.ndarray, Y: np.ndarray,
+                 ridge: float) -> tuple:
+    # Ridge regression of Y (observed rows) on the predictor columns of X, with an intercept through centering
+    A = X[np.ix_(observed, predictors)]
+    x_mean = A.mean(axis=0)
+    A -= x_mean
+    y_mean = Y.mean(axis=0)
+    gram = A.T @ A
+    gram[np.diag_indices_from(gram)] += ridge * len(A)
+    weights = np.linalg.solve(gram, A.T @ (Y - y_mean))
+    return (x_mean, weights, y_mean), _predict(X, predictors, missing, (x_mean, weights, y_mean))
+
+
+def _predict(X: np.ndarray, predictors: np.ndarray, rows: np.ndarray, model: tuple) -> np.ndarray:
+    x_mean, weights, y_mean = model
+    return (X[np.ix_(rows, predictors)] - x_mean) @ weights + y_mean
+
+
+def _waves(order: list, predictors: dict) -> list:
+    # b depends on a when a is one of its predictors; dependent columns keep their order, the rest share a wave
+    level = {}
+    for k, col in enumerate(order):
+        earlier = [level[other] for other in order[:k] if other in predictors[col] or col in predictors[other]]
+        level[col] = max(earlier, default=-1) + 1
+    waves = [[] for _ in range(max(level.values(), default=-1) + 1)]
+    for col in order:
+        waves[level[col]].append(col)
+    return waves
+
+
+def impute_mice(df: pd.DataFrame, columns=None, max_iter: int = 10, tol: float = 1e-2, ridge: float = 1e-3,
+                min_correlation: float = MIN_CORRELATION, n_nearest_features: int = None,
+                warm_start: MICEState = None, max_workers: int = None, progress=None) -> MICEResult:
+    """
+    Imputes `columns` of `df` by chained equations.
+
+    Columns are visited from the least to the most missing. Each is fitted on the rows where it is observed and
+    predicted where it is missing, from the current values of its predictors; missing predictor values start
+    at the column mean (numeric) or mode (categorical).
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe, not modified.
+    - columns (list): Columns to impute, defaults to every modelled column with some values missing.
+    - max_iter (int): Most cycles over the columns.
+    - tol (float): Stop once no column's imputations change by more than this: mean absolute change in standard
+      deviations for numeric columns, share of changed values for categorical ones.
+    - ridge (float): Ridge penalty per row; keeps one-hot and collinear predictors well conditioned.
+    - min_correlation (float): Each column is modelled on the predictors whose absolute correlation with it is at
+      least this (for a categorical column or predictor, the largest over its categories); 0 keeps them all.
+      Fewer predictors mean fewer dependencies, so more columns share a wave.
+    - n_nearest_features (int): If set, each column is modelled on at most this many of those predictors, the
+      most correlated first.
+    - warm_start (MICEState): State of a previous run on a similar frame (same columns and categories).
+    - max_workers (int): Threads fitting the columns of a wave, defaults to the number of CPUs.
+    - progress (callable): Optional progress(iteration, max_iter, message) called after every cycle.
+
+    Returns:
+    - MICEResult: Imputed columns, fitted state and per-iteration costs.
+
+    Raises:
+    - ValueError: If a requested column cannot be modelled or has no observed values.
+    """
+    n_rows = len(df)
+    layout = _layout(df)
+    kinds = dict(layout)
+    modelled = [col for col, _ in layout]
+    if columns is None:
+        columns = [col for col in modelled if df[col].isnull().any() and df[col].notnull().any()]
+    empty = [col for col in columns if df[col].notnull().sum() == 0]
+    if empty:
+        raise ValueError(f"Columns {empty} have no observed values to model.")
+    unsupported = [col for col in columns if col not in modelled]
+    if unsupported:
+        raise ValueError(f"Columns {unsupported} cannot be imputed by MICE: only numeric columns and categorical or "
+                         f"text columns with at most {MAX_CATEGORIES} categories are supported.")
+
+    warm = warm_start is not None and warm_start.layout == layout
+    means, stds = (dict(warm_start.means), dict(warm_start.stds)) if warm else ({}, {})
+
+    # Step 1: Design matrix of every modelled column (standardized numeric, one-hot categorical). Infinite values
+    # are modelled as missing but kept in the output, where only NaNs are replaced
+    blocks, parts, codes, missing, nan = {}, [], {}, {}, {}
+    width = 0
+    for col, categories in layout:
+        column = df[col]
+        if categories is None:
+            values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+            nan[col] = np.isnan(values)
+            missing[col] = ~np.isfinite(values)
+            finite = values[~missing[col]]
+            if col not in means:
+                means[col] = float(finite.mean()) if len(finite) else 0.0
+                std = float(finite.std()) if len(finite) else 0.0
+                stds[col] = std if std > 0 else 1.0
+            part = np.where(missing[col], np.nan, (values - means[col]) / stds[col])[:, None]
+        else:
+            codes[col] = _codes(column)[0]
+            missing[col] = nan[col] = codes[col] < 0
+            part = np.zeros((n_rows, len(categories)))
+            part[np.flatnonzero(~missing[col]), codes[col][~missing[col]]] = 1.0
+            part[missing[col]] = np.nan
+        blocks[col] = np.arange(width, width + part.shape[1])
+        width += part.shape[1]
+        parts.append(part)
+    X = np.hstack(parts) if parts else np.empty((n_rows, 0))
+
+    # Step 2: Initial fill: column mean / mode, then the previous run's imputations and models if warm
+    for col, categories in layout:
+        rows = np.flatnonzero(missing[col])
+        if categories is None:
+            X[rows, blocks[col][0]] = 0.0
+        else:
+            X[np.ix_(rows, blocks[col])] = np.eye(len(categories))[np.bincount(codes[col][codes[col] >= 0],
+                                                                               minlength=len(categories)).argmax()]
+
+    if warm:
+        unique_index = df.index.is_unique
+        for col in columns:
+            rows = np.flatnonzero(nan[col])
+            seen = np.zeros(len(rows), dtype=bool)
+            previous = warm_start.imputed.get(col)
+            if previous is not None and unique_index and len(rows):
+                found = previous.reindex(df.index[rows])
+                seen = found.notnull().to_numpy()
+                if seen.any():
+                    _set(X, blocks[col], rows[seen], found[seen], means.get(col), stds.get(col), kinds[col])
+            rows = np.flatnonzero(missing[col])[~np.isin(np.flatnonzero(missing[col]), rows[seen])]
+            model = warm_start.models.get(col)
+            if model is not None and model[0] and len(rows):
+                predictor_names, *fitted = model
+                used = np.concatenate([blocks[p] for p in predictor_names])
+                _store(X, blocks[col], rows, _predict(X, used, rows, tuple(fitted)), kinds[col] is None)
+
+    # Step 3: Predictors of each column and the waves they allow
+    order = sorted(columns, key=lambda col: (missing[col].sum(), modelled.index(col)))
+    predictors = {col: [p for p in modelled if p != col] for col in columns}
+    if min_correlation > 0 or n_nearest_features is not None:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = np.nan_to_num(np.abs(np.corrcoef(X, rowvar=False)), nan=0.0)
+        for col in columns:
+            score = {p: corr[np.ix_(blocks[col], blocks[p])].max() for p in predictors[col]}
+            predictors[col] = [p for p in predictors[col] if score[p] >= min_correlation]
+            if n_nearest_features is not None:
+                predictors[col] = sorted(predictors[col], key=lambda p: -score[p])[:n_nearest_features]
+    waves = _waves(order, {col: predictors.get(col, []) for col in order})
+
+    # Step 4: Chained cycles until the imputations stop changing
+    models = {}
+    column_seconds = {col: 0.0 for col in columns}
+    history = []
+    converged = False
+    max_workers = max_workers or os.cpu_count() or 1
+
+    def update(col):
+        start = time.perf_counter()
+        observed, rows = np.flatnonzero(~missing[col]), np.flatnonzero(missing[col])
+        target = X[np.ix_(observed, blocks[col])]
+        if not predictors[col]:
+            model = (np.empty(0), np.empty((0, target.shape[1])), target.mean(axis=0))
+            prediction = np.repeat(model[2][None, :], len(rows), axis=0)
+        else:
+            columns_used = np.concatenate([blocks[p] for p in predictors[col]])
+            model, prediction = _fit_predict(X, columns_used, observed, rows, target, ridge)
+        return col, model, prediction, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for iteration in range(1, max_iter + 1):
+            wall, cpu = time.perf_counter(), time.process_time()
+            change = 0.0
+            for wave in waves:
+                if len(wave) > 1 and max_workers > 1:
+                    updates = list(pool.map(update, wave))
+                else:
+                    updates = [update(col) for col in wave]
+                for col, model, prediction, seconds in updates:
+                    rows = np.flatnonzero(missing[col])
+                    before = X[np.ix_(rows, blocks[col])]
+                    _store(X, blocks[col], rows, prediction, kinds[col] is None)
+                    after = X[np.ix_(rows, blocks[col])]
+                    if len(rows):
+                        if kinds[col] is None:
+                            change = max(change, float(np.abs(after - before).mean()))
+                        else:
+                            change = max(change, float((after.argmax(axis=1) != before.argmax(axis=1)).mean()))
+                    models[col] = (predictors[col], *model)
+                    column_seconds[col] += seconds
+            history.append({"iteration": iteration, "seconds": time.perf_counter() - wall,
+                            "cpu_seconds": time.process_time() - cpu, "max_change": change, "waves": len(waves)})
+            if progress is not None:
+                progress(iteration, max_iter, f"MICE iteration {iteration}, change {change:.3g}")
+            if change <= tol:
+                converged = True
+                break
+
+    # Step 5: Back to the columns' own values and dtypes
+    imputed = {}
+    for col in columns:
+        column = df[col]
+        rows = np.flatnonzero(nan[col])
+        categories = kinds[col]
+        if categories is None:
+            values = column.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+            values[rows] = X[rows, blocks[col][0]] * stds[col] + means[col]
+            imputed[col] = pd.Series(values, index=df.index, name=col).astype(
+                np.float32 if column.dtype == np.float32 else np.float64)
+        else:
+            filled = codes[col].copy()
+            filled[rows] = X[np.ix_(rows, blocks[col])].argmax(axis=1)
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                imputed[col] = pd.Series(pd.Categorical.from_codes(filled, dtype=column.dtype), index=df.index,
+                                         name=col)
+            else:
+                imputed[col] = pd.Series(np.asarray(categories, dtype=object)[filled], index=df.index,
+                                         name=col).astype(column.dtype)
+
+    state = MICEState(layout, means, stds, models, {col: imputed[col][nan[col]] for col in columns})
+    return MICEResult(imputed, state, pd.DataFrame(history, columns=["iteration", "seconds", "cpu_seconds",
+                                                                     "max_change", "waves"]),
+                      column_seconds, converged, warm)
+
+
+def _store(X: np.ndarray, block: np.ndarray, rows: np.ndarray, prediction: np.ndarray, numeric: bool):
+    # Numeric predictions are kept as they are, class scores become the one-hot of the winning category
+    if numeric:
+        X[rows, block[0]] = prediction[:, 0]
+    else:
+        X[np.ix_(rows, block)] = np.eye(len(block))[prediction.argmax(axis=1)]
+
+
+def _set(X: np.ndarray, block: np.ndarray, rows: np.ndarray, values: pd.Series, mean, std, categories):
+    # Previous imputations (in the column's own values) written into the design matrix
+    if categories is None:
+        X[rows, block[0]] = (values.to_numpy(dtype=np.float64) - mean) / std
+    else:
+        positions = pd.Index(categories).get_indexer(values.astype(object))
+        known = positions >= 0
+        X[np.ix_(rows[known], block)] = np.eye(len(block))[positions[known]]
+
+
+# Results of live dataframes, so imputing their columns one at a time shares one run
+_results = {}
+
+
+def mice_result(df: pd.DataFrame, progress=None, **options) -> MICEResult:
+    """
+    impute_mice of every modelled column with missing values, run on first use and remembered for as long as the
+    frame lives (see missingness.missingness_index). Frames must not be modified in place. `progress` is only
+    reported to by the call that runs impute_mice.
+    """
+    key = (id(df), tuple(sorted(options.items())))
+    entry = _results.get(key)
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    result = impute_mice(df, progress=progress, **options)
+    _results[key] = (weakref.ref(df, lambda _, key=key: _results.pop(key, None)), result)
+    return result
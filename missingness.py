@@ -0,0 +1,227 @@
+"""
+Description :   Missingness index computed once per dataframe and shared by CCA, the MCAR test and the missingness
+                plots:
+            *    1. Packed bitmaps: one bit per row for every column, True where the value is missing
+            *    2. Pattern codes: the missingness pattern id of every row
+            *    3. Pattern table: the distinct patterns and how many rows have each
+
+                Row counts, per-column NaN counts and CCA data loss are read from the pattern table rather than
+                from the data. Dropping columns derives the new index from the old pattern table (a few patterns
+                times a few columns) instead of scanning the frame again.
+
+Methods:    pattern_codes(mask: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray)
+            missingness_index(df: pd.DataFrame) -> MissingnessIndex
+            drop_columns(df: pd.DataFrame, columns: list) -> pd.DataFrame
+"""
+import weakref
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Indexes of live dataframes, so every consumer of an unchanged frame shares one scan
+_indexes = {}
+
+
+def pattern_codes(mask: np.ndarray):
+    """
+    Bit-packs every row of a boolean missingness mask into a single pattern code and groups identical rows.
+
+    Parameters:
+    - mask (np.ndarray): Boolean array of shape (rows, columns), True where the value is missing.
+
+    Returns:
+    - pattern_masks (np.ndarray): Boolean array (patterns, columns), one row per distinct pattern.
+    - inverse (np.ndarray): Pattern id of every input row.
+    - counts (np.ndarray): Number of rows belonging to each pattern.
+    """
+    packed = np.packbits(mask, axis=1)
+
+    # Up to 64 columns fit in one machine word; wider frames compare the packed bytes directly
+    if packed.shape[1] <= 8:
+        words = np.zeros((packed.shape[0], 8), dtype=np.uint8)
+        words[:, :packed.shape[1]] = packed
+        codes = words.view(np.uint64).ravel()
+    else:
+        packed = np.ascontiguousarray(packed)
+        codes = packed.view(np.dtype((np.void, packed.shape[1]))).ravel()
+
+    _, first, inverse, counts = np.unique(codes, return_index=True, return_inverse=True, return_counts=True)
+    return mask[first], inverse.ravel(), counts
+
+
+def _narrow_ids(ids: np.ndarray, n_patterns: int) -> np.ndarray:
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_patterns <= np.iinfo(dtype).max:
+            return ids.astype(dtype, copy=False)
+    return ids
+
+
+@dataclass
+class MissingnessIndex:
+    """
+    Missingness of a dataframe, built once by `missingness_index`.
+
+    Attributes:
+    - columns (list): Column names, in frame order.
+    - n_rows (int): Number of rows.
+    - bitmaps (np.ndarray): uint8 array (columns, ceil(rows / 8)), np.packbits of each column's missing mask.
+    - null_counts (np.ndarray): Missing values per column.
+    - pattern_masks (np.ndarray): Boolean array (patterns, columns), the distinct missingness patterns.
+    - row_patterns (np.ndarray): Pattern id of every row (smallest integer type that fits).
+    - pattern_counts (np.ndarray): Rows per pattern.
+    """
+    columns: list
+    n_rows: int
+    bitmaps: np.ndarray
+    null_counts: np.ndarray
+    pattern_masks: np.ndarray
+    row_patterns: np.ndarray
+    pattern_counts: np.ndarray
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "MissingnessIndex":
+        """
+        Builds the index with a single isnull() scan of the frame.
+        """
+        mask = df.isnull().to_numpy()
+        pattern_masks, inverse, counts = pattern_codes(mask)
+        return cls(
+            columns=df.columns.tolist(),
+            n_rows=len(df),
+            bitmaps=np.packbits(mask.T, axis=1),
+            null_counts=mask.sum(axis=0),
+            pattern_masks=pattern_masks,
+            row_patterns=_narrow_ids(inverse, len(counts)),
+            pattern_counts=counts,
+        )
+
+    def _positions(self, columns) -> np.ndarray:
+        lookup = {col: j for j, col in enumerate(self.columns)}
+        return np.array([lookup[col] for col in columns], dtype=np.int64)
+
+    def column_mask(self, column) -> np.ndarray:
+        """
+        Boolean missing mask of one column, unpacked from its bitmap.
+        """
+        j = self._positions([column])[0]
+        return np.unpackbits(self.bitmaps[j], count=self.n_rows).view(bool)
+
+    def mask(self, columns=None) -> np.ndarray:
+        """
+        Boolean missing mask (rows, columns) of the given columns, defaulting to all of them.
+        """
+        positions = np.arange(len(self.columns)) if columns is None else self._positions(columns)
+        return np.unpackbits(self.bitmaps[positions], axis=1, count=self.n_rows).T.view(bool)
+
+    def _active(self, dropped) -> np.ndarray:
+        dropped = set(dropped)
+        return np.array([col not in dropped for col in self.columns], dtype=bool)
+
+    def missing_per_pattern(self, dropped=()) -> np.ndarray:
+        """
+        Number of missing columns in every pattern, not counting the `dropped` columns. Every row shares the
+        count of its pattern, so this is the per-row missing count in O(patterns) instead of O(rows).
+        """
+        return self.pattern_masks[:, self._active(dropped)].sum(axis=1)
+
+    def row_missing_counts(self, dropped=()) -> np.ndarray:
+        """
+        Number of missing values in every row, not counting the `dropped` columns.
+        """
+        return self.missing_per_pattern(dropped)[self.row_patterns]
+
+    def incomplete_patterns(self, dropped=()) -> np.ndarray:
+        """
+        Boolean array over patterns, True for patterns with at least one missing column (dropped ones aside).
+        """
+        return self.missing_per_pattern(dropped) > 0
+
+    def complete_rows(self, dropped=()) -> np.ndarray:
+        """
+        Boolean array over rows, True for rows CCA keeps.
+        """
+        return ~self.incomplete_patterns(dropped)[self.row_patterns]
+
+    def rows_with_missing(self, dropped=()) -> int:
+        return int(self.pattern_counts[self.incomplete_patterns(dropped)].sum())
+
+    def data_loss_percentage(self, dropped=()) -> float:
+        """
+        Same output as cca.data_loss_percentage, on the frame without the `dropped` columns. Costs
+        O(patterns x columns), so previews can call it every time the selection changes.
+        """
+        return round((self.rows_with_missing(dropped) / self.n_rows) * 100, 2)
+
+    def nan_percentage_per_column(self) -> pd.Series:
+        """
+        Same output as cca.nan_percentage_per_column.
+        """
+        counts = pd.Series(self.null_counts, index=pd.Index(self.columns, dtype=object), dtype="int64")
+        return round((counts / self.n_rows) * 100, 2)
+
+    def pattern_frequencies(self) -> pd.DataFrame:
+        """
+        Missingness patterns sorted by frequency, with their share of all rows (as MissingnessProfile).
+        """
+        columns = np.array(self.columns, dtype=object)
+        order = np.argsort(-self.pattern_counts, kind="stable")
+        patterns = pd.DataFrame({
+            "missing_columns": [tuple(columns[self.pattern_masks[g]]) for g in order],
+            "n_rows": self.pattern_counts[order],
+        })
+        patterns["percentage"] = round((patterns["n_rows"] / self.n_rows) * 100, 2)
+        return patterns
+
+    def drop(self, columns) -> "MissingnessIndex":
+        """
+        Index of the frame without `columns`, derived from the pattern table (see subset).
+        """
+        return self.subset(self._active(columns))
+
+    def subset(self, keep: np.ndarray) -> "MissingnessIndex":
+        """
+        Index of the frame restricted to the columns where `keep` is True. Patterns that only differed in the
+        other columns merge and rows are relabelled through the merge; the frame is not scanned.
+        """
+        keep = np.asarray(keep, dtype=bool)
+        pattern_masks, merge, _ = pattern_codes(self.pattern_masks[:, keep])
+        counts = np.bincount(merge, weights=self.pattern_counts, minlength=len(pattern_masks)).astype(np.int64)
+        return MissingnessIndex(
+            columns=[col for col, k in zip(self.columns, keep) if k],
+            n_rows=self.n_rows,
+            bitmaps=self.bitmaps[keep],
+            null_counts=self.null_counts[keep],
+            pattern_masks=pattern_masks,
+            row_patterns=_narrow_ids(merge[self.row_patterns], len(pattern_masks)),
+            pattern_counts=counts,
+        )
+
+
+def _remember(df: pd.DataFrame, index: MissingnessIndex) -> MissingnessIndex:
+    key = id(df)
+    _indexes[key] = (weakref.ref(df, lambda _, key=key: _indexes.pop(key, None)), index)
+    return index
+
+
+def missingness_index(df: pd.DataFrame) -> MissingnessIndex:
+    """
+    Missingness index of a dataframe, built on first use and remembered for as long as the frame lives.
+    As with cache.fingerprint, frames must not be modified in place once indexed.
+    """
+    entry = _indexes.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    return _remember(df, MissingnessIndex.from_frame(df))
+
+
+def drop_columns(df: pd.DataFrame, columns) -> pd.DataFrame:
+    """
+    df.drop(columns=columns), with the result's missingness index derived incrementally from the index of
+    `df` when that one has been built already.
+    """
+    dropped = df.drop(columns=columns)
+    entry = _indexes.get(id(df))
+    if entry is not None and entry[0]() is df:
+        _remember(dropped, entry[1].drop(columns))
+    return dropped
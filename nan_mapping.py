@@ -2,20 +2,29 @@
 Description :   Load data and find insight like:
             *    1. Total Missing Values (by column and overall)
             *    2. Percentage of missing data
-            *    3. Heatmap/Matrix data for visualization
+            *    3. Heatmap/Matrix data for visualization (see missingness.py)
             *    4. How many rows would be lost with CCA
             *    5. import MCAR from mcar_test.py
             *    6. filling missing data
             *    7. data cleaning by CCA
 """
 
+import time
+import warnings
+
 import pandas as pd
 import numpy as np
 
+from instrumentation import instrument
+
+# Strings treated as a missing value when no explicit indicator list is given
+NAN_INDICATORS = ["?", "NA", "N/A", "na", "--", "null", "None", ""]
+
+@instrument
 def nan_decoding(df: pd.DataFrame, nan_indicator=None):
     # Step 1: Replace common missing indicators with NaN
     if nan_indicator is None:
-        nan_indicator = ["?", "NA", "N/A", "na", "--", "null", "None", ""]
+        nan_indicator = NAN_INDICATORS
 
     # Step 2: Attempt to convert each column to numeric or datetime
     for col in df.columns:
@@ -28,3 +37,154 @@ def nan_decoding(df: pd.DataFrame, nan_indicator=None):
 
     return df
 
+
+
+def _narrow_numeric(values: pd.Series) -> pd.Series:
+    # Integers go to the smallest int type that holds their range; nullable integers (Int64 with NA) keep their
+    # missing values in the matching nullable type (Int8, Int16, Int32)
+    if pd.api.types.is_integer_dtype(values.dtype):
+        if values.isna().all():
+            return values
+        nullable = isinstance(values.dtype, pd.api.extensions.ExtensionDtype)
+        low, high = values.min(), values.max()
+        for dtype in (np.int8, np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return values.astype(f"Int{info.bits}" if nullable else dtype)
+        return values
+
+    # Whole floats become integers only within the range where float64 holds every integer exactly (|x| <= 2**53,
+    # well inside int64); beyond it the cast would round or overflow
+    array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    finite = np.isfinite(array)
+    if (finite.all() and len(array) and -2.0 ** 53 <= array.min() and array.max() <= 2.0 ** 53
+            and (array == np.round(array)).all()):
+        return _narrow_numeric(pd.Series(array.astype(np.int64), index=values.index, name=values.name))
+
+    # float32 only when every value survives the round trip, so no precision is lost
+    narrow = array.astype(np.float32)
+    if np.array_equal(narrow.astype(np.float64), array, equal_nan=True):
+        return pd.Series(narrow, index=values.index, name=values.name)
+    return values.astype(np.float64)
+
+
+def _parses(values: pd.Series, parser) -> pd.Series:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return parser(values, errors="coerce")
+
+
+def _decode_column(series: pd.Series, nan_indicator, category_threshold: float) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return _narrow_numeric(series)
+    # Text: object columns and the pandas string dtypes (string, string[pyarrow])
+    if series.dtype != object and not isinstance(series.dtype, pd.StringDtype):
+        return series
+
+    # Step 1: One hashing pass; everything below works on the distinct values only
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Series(uniques, dtype=object)
+
+    # Step 2: Sentinels to NaN (code -1)
+    sentinel = uniques.isin(nan_indicator).to_numpy()
+    if sentinel.any():
+        remap = np.where(sentinel, -1, np.cumsum(~sentinel) - 1)
+        codes = np.where(codes >= 0, remap[codes], -1)
+        uniques = uniques[~sentinel].reset_index(drop=True)
+    observed = codes >= 0
+
+    if len(uniques) == 0:
+        return pd.Series(np.full(len(series), np.nan, dtype=np.float32), index=series.index, name=series.name)
+
+    # Step 3: Numbers, then dates; a small probe first so text columns never pay for a full failed parse
+    probe = uniques.iloc[:20]
+    if _parses(probe, pd.to_numeric).notna().all():
+        numbers = _parses(uniques, pd.to_numeric)
+        if numbers.notna().all():
+            array = np.where(observed, numbers.to_numpy(dtype=np.float64)[codes], np.nan)
+            return _narrow_numeric(pd.Series(array, index=series.index, name=series.name))
+
+    if probe.map(lambda v: isinstance(v, str)).all() and _parses(probe, pd.to_datetime).notna().all():
+        dates = _parses(uniques, pd.to_datetime)
+        if dates.notna().all():
+            array = np.where(observed, dates.to_numpy()[codes], np.datetime64("NaT"))
+            return pd.Series(array, index=series.index, name=series.name)
+
+    # Step 4: Low-cardinality text becomes a categorical built straight from the codes
+    if len(uniques) <= category_threshold * observed.sum():
+        if pd.api.types.infer_dtype(uniques, skipna=False) == "string":
+            order = np.argsort(uniques.to_numpy())
+            rank = np.empty_like(order)
+            rank[order] = np.arange(len(order))
+            codes = np.where(observed, rank[codes], -1)
+            uniques = uniques.iloc[order]
+        categorical = pd.Categorical.from_codes(codes, categories=pd.Index(uniques, dtype=object))
+        return pd.Series(categorical, index=series.index, name=series.name)
+
+    return series.where(observed) if sentinel.any() else series
+
+
+@instrument
+def decode_nans(df: pd.DataFrame, nan_indicator=None, map_sentinels: bool = True,
+                category_threshold: float = 0.5):
+    """
+    Maps missing-value sentinels to NaN and converts every column to the narrowest dtype in one pass per column.
+
+    Unlike nan_decoding, sentinels are mapped before type inference, so a numeric column containing "?" or "NA"
+    becomes numeric. The input dataframe is not modified.
+
+    Parameters:
+    - df (pd.DataFrame): Input dataframe.
+    - nan_indicator (list): Strings treated as missing, defaults to NAN_INDICATORS.
+    - map_sentinels (bool): Set to False when the sentinels were already mapped at parse time
+      (see read_csv_decoded).
+    - category_threshold (float): Text columns whose number of distinct values is at most this fraction of
+      their observed values become categoricals.
+
+    Returns:
+    - pd.DataFrame: Decoded dataframe (int8/16/32, float32, category, datetime where possible).
+    - pd.DataFrame: Per-column report with dtypes, bytes before/after, bytes saved and seconds spent.
+    """
+    if nan_indicator is None:
+        nan_indicator = NAN_INDICATORS
+    sentinels = nan_indicator if map_sentinels else []
+
+    columns, report = [], []
+    for i in range(df.shape[1]):
+        series = df.iloc[:, i]
+        start = time.perf_counter()
+        decoded = _decode_column(series, sentinels, category_threshold)
+        seconds = time.perf_counter() - start
+
+        bytes_before = series.memory_usage(index=False, deep=True)
+        bytes_after = decoded.memory_usage(index=False, deep=True)
+        report.append((df.columns[i], str(series.dtype), str(decoded.dtype),
+                       bytes_before, bytes_after, bytes_before - bytes_after, seconds))
+        columns.append(decoded)
+
+    decoded_df = pd.concat(columns, axis=1) if columns else df.copy()
+    decoded_df.columns = df.columns
+    report = pd.DataFrame(report, columns=["column", "dtype_before", "dtype_after", "bytes_before",
+                                           "bytes_after", "bytes_saved", "seconds"]).set_index("column")
+    return decoded_df, report
+
+
+@instrument
+def read_csv_decoded(source, nan_indicator=None, category_threshold: float = 0.5, **read_csv_kwargs):
+    """
+    Reads a CSV with the sentinels mapped to NaN by the parser itself (read_csv(na_values=...)), then
+    narrows the dtypes with decode_nans.
+
+    Parameters:
+    - source: Path or file-like object of the CSV file.
+    - nan_indicator (list): Strings treated as missing, defaults to NAN_INDICATORS.
+    - category_threshold (float): See decode_nans.
+    - read_csv_kwargs: Passed through to pd.read_csv.
+
+    Returns:
+    - pd.DataFrame, pd.DataFrame: Decoded dataframe and per-column report, as decode_nans.
+    """
+    if nan_indicator is None:
+        nan_indicator = NAN_INDICATORS
+    df = pd.read_csv(source, na_values=nan_indicator, **read_csv_kwargs)
+    return decode_nans(df, map_sentinels=False, category_threshold=category_threshold)
@@ -0,0 +1,300 @@
+"""
+Description :   Non-interactive version of the app's flow, for batch jobs: load and decode NaNs, profile the missing
+                data, run the MCAR test, recommend CCA or imputation, apply it and write the cleaned dataset as
+                Parquet. Plotting libraries are only imported when plots are requested.
+
+Methods:    recommend(mcar: bool, data_loss: float, max_loss: float) -> str
+            run_pipeline(source, output_dir, ...) -> PipelineReport
+            run_many(sources: list, output_dir, workers: int, ...) -> list
+            output_name(source) -> str
+            run_partitioned(source, output_dir, ...) -> PipelineReport
+"""
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+import cca
+import loader
+import batch_imputation
+from mcar_test import little_mcar_test
+
+
+@dataclass
+class PipelineReport:
+    """
+    What the pipeline found and did for one file.
+    """
+    source: str
+    output: str = None
+    rows: int = 0
+    rows_written: int = 0
+    columns: list = field(default_factory=list)
+    nan_percentage: dict = field(default_factory=dict)
+    data_loss: float = 0.0
+    mcar: dict = field(default_factory=dict)
+    recommendation: str = None
+    plan: dict = field(default_factory=dict)
+    seconds: dict = field(default_factory=dict)
+    plots: list = field(default_factory=list)
+    error: str = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), indent=2, default=str)
+
+
+def recommend(mcar: bool, data_loss: float, max_loss: float = 10.0) -> str:
+    """
+    Same rule as the app: CCA when the data is MCAR and CCA would drop at most `max_loss` percent of the rows,
+    otherwise imputation ('none' when nothing is missing).
+    """
+    if data_loss == 0:
+        return "none"
+    return "cca" if mcar and data_loss <= max_loss else "impute"
+
+
+def _write_plots(before, after, output_dir: Path, stem: str) -> list:
+    import visualizations as VG
+
+    plot_dir = output_dir / f"{stem}_plots"
+    plot_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    for col in before.columns:
+        if not before[col].isnull().any():
+            continue
+        numeric = pd.api.types.is_numeric_dtype(before[col]) and not pd.api.types.is_bool_dtype(before[col])
+        method = "hist" if numeric else "bar"
+        for label, frame in (("before", before), ("after", after)):
+            path = plot_dir / f"{col}_{label}.png"
+            path.write_bytes(VG.distribution_png(frame[col].rename(f"{col} ({label})"), method))
+            written.append(str(path))
+    return written
+
+
+def output_name(source) -> str:
+    """
+    Stem of a source's outputs: the file name without its compression and format suffixes ("a.2024.csv.gz" gives
+    "a.2024"); a directory keeps its name.
+    """
+    path = Path(source)
+    if path.is_dir():
+        return path.name
+    name = path.name
+    if path.suffix.lower() in loader.COMPRESSIONS:
+        name = name[:-len(path.suffix)]
+    return Path(name).stem or name
+
+
+def _output_names(sources) -> list:
+    # Sources sharing a stem (data.csv, data.parquet) are told apart by their full file name (data_csv, data_parquet);
+    # sources that still collide (same name in different directories) would overwrite each other's outputs
+    stems = [output_name(source) for source in sources]
+    names = [Path(source).name.replace(".", "_") if stems.count(stem) > 1 else stem
+             for source, stem in zip(sources, stems)]
+    seen = {}
+    for source, name in zip(sources, names):
+        if name in seen:
+            raise ValueError(f"{seen[name]} and {source} would both write outputs named '{name}'; "
+                             f"rename one or process them into separate output directories")
+        seen[name] = source
+    return names
+
+
+def run_pipeline(source, output_dir, strategy: str = "auto", plan: dict = None, drop_columns=None,
+                 filters=None, max_loss: float = 10.0, numeric_method: str = "median", object_method: str = "mode",
+                 seed=None, plots: bool = False, name: str = None) -> PipelineReport:
+    """
+    Runs the whole cleaning flow on one file.
+
+    Parameters:
+    - source: Path of the input file (CSV, compressed CSV, Parquet or Feather/Arrow).
+    - output_dir: Directory receiving <name>.parquet, <name>.report.json and, with plots, <name>_plots/.
+    - strategy (str): 'auto' (follow the recommendation), 'cca' or 'impute'.
+    - plan (dict): Column -> imputation method; columns not in the plan use the default methods below.
+    - drop_columns (list): Columns dropped before the analysis, as in the app's drop step; they are not read.
+    - filters (list): Rows to keep, in pyarrow's DNF form (see loader.load_dataset).
+    - max_loss (float): Highest CCA data loss percentage still recommended for CCA.
+    - numeric_method, object_method (str): Default imputation methods.
+    - seed (int): Seed for the random imputation methods.
+    - plots (bool): Also write before/after distribution plots of every imputed column.
+    - name (str): Stem of the output files, defaults to output_name(source).
+
+    Returns:
+    - PipelineReport, also written next to the output.
+    """
+    source, output_dir = Path(source), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    report = PipelineReport(source=str(source))
+    timer = time.perf_counter()
+
+    def lap(step):
+        nonlocal timer
+        now = time.perf_counter()
+        report.seconds[step] = round(now - timer, 4)
+        timer = now
+
+    # Step 1: Load and decode NaNs
+    columns = None
+    if drop_columns:
+        columns = [c for c in loader.dataset_columns(source) if c not in drop_columns]
+    df = loader.load_dataset(source, columns=columns, filters=filters)
+    report.rows, report.columns = len(df), df.columns.tolist()
+    lap("load")
+
+    # Step 2: Profile
+    report.nan_percentage = cca.nan_percentage_per_column(df).to_dict()
+    report.data_loss = cca.data_loss_percentage(df) if len(df) else 0.0
+    lap("profile")
+
+    # Step 3: MCAR test
+    try:
+        result = little_mcar_test(df)
+        report.mcar = {"is_mcar": result.is_mcar, "p_value": result.p_value,
+                       "statistic": result.statistic, "degrees_of_freedom": result.degrees_of_freedom,
+                       "skipped_patterns": len(result.skipped)}
+    except ValueError as e:
+        report.mcar = {"is_mcar": False, "error": str(e)}
+    lap("mcar")
+
+    # Step 4: Recommend and apply
+    report.recommendation = recommend(report.mcar["is_mcar"], report.data_loss, max_loss)
+    action = report.recommendation if strategy == "auto" else strategy
+
+    if action == "cca":
+        cleaned = cca.complete_case_analysis(df)
+    elif action == "impute":
+        report.plan = {**batch_imputation.default_plan(df, numeric_method, object_method), **(plan or {})}
+        cleaned = batch_imputation.impute_plan(df, report.plan, executor="thread", seed=seed).apply(df)
+    else:
+        cleaned = df
+    lap("clean")
+
+    # Step 5: Write
+    output = output_dir / f"{name or output_name(source)}.parquet"
+    cleaned.to_parquet(output, index=False)
+    report.output, report.rows_written = str(output), len(cleaned)
+    if plots:
+        report.plots = _write_plots(df, cleaned, output_dir, output.stem)
+    lap("write")
+
+    (output_dir / f"{output.stem}.report.json").write_text(report.to_json())
+    return report
+
+
+def _run_safely(source, output_dir, kwargs, partitioned: bool = False, name: str = None) -> PipelineReport:
+    try:
+        if partitioned:
+            return run_partitioned(source, output_dir, name=name, **kwargs)
+        return run_pipeline(source, output_dir, name=name, **kwargs)
+    except Exception as e:
+        return PipelineReport(source=str(source), error=f"{type(e).__name__}: {e}")
+
+
+def run_many(sources, output_dir, workers: int = None, partitioned: bool = False, **kwargs) -> list:
+    """
+    Runs run_pipeline on many files in a process pool. A failing file is reported (PipelineReport.error)
+    instead of stopping the others.
+
+    Parameters:
+    - sources (list): Input paths.
+    - output_dir: Shared output directory.
+    - workers (int): Processes, defaults to the number of CPUs; 1 runs in this process.
+    - partitioned (bool): Use run_partitioned instead; files then run one after the other, each on `workers`
+      processes.
+    - kwargs: Passed to run_pipeline (or run_partitioned).
+
+    Returns:
+    - list: One PipelineReport per source, in input order.
+
+    Raises:
+    - ValueError before anything runs if two sources would write the same outputs (see output_name).
+    """
+    names = _output_names(sources)
+    if partitioned:
+        return [_run_safely(source, output_dir, {**kwargs, "workers": workers}, partitioned=True, name=name)
+                for source, name in zip(sources, names)]
+    if workers == 1 or len(sources) <= 1:
+        return [_run_safely(source, output_dir, kwargs, name=name) for source, name in zip(sources, names)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_run_safely, sources, [output_dir] * len(sources), [kwargs] * len(sources),
+                             [False] * len(sources), names))
+
+
+def run_partitioned(source, output_dir, strategy: str = "auto", plan: dict = None, max_loss: float = 10.0,
+                    numeric_method: str = "median", object_method: str = "mode", workers: int = None,
+                    rows_per_partition: int = 1_000_000, name: str = None) -> PipelineReport:
+    """
+    run_pipeline for files larger than memory, on the partitioned backend (backends.py): a CSV is first split into
+    Parquet partitions, a Parquet file is read by row groups (a directory of Parquet files by file), and the
+    cleaned data is written as a directory of partitions.
+
+    Only what can be merged across partitions runs: NaN statistics, CCA and the mean / median / mode /
+    new_category imputations (median and mode from sketches). The MCAR test needs every row at once, so it is
+    not run and 'auto' imputes whenever something is missing.
+
+    Parameters:
+    - source: Input CSV (optionally compressed), Parquet file or directory of Parquet files.
+    - output_dir: Directory receiving <name>/ (the cleaned partitions) and <name>.report.json.
+    - workers (int): Partitions processed in parallel, defaults to the number of CPUs.
+    - rows_per_partition (int): Rows per partition when splitting a CSV.
+    - name (str): Stem of the outputs, defaults to output_name(source).
+    - Others as run_pipeline.
+
+    Returns:
+    - PipelineReport, also written next to the output.
+    """
+    import backends
+
+    source, output_dir = Path(source), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stem = name or output_name(source)
+    report = PipelineReport(source=str(source))
+    backend = backends.get_backend("partitioned", max_workers=workers)
+    timer = time.perf_counter()
+
+    def lap(step):
+        nonlocal timer
+        now = time.perf_counter()
+        report.seconds[step] = round(now - timer, 4)
+        timer = now
+
+    # Step 1: Partition
+    if source.is_dir() or loader.detect_format(source)[0] == "parquet":
+        dataset = backends.PartitionedDataset.from_path(source)
+    else:
+        dataset = backends.partition_csv(source, output_dir / f"{stem}_partitions", rows_per_partition)
+    lap("load")
+
+    # Step 2: Profile
+    profile = backend.nan_statistics(dataset)
+    report.rows, report.columns = profile.total_rows, list(profile.nan_counts)
+    report.nan_percentage = profile.nan_percentage_per_column().to_dict() if profile.total_rows else {}
+    report.data_loss = profile.data_loss_percentage() if profile.total_rows else 0.0
+    report.mcar = {"is_mcar": False, "error": "MCAR test not run by the partitioned backend"}
+    lap("profile")
+
+    # Step 3: Recommend and apply, writing partition by partition
+    report.recommendation = recommend(False, report.data_loss, max_loss)
+    action = report.recommendation if strategy == "auto" else strategy
+    output = output_dir / stem
+
+    if action == "cca":
+        cleaned = backend.complete_case_analysis(dataset, output)
+    elif action == "impute":
+        # Column types from the first partition, missing columns from the profile of all of them
+        dtypes = dataset.read(0).dtypes
+        report.plan = {**{col: numeric_method if pd.api.types.is_numeric_dtype(dtypes[col])
+                          and not pd.api.types.is_bool_dtype(dtypes[col]) else object_method
+                          for col, count in profile.nan_counts.items() if count}, **(plan or {})}
+        cleaned = backend.impute(dataset, report.plan, output)
+    else:
+        # Nothing is missing: CCA keeps every row, so this just rewrites the partitions
+        cleaned = backend.complete_case_analysis(dataset, output)
+    report.output, report.rows_written = str(output), cleaned.num_rows
+    lap("clean")
+
+    (output_dir / f"{stem}.report.json").write_text(report.to_json())
+    return report
@@ -0,0 +1,137 @@
+"""
+Description :   Streaming missingness profiler for files that do not fit in memory. Reads a CSV in chunks and
+                accumulates, chunk by chunk:
+            *    1. NaN counts per column
+            *    2. How many rows would be lost with CCA
+            *    3. Missingness pattern frequencies
+                Peak memory is bounded by the chunk size, and profiles of partial runs can be merged.
+
+Methods:    profile_csv(source, chunksize: int, nan_indicator: list, progress: callable) -> MissingnessProfile
+"""
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from missingness import pattern_codes
+from nan_mapping import NAN_INDICATORS
+
+
+@dataclass
+class MissingnessProfile:
+    """
+    Incrementally updatable missingness statistics.
+
+    Attributes:
+    - total_rows (int): Rows seen so far.
+    - rows_with_na (int): Rows with at least one missing value (rows CCA would drop).
+    - nan_counts (dict): Column name -> number of missing values.
+    - pattern_counts (Counter): Tuple of missing column names -> number of rows with exactly that pattern.
+    """
+    total_rows: int = 0
+    rows_with_na: int = 0
+    nan_counts: dict = field(default_factory=dict)
+    pattern_counts: Counter = field(default_factory=Counter)
+
+    def update(self, chunk: pd.DataFrame) -> "MissingnessProfile":
+        """
+        Adds the statistics of one chunk in place and returns the profile.
+        """
+        mask = chunk.isnull().to_numpy()
+        columns = chunk.columns.to_numpy()
+
+        self.total_rows += len(chunk)
+        self.rows_with_na += int(mask.any(axis=1).sum())
+        for col, count in zip(chunk.columns, mask.sum(axis=0)):
+            self.nan_counts[col] = self.nan_counts.get(col, 0) + int(count)
+
+        if len(chunk):
+            pattern_masks, _, counts = pattern_codes(mask)
+            for pattern, count in zip(pattern_masks, counts):
+                self.pattern_counts[tuple(columns[pattern])] += int(count)
+
+        return self
+
+    def merge(self, other: "MissingnessProfile") -> "MissingnessProfile":
+        """
+        Returns a new profile combining two partial runs (e.g. two halves of a file, or two shards).
+        """
+        nan_counts = dict(self.nan_counts)
+        for col, count in other.nan_counts.items():
+            nan_counts[col] = nan_counts.get(col, 0) + count
+
+        return MissingnessProfile(
+            total_rows=self.total_rows + other.total_rows,
+            rows_with_na=self.rows_with_na + other.rows_with_na,
+            nan_counts=nan_counts,
+            pattern_counts=self.pattern_counts + other.pattern_counts,
+        )
+
+    __add__ = merge
+
+    def nan_percentage_per_column(self) -> pd.Series:
+        """
+        Same output as cca.nan_percentage_per_column on the full file.
+        """
+        counts = pd.Series(self.nan_counts, dtype="int64")
+        return round((counts / self.total_rows) * 100, 2)
+
+    def data_loss_percentage(self) -> float:
+        """
+        Same output as cca.data_loss_percentage on the full file.
+        """
+        return round((self.rows_with_na / self.total_rows) * 100, 2)
+
+    def pattern_frequencies(self) -> pd.DataFrame:
+        """
+        Missingness patterns sorted by frequency, with their share of all rows.
+        """
+        patterns = pd.DataFrame(
+            [(pattern, count) for pattern, count in self.pattern_counts.most_common()],
+            columns=["missing_columns", "n_rows"],
+        )
+        patterns["percentage"] = round((patterns["n_rows"] / self.total_rows) * 100, 2)
+        return patterns
+
+
+def profile_csv(source, chunksize: int = 100_000, nan_indicator=None, progress=None,
+                **read_csv_kwargs) -> MissingnessProfile:
+    """
+    Profiles the missing values of a CSV file without loading it entirely into memory.
+
+    Parameters:
+    - source: Path or binary file-like object of the CSV file.
+    - chunksize (int): Rows parsed per chunk; peak memory grows with this, not with the file size.
+    - nan_indicator (list): Strings treated as missing, defaults to nan_mapping.NAN_INDICATORS.
+    - progress (callable): Optional progress(rows_done, bytes_done, total_bytes) called after every chunk.
+      total_bytes is None when the size of the source is unknown.
+    - read_csv_kwargs: Passed through to pd.read_csv (e.g. usecols, skiprows, nrows for partial runs).
+
+    Returns:
+    - MissingnessProfile: Mergeable profile of the file.
+    """
+    if nan_indicator is None:
+        nan_indicator = NAN_INDICATORS
+
+    # Every value is read as a string: only nullness matters here, so skip per-chunk type inference
+    read_csv_kwargs.setdefault("dtype", str)
+
+    handle = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+    try:
+        try:
+            total_bytes = os.fstat(handle.fileno()).st_size
+        except (AttributeError, OSError):
+            total_bytes = handle.getbuffer().nbytes if hasattr(handle, "getbuffer") else None
+
+        profile = MissingnessProfile()
+        with pd.read_csv(handle, chunksize=chunksize, na_values=nan_indicator, **read_csv_kwargs) as reader:
+            for chunk in reader:
+                profile.update(chunk)
+                if progress is not None:
+                    progress(profile.total_rows, handle.tell(), total_bytes)
+    finally:
+        if handle is not source:
+            handle.close()
+
+    return profile
@@ -0,0 +1,129 @@
+"""
+Description :   Small mergeable summaries for statistics over data that is seen one partition at a time:
+            *    1. QuantileSketch: weighted quantile summary for approximate medians (exact while small)
+            *    2. HeavyHitters: Misra-Gries counters for the most frequent value (the mode)
+                Each partition builds its own summary; summaries merge in any order, so partitions can be
+                summarized in parallel processes and combined afterwards.
+
+Methods:    QuantileSketch.from_values(values: np.ndarray, size: int) -> QuantileSketch
+            HeavyHitters.from_series(column: pd.Series, capacity: int) -> HeavyHitters
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class QuantileSketch:
+    """
+    Sorted sample points with weights. Up to `size` points every value is kept (exact quantiles); beyond that
+    the points are compressed to `size` evenly spaced weighted ranks. Each compression moves a rank by at
+    most total / size, so a median from a few levels of merges is within a small fraction of a percent of
+    the rows of the true one.
+
+    Attributes:
+    - values (np.ndarray): Sorted sample values.
+    - weights (np.ndarray): Rows represented by each value.
+    - size (int): Points kept after compression.
+    """
+    values: np.ndarray = field(default_factory=lambda: np.empty(0))
+    weights: np.ndarray = field(default_factory=lambda: np.empty(0))
+    size: int = 2048
+
+    @classmethod
+    def from_values(cls, values: np.ndarray, size: int = 2048) -> "QuantileSketch":
+        values = np.asarray(values, dtype=np.float64)
+        values = np.sort(values[np.isfinite(values)])
+        return cls(values, np.ones(len(values)), size)._compressed()
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def _compressed(self) -> "QuantileSketch":
+        if len(self.values) <= self.size:
+            return self
+        total = self.count
+        # The point at each of `size` evenly spaced weighted ranks stands for an equal share of the rows
+        targets = (np.arange(self.size) + 0.5) * (total / self.size)
+        picked = np.minimum(np.searchsorted(np.cumsum(self.weights), targets), len(self.values) - 1)
+        return QuantileSketch(self.values[picked], np.full(self.size, total / self.size), self.size)
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        values = np.concatenate((self.values, other.values))
+        order = np.argsort(values, kind="stable")
+        weights = np.concatenate((self.weights, other.weights))[order]
+        return QuantileSketch(values[order], weights, max(self.size, other.size))._compressed()
+
+    __add__ = merge
+
+    def quantile(self, q: float) -> float:
+        """
+        Interpolated quantile; on an uncompressed sketch this equals pd.Series.quantile(q) (so the median
+        matches pd.Series.median). NaN when empty.
+        """
+        if not len(self.values):
+            return np.nan
+        if len(self.values) == 1:
+            return float(self.values[0])
+        # Positions of the points on the rank axis, as with linear interpolation between order statistics
+        positions = np.cumsum(self.weights) - self.weights / 2
+        positions = (positions - positions[0]) / (positions[-1] - positions[0])
+        return float(np.interp(q, positions, self.values))
+
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+
+@dataclass
+class HeavyHitters:
+    """
+    Misra-Gries summary of the `capacity` most frequent values. Any value more frequent than
+    rows / (capacity + 1) is guaranteed to be retained, and every kept count is below the true count by at
+    most rows / (capacity + 1). The mode is therefore retained whenever it is that frequent, but a value
+    whose true count is within that error of the mode's can be returned instead.
+
+    Attributes:
+    - counts (dict): Value -> under-estimated count (exact while no more than `capacity` values were seen).
+    - capacity (int): Counters kept.
+    """
+    counts: dict = field(default_factory=dict)
+    capacity: int = 64
+
+    @classmethod
+    def from_series(cls, column: pd.Series, capacity: int = 64) -> "HeavyHitters":
+        counts = column.value_counts(dropna=True)
+        counts = counts[counts > 0]
+        return cls({value: int(count) for value, count in counts.items()}, capacity)._truncated()
+
+    def _truncated(self) -> "HeavyHitters":
+        if len(self.counts) <= self.capacity:
+            return self
+        # Subtracting the (capacity + 1)-th largest count keeps the summary mergeable
+        ranked = sorted(self.counts.values(), reverse=True)
+        cut = ranked[self.capacity]
+        counts = {value: count - cut for value, count in self.counts.items() if count > cut}
+        return HeavyHitters(counts, self.capacity)
+
+    def merge(self, other: "HeavyHitters") -> "HeavyHitters":
+        counts = dict(self.counts)
+        for value, count in other.counts.items():
+            counts[value] = counts.get(value, 0) + count
+        return HeavyHitters(counts, max(self.capacity, other.capacity))._truncated()
+
+    __add__ = merge
+
+    def mode(self):
+        """
+        Kept value with the largest estimated count (the exact mode while the summary was never truncated);
+        ties go to the smallest value, as with pd.Series.mode()[0]. None when empty.
+        """
+        if not self.counts:
+            return None
+        top = max(self.counts.values())
+        tied = [value for value, count in self.counts.items() if count == top]
+        try:
+            return min(tied)
+        except TypeError:
+            return min(tied, key=str)
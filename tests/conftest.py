@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The app's modules live at the repository root, the benchmark scripts under benchmarks/
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+
+def pytest_addoption(parser):
+    parser.addoption("--timing", action="store_true", help="also run the wall-clock budget tests")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "timing: wall-clock budget, only run with --timing (noisy on shared CI)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--timing"):
+        return
+    skip = pytest.mark.skip(reason="timing budget, run with --timing")
+    for item in items:
+        if "timing" in item.keywords:
+            item.add_marker(skip)
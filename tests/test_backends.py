@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backends
+
+
+def test_partition_csv_never_coerces_text_to_nan(tmp_path):
+    source = tmp_path / "data.csv"
+    source.write_text("x,y\n1,2\n3,4\n5,oops\n")
+    with pytest.raises(ValueError, match="'y'"):
+        backends.partition_csv(source, tmp_path / "parts", rows_per_partition=2)
+
+
+def test_partition_csv_retypes_all_missing_column_as_text(tmp_path):
+    source = tmp_path / "data.csv"
+    source.write_text("x,y\n1,\n2,\n3,hello\n")
+    df = backends.partition_csv(source, tmp_path / "parts", rows_per_partition=2).to_pandas()
+    assert pd.api.types.is_string_dtype(df["y"])
+    assert df["y"].tolist()[2] == "hello"
+    assert df["x"].tolist() == [1.0, 2.0, 3.0]
+
+
+def test_partitioned_backend_matches_the_in_memory_one(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 20_000
+    df = pd.DataFrame({"x": rng.normal(size=n), "k": rng.choice(["a", "b", "c"], size=n, p=[0.5, 0.3, 0.2])})
+    df = df.mask(rng.random(df.shape) < 0.1)
+    source = tmp_path / "data.csv"
+    df.to_csv(source, index=False)
+    dataset = backends.partition_csv(source, tmp_path / "parts", rows_per_partition=3_000)
+    full = dataset.to_pandas()
+    pandas, partitioned = backends.get_backend("pandas"), backends.get_backend("partitioned", max_workers=2)
+
+    assert partitioned.nan_statistics(dataset) == pandas.nan_statistics(full)
+    kept = partitioned.complete_case_analysis(dataset, tmp_path / "cca").to_pandas()
+    pd.testing.assert_frame_equal(kept, pandas.complete_case_analysis(full).reset_index(drop=True),
+                                  check_dtype=False)
+
+    values = partitioned.fill_values(dataset, {"x": "mean", "k": "mode"})
+    assert values["x"] == pytest.approx(full["x"].mean()) and values["k"] == full["k"].mode()[0]
+    median = partitioned.fill_values(dataset, {"x": "median"})["x"]
+    assert abs((full["x"].dropna() < median).mean() - 0.5) < 0.005
+
+    imputed = partitioned.impute(dataset, {"x": "mean", "k": "new_category"}, tmp_path / "out").to_pandas()
+    expected = pandas.impute(full, {"x": "mean", "k": "new_category"})
+    pd.testing.assert_frame_equal(imputed.astype({"k": object}), expected.astype({"k": object}), check_dtype=False)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch_imputation
+
+
+def _frame():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"x": rng.normal(size=200), "n": rng.integers(0, 5, size=200).astype(float),
+                       "kind": pd.Series(rng.choice(["a", "b", "c"], size=200), dtype=object)})
+    for col in df:
+        df.loc[rng.random(200) < 0.1, col] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("plan", [
+    {"x": "mean", "n": "Random", "kind": "new_category"},
+    {"x": "median", "n": "mode", "kind": "Random (weighted)"},
+])
+def test_thread_and_process_modes_agree(plan):
+    df = _frame()
+    threads = batch_imputation.impute_plan(df, plan, executor="thread", max_workers=2, seed=1)
+    processes = batch_imputation.impute_plan(df, plan, executor="process", max_workers=2, seed=1)
+    for col in plan:
+        pd.testing.assert_series_equal(threads.columns[col], processes.columns[col], check_names=False)
+
+
+@pytest.mark.parametrize("executor", ["thread", "process", "serial"])
+def test_text_fill_for_numeric_column_is_rejected_in_every_mode(executor):
+    with pytest.raises(ValueError, match="'x': 'new_category'"):
+        batch_imputation.impute_plan(_frame(), {"x": "new_category"}, executor=executor, max_workers=2)
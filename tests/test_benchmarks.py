@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+import pytest
+
+import run_benchmarks
+from datasets import MECHANISMS, make_synthetic
+
+
+@pytest.mark.parametrize("mechanism", MECHANISMS)
+def test_synthetic_datasets_follow_their_mechanism(mechanism):
+    df = make_synthetic(20_000, numeric_columns=3, categorical_columns=2, missing_rate=0.2, mechanism=mechanism)
+
+    assert df["driver"].notna().all()
+    rates = df.drop(columns="driver").isnull().mean()
+    np.testing.assert_allclose(rates, 0.2, atol=0.02)
+
+    # Missingness of num_0 against the driver (MAR) and against its own value (MNAR, unseen once missing)
+    missing = df["num_0"].isnull()
+    driver_gap = df.loc[missing, "driver"].mean() - df.loc[~missing, "driver"].mean()
+    if mechanism == "MAR":
+        assert driver_gap > 0.5
+    elif mechanism == "MNAR":
+        # High values go missing, so the observed mean of a centred column drops below zero
+        assert df["num_0"].mean() < -0.1
+    else:
+        assert abs(driver_gap) < 0.05 and abs(df["num_0"].mean()) < 0.05
+
+
+def test_every_case_runs_and_the_report_is_written(tmp_path):
+    output = tmp_path / "results.json"
+    run_benchmarks.main(["--rows", "500", "--mechanisms", "MAR", "--healthcare-scale", "--repeat", "1",
+                         "--output", str(output)])
+
+    report = json.loads(output.read_text())
+    assert {"timestamp", "git_commit", "python", "numpy", "pandas", "machine", "arguments"} <= set(report["meta"])
+    names = [r["name"] for r in report["results"]]
+    assert names == [case.name for case in run_benchmarks._cases()]
+    for record in report["results"]:
+        assert "error" not in record, record
+        assert record["dataset"] == "synthetic-MAR-500" and record["seconds_min"] <= record["seconds_median"]
+        assert record["peak_bytes"] >= 0
+
+
+def test_compare_reports_cases_slower_than_the_threshold(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps({"results": [
+        {"name": "a", "dataset": "d", "seconds_median": 1.0},
+        {"name": "b", "dataset": "d", "seconds_median": 1.0},
+        {"name": "c", "dataset": "d", "error": "ValueError"},
+    ]}))
+    results = [{"name": "a", "dataset": "d", "seconds_median": 1.2},
+               {"name": "b", "dataset": "d", "seconds_median": 1.5},
+               {"name": "c", "dataset": "d", "seconds_median": 9.0}]
+
+    assert run_benchmarks.compare(results, baseline, 1.25) == [("b", "d", 1.0, 1.5)]
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cache import ResultCache, fingerprint, sizeof
+from mice import impute_mice
+from missingness import missingness_index
+
+
+def _frame():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(10_000, 3)), columns=["a", "b", "c"])
+    return df.mask(df > 1.5)
+
+
+def test_sizeof_counts_nested_results():
+    df = _frame()
+    frame_bytes = df.memory_usage(deep=True).sum()
+
+    assert sizeof({col: df[col] for col in df}) >= frame_bytes - df.index.memory_usage()
+    assert sizeof(missingness_index(df)) >= missingness_index(df).row_patterns.nbytes
+    assert sizeof(impute_mice(df)) >= frame_bytes - df.index.memory_usage()
+
+
+def test_sizeof_counts_shared_objects_once():
+    array = np.zeros(1_000_000)
+    nested = [array]
+    nested.append(nested)
+    assert array.nbytes <= sizeof({"x": array, "y": (array, nested)}) < 2 * array.nbytes
+
+
+def test_fingerprint_tells_apart_large_arrays_inside_objects():
+    from dataclasses import dataclass
+
+    @dataclass
+    class Options:
+        weights: np.ndarray
+
+    first, second = np.zeros(10_000), np.zeros(10_000)
+    second[5_000] = 1.0
+    assert fingerprint(Options(first)) != fingerprint(Options(second))
+    assert fingerprint(pd.Index(first)) != fingerprint(pd.Index(second))
+    assert fingerprint(Options(first)) == fingerprint(Options(first.copy()))
+
+
+def test_fingerprint_rejects_objects_it_cannot_hash_by_content():
+    with pytest.raises(TypeError):
+        fingerprint(lambda x: x)
+
+
+def test_hits_and_misses_are_counted_under_concurrency():
+    cache = ResultCache()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: cache.call(abs, i % 10), range(2_000)))
+    assert cache.hits + cache.misses == 2_000
+    assert cache.misses >= 10
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import chi2_contingency, ks_2samp, wasserstein_distance
+
+import comparison
+
+
+def _frame(n=3_000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "x": rng.normal(size=n).round(2),
+        "y": rng.exponential(size=n),
+        "kind": pd.Series(rng.choice(["a", "b", "c"], size=n, p=[0.6, 0.3, 0.1]), dtype="category"),
+    })
+    df.loc[rng.random(n) < 0.2, "x"] = np.nan
+    df.loc[rng.random(n) < 0.15, "kind"] = np.nan
+    return df
+
+
+def _expected(original: pd.Series, candidate: pd.Series) -> dict:
+    a, b = original.dropna().to_numpy(), candidate.dropna().to_numpy()
+    return {"rows": len(b), "ks": ks_2samp(a, b).statistic, "wasserstein": wasserstein_distance(a, b),
+            "mean_shift": (b.mean() - a.mean()) / a.std(), "variance_ratio": b.var() / a.var()}
+
+
+def test_numeric_metrics_match_scipy_for_imputations_and_row_subsets():
+    df = _frame()
+    rng = np.random.default_rng(1)
+    candidates = {
+        # Imputed and subset candidates take the incremental paths, the shuffled one the direct comparison
+        "mean": df.assign(x=df["x"].fillna(df["x"].mean())),
+        "random": df.assign(x=df["x"].fillna(pd.Series(rng.normal(size=len(df)), index=df.index))),
+        "CCA": df.dropna(),
+        "few kept": df.dropna().iloc[:200],
+        "shuffled": df.dropna().sample(frac=1.0, random_state=0).reset_index(drop=True),
+    }
+
+    table = comparison.compare_distributions(df, candidates).set_index(["column", "candidate"])
+
+    for name, candidate in candidates.items():
+        for col in ("x", "y"):
+            if name in ("mean", "random") and col == "y":
+                assert (col, name) not in table.index
+                continue
+            row = table.loc[(col, name)]
+            for metric, value in _expected(df[col], candidate[col]).items():
+                assert row[metric] == pytest.approx(value, rel=1e-9, abs=1e-12), (col, name, metric)
+
+
+def test_categorical_metrics_match_a_contingency_table():
+    df = _frame()
+    candidate = df.assign(kind=df["kind"].cat.add_categories("Missing").fillna("Missing"))
+
+    row = comparison.compare_distributions(df, {"new_category": candidate}).set_index("column").loc["kind"]
+
+    original = df["kind"].value_counts().reindex(["a", "b", "c", "Missing"], fill_value=0)
+    imputed = candidate["kind"].value_counts().reindex(original.index)
+    statistic, p_value, _, _ = chi2_contingency(np.vstack((original, imputed)), correction=False)
+    assert row["chi_square"] == pytest.approx(statistic) and row["p_value"] == pytest.approx(p_value)
+    assert row["total_variation"] == pytest.approx(0.5 * np.abs(original / original.sum()
+                                                                 - imputed / imputed.sum()).sum())
+    assert row["shift"] == row["total_variation"] and pd.isna(row["ks"])
+
+
+def test_methods_are_ranked_per_column_and_summarized():
+    df = _frame()
+    table = comparison.compare_methods(df, seed=0)
+
+    assert list(table.columns) == comparison.COLUMNS
+    assert set(table["candidate"]) == {"CCA", *comparison.DEFAULT_METHODS}
+    for _, group in table.groupby("column"):
+        assert group["rank"].min() == 1 and group["shift"].is_monotonic_increasing
+    # A random draw from the observed values shifts the distribution less than filling with the mean
+    x = table[table["column"] == "x"].set_index("candidate")
+    assert x.loc["Random", "shift"] < x.loc["mean", "shift"]
+
+    summary = comparison.summarize(table)
+    assert summary["mean_rank"].is_monotonic_increasing
+    assert summary["columns"].sum() == len(table)
@@ -0,0 +1,22 @@
+import pytest
+
+import import_time
+
+
+@pytest.fixture(scope="module")
+def profile():
+    # A fresh interpreter under -X importtime, as the app's cold start
+    return import_time.import_profile(import_time.APP_MODULES)
+
+
+def test_deferred_modules_are_not_imported_at_start_up(profile):
+    assert [name for name in import_time.DEFERRED if name in profile["loaded"]] == []
+
+
+def test_app_modules_are_profiled(profile):
+    assert set(import_time.APP_MODULES) <= profile["loaded"]
+
+
+@pytest.mark.timing
+def test_import_time_within_budget(profile):
+    assert sum(profile["cumulative_us"].values()) / 1000 <= import_time.BUDGET_MS
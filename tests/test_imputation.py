@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import cache
+import imputation as I
+from missingness import missingness_index
+
+
+def test_fill_functions_leave_the_input_and_its_caches_intact():
+    df = pd.DataFrame({"x": [1.0, np.nan, 3.0], "kind": pd.Series(["a", None, "a"], dtype=object)})
+    before, index = cache.fingerprint(df), missingness_index(df)
+
+    filled = I.fill_numeric_columns(df, "x", "mean")
+    filled = I.fill_missing_object_columns(filled, "kind", "new_category")
+
+    assert filled["x"].tolist() == [1.0, 2.0, 3.0] and filled["kind"].tolist() == ["a", "Missing", "a"]
+    assert df["x"].isnull().sum() == 1 and df["kind"].isnull().sum() == 1
+    assert cache.fingerprint(df) == before and missingness_index(df) is index
+    assert missingness_index(filled).null_counts.sum() == 0
+
+
+def test_with_imputed_keeps_duplicate_columns_index_and_attrs():
+    df = pd.DataFrame([[1.0, np.nan, np.nan], [2.0, 5.0, 3.0]], columns=pd.Index(["a", "a", "b"], name="cols"))
+    df.attrs["source"] = "test"
+
+    out = I.with_imputed(df, {"b": I.impute_numeric(df["b"], "mean")})
+
+    assert out.columns.tolist() == ["a", "a", "b"] and out.columns.name == "cols"
+    assert out.attrs == {"source": "test"}
+    assert out["b"].tolist() == [3.0, 3.0] and np.isnan(out.iloc[0, 1])
+    assert np.isnan(df.iloc[0, 2])
+
+
+def test_impute_knn_checks_its_donors():
+    df = pd.DataFrame({"x": [np.nan, 2.0, np.nan, 4.0], "f": [1.0, 2.0, 3.0, 4.0]})
+
+    assert I.impute_knn(df, "x").tolist() == [3.0, 2.0, 3.0, 4.0]
+    with pytest.raises(ValueError, match="between 1 and the 2 donor rows"):
+        I.impute_knn(df, "x", n_neighbors=3)
+    with pytest.raises(ValueError, match="between 1 and the 1 donor rows"):
+        I.impute_knn(df, "x", n_neighbors=2, max_donors=1)
+    with pytest.raises(ValueError, match="no observed values"):
+        I.impute_knn(df.assign(x=np.nan), "x")
@@ -0,0 +1,108 @@
+import contextvars
+import json
+import threading
+from dataclasses import fields
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import instrumentation
+from instrumentation import Span, instrument, span
+
+
+@instrument
+def _work(df):
+    with span("inner", df["a"].to_numpy()):
+        return df.sum()
+
+
+@instrument
+def _fail(df):
+    raise ValueError("boom")
+
+
+@pytest.fixture
+def recording():
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+
+
+def _frame():
+    return pd.DataFrame({"a": np.arange(1000.0), "b": np.arange(1000.0)})
+
+
+def test_disabled_records_nothing():
+    instrumentation.disable()
+    _work(_frame())
+    assert instrumentation.spans() == []
+    assert instrumentation.spans_frame().empty
+    assert list(instrumentation.summary().columns) == ["calls", "wall", "max_wall", "cpu", "memory", "rows"]
+
+
+def test_spans_nest_and_measure_inputs(recording):
+    df = _frame()
+    _work(df)
+    with pytest.raises(ValueError):
+        _fail(df)
+
+    records = instrumentation.spans_frame()
+    assert list(records.columns) == [f.name for f in fields(Span)]
+    outer, inner, failed = (records.set_index("name").loc[name] for name in
+                            ("test_instrumentation._work", "inner", "test_instrumentation._fail"))
+    assert (outer.depth, inner.depth) == (0, 1)
+    assert outer.rows == inner.rows == 1000
+    assert outer.input_bytes == df.memory_usage(index=False).sum()
+    assert inner.input_bytes == df["a"].nbytes
+    assert outer.wall >= inner.wall >= 0 and outer.start <= inner.start
+    assert pd.isna(outer.error) and failed.error == "ValueError"
+    assert pd.isna(outer.memory)
+
+
+def test_json_and_chrome_trace_exports(recording):
+    _work(_frame())
+
+    records = json.loads(instrumentation.to_json())
+    assert [set(r) for r in records] == [{f.name for f in fields(Span)}] * 2
+
+    trace = json.loads(instrumentation.to_chrome_trace())
+    assert trace["displayTimeUnit"] == "ms"
+    for event, record in zip(trace["traceEvents"], records):
+        assert event["ph"] == "X" and event["name"] == record["name"]
+        assert event["dur"] == pytest.approx(record["wall"] * 1e6, abs=1e-3)
+        assert set(event["args"]) == {"cpu_ms", "memory_bytes", "rows", "input_bytes", "error"}
+    assert {e["cat"] for e in trace["traceEvents"]} == {"test_instrumentation", "inner"}
+
+
+def test_memory_peak_folds_into_parent():
+    instrumentation.enable(memory=True)
+    try:
+        with span("outer"):
+            with span("child"):
+                block = np.ones(2_000_000)
+                del block
+    finally:
+        records = instrumentation.spans_frame().set_index("name")
+        instrumentation.disable()
+
+    assert records.loc["child", "memory"] >= 16_000_000
+    assert records.loc["outer", "memory"] >= records.loc["child", "memory"]
+
+
+def test_recording_is_per_context(recording):
+    seen = {}
+
+    def run(key):
+        _work(_frame())
+        seen[key] = len(instrumentation.spans())
+
+    # A plain thread starts from an empty context; one run in a copy of it records into the same recorder
+    plain = threading.Thread(target=run, args=("plain",))
+    copied = threading.Thread(target=contextvars.copy_context().run, args=(run, "copied"))
+    for thread in (plain, copied):
+        thread.start()
+        thread.join()
+
+    assert seen == {"plain": 0, "copied": 2}
+    assert len({s.thread for s in instrumentation.spans()}) == 1
@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+import jobs
+from jobs import JobRunner
+
+
+# Gates by name: job arguments are fingerprinted by content, which an Event has none of
+GATES = {}
+
+
+def _gated(gate, value, progress=None):
+    # Reports progress until the gate opens, so a cancelled job stops at its next report
+    while not GATES[gate].wait(0.01):
+        if progress is not None:
+            progress(0, 1, "waiting")
+    return value
+
+
+def _square(value):
+    return value * value
+
+
+@pytest.fixture
+def gate(request):
+    GATES[request.node.name] = threading.Event()
+    yield request.node.name
+    GATES.pop(request.node.name).set()
+
+
+@pytest.fixture
+def runner():
+    runner = JobRunner(max_workers=1)
+    yield runner
+    runner.shutdown()
+
+
+def test_identical_requests_share_one_job_and_the_result_is_cached(runner, gate):
+    first = runner.submit(_gated, gate, 7)
+    second = runner.submit(_gated, gate, 7)
+
+    assert second is first and first.holders == 2
+    assert runner.stats()["deduplicated"] == 1
+    GATES[gate].set()
+    assert first.wait(5) and first.state == jobs.DONE and first.result == 7
+
+    cached = runner.submit(_gated, gate, 7)
+    assert cached is not first and cached.state == jobs.DONE and cached.result == 7
+    assert runner.active() == []
+
+
+def test_releasing_the_last_holder_cancels_running_and_pending_jobs(runner, gate):
+    running = runner.submit(_gated, gate, 1)
+    pending = runner.submit(_square, 3)
+
+    runner.release(pending)
+    assert pending.wait(1) and pending.state == jobs.CANCELLED
+
+    shared = runner.submit(_gated, gate, 1)
+    runner.release(shared)
+    assert not running.cancel_requested
+    runner.release(running)
+    assert running.wait(5) and running.state == jobs.CANCELLED
+    assert runner.stats()["cancelled"] == 2 and runner.active() == []
+
+
+def test_track_keeps_unchanged_slots_and_replaces_changed_ones(runner, gate):
+    slots = {}
+    first = runner.track(slots, "plot", _gated, gate, 1)
+    assert runner.track(slots, "plot", _gated, gate, 1) is first
+
+    second = runner.track(slots, "plot", _gated, gate, 2)
+    assert slots == {"plot": second}
+    assert first.wait(5) and first.state == jobs.CANCELLED
+    GATES[gate].set()
+    assert second.wait(5) and second.result == 2
+
+
+def test_prune_releases_unused_slots_and_closes_stale_sessions(gate):
+    runner = JobRunner(max_workers=2, session_timeout=0.0)
+    try:
+        closed, live = {}, {}
+        stale = runner.track(closed, "imputed", _gated, gate, 1)
+        runner.track(closed, "plot", _square, 2).wait(5)
+        runner.prune(closed, {"imputed", "plot"})
+        assert runner.stats()["sessions"] == 1
+
+        # Another session's rerun finds the first one not seen within the timeout
+        kept = runner.track(live, "imputed", _square, 4)
+        runner.prune(live, {"imputed"})
+        assert closed == {} and live == {"imputed": kept}
+        assert stale.wait(5) and stale.state == jobs.CANCELLED
+        assert kept.wait(5) and kept.state == jobs.DONE
+        assert runner.stats()["sessions"] == 1
+    finally:
+        runner.shutdown()
+
+
+def test_close_releases_every_job_of_a_session(runner, gate):
+    slots = {}
+    job = runner.track(slots, "stats", _gated, gate, 1)
+    runner.prune(slots, {"stats"})
+
+    runner.close(slots)
+    assert slots == {} and runner.stats()["sessions"] == 0
+    assert job.wait(5) and job.state == jobs.CANCELLED
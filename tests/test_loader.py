@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import loader
+
+
+def _frame():
+    return pd.DataFrame({
+        "id": pd.array([1, None, 3, 4], dtype="Int64"),
+        "age": [25.0, 40.0, np.nan, 17.0],
+        "kind": pd.Series(["a", "?", "b", "a"], dtype="string"),
+        "note": ["x", "NA", "y", "z"],
+    })
+
+
+def test_parquet_round_trip_decodes_nulls_and_sentinels(tmp_path):
+    path = tmp_path / "data.parquet"
+    _frame().to_parquet(path)
+
+    df = loader.load_dataset(path)
+
+    assert df.isnull().sum().tolist() == [1, 1, 1, 1]
+    assert pd.api.types.is_numeric_dtype(df["id"]) and df["id"].dropna().tolist() == [1, 3, 4]
+    assert df["kind"].dropna().astype(str).tolist() == ["a", "b", "a"]
+
+
+def test_parquet_and_csv_load_alike(tmp_path):
+    _frame().to_parquet(tmp_path / "data.parquet")
+    _frame().to_csv(tmp_path / "data.csv", index=False)
+
+    from_parquet = loader.load_dataset(tmp_path / "data.parquet")
+    from_csv = loader.load_dataset(tmp_path / "data.csv")
+
+    assert from_parquet.dtypes.astype(str).tolist() == from_csv.dtypes.astype(str).tolist()
+    pd.testing.assert_frame_equal(from_parquet, from_csv)
+
+
+def test_parquet_columns_and_filters_are_pushed_down(tmp_path, monkeypatch):
+    path = tmp_path / "data.parquet"
+    _frame().to_parquet(path, row_group_size=2)
+    calls = []
+    read_table = pq.read_table
+    monkeypatch.setattr(loader.pq, "read_table", lambda *args, **kwargs: calls.append(kwargs) or
+                        read_table(*args, **kwargs))
+
+    df = loader.load_dataset(path, columns=["kind"], filters=[("age", ">=", 18)])
+
+    assert calls[-1]["columns"] == ["kind", "age"] and calls[-1]["filters"] == [("age", ">=", 18)]
+    assert df.columns.tolist() == ["kind"]
+    assert df["kind"].isnull().tolist() == [False, True]
+
+
+def test_csv_columns_and_filters(tmp_path):
+    path = tmp_path / "data.csv"
+    _frame().to_csv(path, index=False)
+
+    df = loader.load_dataset(path, columns=["note", "id"], filters=[("age", "<", 30)])
+
+    assert df.columns.tolist() == ["note", "id"]
+    assert df["note"].astype(str).tolist() == ["x", "z"]
+
+
+def test_csv_loads_into_a_compact_frame(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 2_000
+    df = pd.DataFrame({
+        "count": rng.integers(0, 100, size=n),
+        "score": rng.normal(size=n).astype(np.float32).astype(np.float64),
+        "gender": rng.choice(["F", "M", "?"], size=n),
+        "name": [f"patient {i}" for i in range(n)],
+    })
+    path = tmp_path / "data.csv.gz"
+    df.to_csv(path, index=False)
+
+    compact = loader.load_dataset(path)
+    plain = pd.read_csv(path, na_values=["?"])
+
+    assert compact.dtypes.astype(str).tolist() == ["int8", "float32", "category", "string"]
+    assert compact["name"].dtype.storage == "pyarrow"
+    assert compact["gender"].isnull().sum() == (df["gender"] == "?").sum()
+    assert compact.memory_usage(deep=True).sum() < plain.memory_usage(deep=True).sum() / 4
+    pd.testing.assert_frame_equal(compact.astype(object).where(compact.notna(), np.nan),
+                                  plain.astype(object).where(plain.notna(), np.nan), check_dtype=False)
+
+
+def test_compact_dataframe_keeps_values_that_do_not_fit_narrower_types():
+    df = pd.DataFrame({"big": [0, 2 ** 40], "precise": [0.1, 1 / 3], "flag": ["a", "b"]})
+
+    compact = loader.compact_dataframe(df)
+
+    assert compact["big"].dtype == np.int64 and compact["precise"].dtype == np.float64
+    pd.testing.assert_frame_equal(compact.astype(object), df.astype(object))
+    assert df["flag"].dtype == object
@@ -0,0 +1,116 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mcar_test import is_mcar, little_mcar_test, pattern_statistics
+
+COVARIANCE = [[1.0, 0.6, 0.3], [0.6, 1.0, 0.2], [0.3, 0.2, 1.0]]
+
+
+def _frame(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.multivariate_normal([0, 0, 0], COVARIANCE, size=n), columns=["a", "b", "c"])
+    for col, rate in zip(df, [0.2, 0.3, 0.1]):
+        df.loc[rng.random(n) < rate, col] = np.nan
+    return df
+
+
+def _reference_d2(values: np.ndarray) -> tuple:
+    # Little's d2 straight from its definition: row-by-row EM, then every pattern against the pooled estimates
+    n, p = values.shape
+    missing = np.isnan(values)
+    mu, sigma = np.nanmean(values, axis=0), np.diag(np.nanvar(values, axis=0))
+    for _ in range(500):
+        total, cross = np.zeros(p), np.zeros((p, p))
+        for row, m in zip(values, missing):
+            o, x, conditional = ~m, row.copy(), np.zeros((p, p))
+            slope = sigma[np.ix_(m, o)] @ np.linalg.inv(sigma[np.ix_(o, o)])
+            x[m] = mu[m] + slope @ (row[o] - mu[o])
+            conditional[np.ix_(m, m)] = sigma[np.ix_(m, m)] - slope @ sigma[np.ix_(o, m)]
+            total += x
+            cross += np.outer(x, x) + conditional
+        previous = np.concatenate([mu, sigma.ravel()])
+        mu, sigma = total / n, cross / n - np.outer(total / n, total / n)
+        if np.abs(np.concatenate([mu, sigma.ravel()]) - previous).max() < 1e-12:
+            break
+    d2, dof = 0.0, -p
+    for pattern in np.unique(missing, axis=0):
+        rows, o = (missing == pattern).all(axis=1), ~pattern
+        r = values[rows][:, o].mean(axis=0) - mu[o]
+        d2 += rows.sum() * r @ np.linalg.solve(sigma[np.ix_(o, o)], r)
+        dof += o.sum()
+    return d2, dof
+
+
+def test_statistic_matches_littles_definition():
+    df = _frame(n=200)
+    d2, dof = _reference_d2(df.to_numpy())
+    result = little_mcar_test(df)
+    assert result.statistic == pytest.approx(d2, rel=1e-6)
+    assert result.degrees_of_freedom == dof
+
+
+def test_mar_data_is_rejected_and_mcar_data_is_not():
+    assert little_mcar_test(_frame()).is_mcar
+
+    df = _frame()
+    df.loc[df["a"] > 0.3, "b"] = np.nan
+    result = little_mcar_test(df)
+    assert not result.is_mcar and result.p_value < 1e-10
+
+
+def test_pattern_statistics_match_the_frame_based_test():
+    df = _frame()
+    df["t"] = "x"
+    stats = pattern_statistics(df)
+    for dropped in [(), ("a",)]:
+        expected = little_mcar_test(df.drop(columns=list(dropped)))
+        result = stats.little_mcar_test(dropped)
+        assert result.statistic == pytest.approx(expected.statistic, rel=1e-9)
+        assert result.degrees_of_freedom == expected.degrees_of_freedom
+
+
+def test_untestable_patterns_are_kept_without_warning():
+    df = _frame()
+    df.iloc[0] = [np.nan, np.nan, np.nan]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", RuntimeWarning)
+        result = little_mcar_test(df)
+
+    assert result.skipped["skipped"].tolist() == ["no observed columns"]
+
+
+def test_patterns_dropped_for_their_values_warn():
+    df = _frame()
+    df.loc[df.notna().all(axis=1).idxmax(), "a"] = np.inf
+
+    with pytest.warns(RuntimeWarning, match="non-finite values"):
+        result = little_mcar_test(df)
+    assert (result.skipped["skipped"] == "non-finite values").any()
+
+
+def test_patterns_group_every_row_once():
+    df = _frame()
+    df["kind"] = "x"
+    result = little_mcar_test(df)
+
+    expected = df[["a", "b", "c"]].isnull().value_counts()
+    counts = {tuple(c for c, m in zip("abc", key) if m): n for key, n in expected.items()}
+    assert dict(zip(result.patterns["missing_columns"], result.patterns["n_rows"])) == counts
+    assert (result.patterns["n_observed"] == 3 - result.patterns["missing_columns"].str.len()).all()
+    assert result.statistic == pytest.approx(result.patterns["statistic"].sum())
+    assert result.degrees_of_freedom == result.patterns["degrees_of_freedom"].sum() - 3
+
+
+def test_is_mcar_and_the_inputs_it_rejects():
+    df = _frame()
+    assert is_mcar(df) == little_mcar_test(df).is_mcar
+    assert not little_mcar_test(df, alpha=1.0).is_mcar
+
+    with pytest.raises(ValueError, match="missing values"):
+        little_mcar_test(df.dropna())
+    with pytest.raises(ValueError):
+        little_mcar_test(df[["a"]])
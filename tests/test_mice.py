@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+import batch_imputation
+import imputation as I
+from mice import MAX_CATEGORIES, impute_mice
+
+
+def test_uncorrelated_column_groups_share_waves():
+    rng = np.random.default_rng(0)
+    n = 5000
+    a, b = rng.normal(size=n), rng.normal(size=n)
+    df = pd.DataFrame({"a1": a + rng.normal(size=n) * 0.3, "a2": a + rng.normal(size=n) * 0.3,
+                       "b1": b + rng.normal(size=n) * 0.3, "b2": b + rng.normal(size=n) * 0.3})
+    for col in df:
+        df.loc[rng.random(n) < 0.2, col] = np.nan
+
+    result = impute_mice(df)
+    serial = impute_mice(df, max_workers=1)
+
+    assert result.iterations["waves"].iloc[0] == 2
+    assert result.state.models["a1"][0] == ["a2"] and result.state.models["b1"][0] == ["b2"]
+    for col in df:
+        np.testing.assert_allclose(result.columns[col], serial.columns[col])
+
+
+def test_mice_not_offered_for_high_cardinality_text():
+    ids = pd.Series([f"id{i}" for i in range(MAX_CATEGORIES + 10)] + [None], dtype=object)
+    df = pd.DataFrame({"id": ids, "kind": pd.Series(["x", "y"] * 30 + [None], dtype=object)})
+
+    assert "MICE" not in I.methods_for(df["id"])
+    assert "MICE" in I.methods_for(df["kind"])
+    assert batch_imputation.default_plan(df, object_method="MICE") == {"id": "mode", "kind": "MICE"}
@@ -0,0 +1,75 @@
+import gc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cca
+import missingness
+from missingness import MissingnessIndex, missingness_index, pattern_codes
+
+
+def _frame(columns=5, n=2_000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.normal(size=(n, columns)), columns=[f"c{j}" for j in range(columns)])
+    df = df.mask(rng.random(df.shape) < 0.15)
+    df["kind"] = pd.Series(rng.choice(["a", "b"], size=n), dtype=object).mask(rng.random(n) < 0.1)
+    return df
+
+
+def _canonical(masks, ids, counts):
+    # Pattern order is an implementation detail: compare the patterns of the rows and their sizes
+    return [tuple(row) for row in masks[ids]], sorted(counts.tolist())
+
+
+@pytest.mark.parametrize("columns", [3, 70])
+def test_pattern_codes_group_identical_rows(columns):
+    mask = _frame(columns).isnull().to_numpy()
+
+    masks, ids, counts = pattern_codes(mask)
+    expected, expected_counts = np.unique(mask, axis=0, return_counts=True)
+
+    assert len(masks) == len(expected)
+    np.testing.assert_array_equal(masks[ids], mask)
+    assert sorted(counts.tolist()) == sorted(expected_counts.tolist())
+
+
+def test_index_matches_the_frame():
+    df = _frame()
+    index = missingness_index(df)
+
+    np.testing.assert_array_equal(index.mask(), df.isnull().to_numpy())
+    np.testing.assert_array_equal(index.column_mask("kind"), df["kind"].isnull().to_numpy())
+    np.testing.assert_array_equal(index.null_counts, df.isnull().sum().to_numpy())
+    np.testing.assert_array_equal(index.row_missing_counts(), df.isnull().sum(axis=1).to_numpy())
+    assert index.rows_with_missing() == df.isnull().any(axis=1).sum()
+    assert index.data_loss_percentage(["c0", "c1"]) == cca.data_loss_percentage(df.drop(columns=["c0", "c1"]))
+    pd.testing.assert_series_equal(index.nan_percentage_per_column(), cca.nan_percentage_per_column(df),
+                                   check_index_type=False)
+    pd.testing.assert_frame_equal(cca.complete_case_analysis(df), df.dropna())
+
+
+def test_dropping_columns_derives_the_index_without_a_rescan():
+    df = _frame()
+    index = missingness_index(df)
+
+    dropped = missingness.drop_columns(df, ["c1", "kind"])
+    derived, rebuilt = missingness_index(dropped), MissingnessIndex.from_frame(dropped)
+
+    assert derived is not index and derived.columns == rebuilt.columns == ["c0", "c2", "c3", "c4"]
+    assert _canonical(derived.pattern_masks, derived.row_patterns, derived.pattern_counts) == \
+        _canonical(rebuilt.pattern_masks, rebuilt.row_patterns, rebuilt.pattern_counts)
+    np.testing.assert_array_equal(derived.mask(), dropped.isnull().to_numpy())
+    assert derived.row_patterns.dtype == np.int8
+
+
+def test_index_is_shared_while_the_frame_lives():
+    df = _frame()
+    index = missingness_index(df)
+    assert missingness_index(df) is index
+    assert missingness_index(df.copy(deep=False)) is not index
+
+    key = id(df)
+    del df
+    gc.collect()
+    assert key not in missingness._indexes
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from nan_mapping import decode_nans
+
+
+def test_whole_floats_beyond_int64_stay_float():
+    df = pd.DataFrame({"big": [1e30, 2.0, 3.0], "parsed": ["1e30", "5", "?"], "small": [1.0, 2.0, 3.0]})
+    decoded, _ = decode_nans(df)
+
+    assert decoded["big"].dtype == np.float64
+    assert decoded["big"].tolist() == [1e30, 2.0, 3.0]
+    assert decoded["parsed"].iloc[0] == 1e30 and np.isnan(decoded["parsed"].iloc[2])
+    assert decoded["small"].dtype == np.int8
+
+
+def test_nullable_integers_with_missing_values_keep_them():
+    df = pd.DataFrame({"a": pd.array([1, None], dtype="Int64"), "b": pd.array([None, None], dtype="Int32"),
+                       "c": pd.array([1, 70_000], dtype="Int64")})
+    decoded, _ = decode_nans(df)
+
+    assert decoded["a"].dtype == "Int8" and decoded["a"].isna().tolist() == [False, True]
+    assert decoded["b"].isna().all()
+    assert decoded["c"].dtype == "Int32" and decoded["c"].tolist() == [1, 70_000]
+
+
+def test_sentinels_are_mapped_in_string_dtypes():
+    df = pd.DataFrame({"n": pd.Series(["1", "?", "3"], dtype="string[pyarrow]"),
+                       "t": pd.Series(["x", "NA", "y"], dtype="string")})
+    decoded, _ = decode_nans(df)
+
+    assert pd.api.types.is_numeric_dtype(decoded["n"]) and decoded["n"].isna().tolist() == [False, True, False]
+    assert decoded["t"].isna().tolist() == [False, True, False]
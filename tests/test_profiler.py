@@ -0,0 +1,52 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+import cca
+from profiler import MissingnessProfile, profile_csv
+
+
+def _csv(tmp_path, n=1_000):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=n), "b": rng.integers(0, 9, size=n), "c": rng.choice(["x", "y"], n)})
+    df = df.mask(rng.random(df.shape) < [0.2, 0.1, 0.3])
+    path = tmp_path / "data.csv"
+    df.to_csv(path, index=False)
+    return path, df
+
+
+def test_chunked_profile_matches_the_in_memory_statistics(tmp_path):
+    path, df = _csv(tmp_path)
+    reports = []
+
+    profile = profile_csv(path, chunksize=97, progress=lambda *report: reports.append(report))
+
+    assert profile.total_rows == len(df)
+    pd.testing.assert_series_equal(profile.nan_percentage_per_column(), cca.nan_percentage_per_column(df),
+                                   check_names=False)
+    assert profile.data_loss_percentage() == cca.data_loss_percentage(df)
+    patterns = profile.pattern_frequencies()
+    assert patterns["n_rows"].sum() == len(df) and patterns["n_rows"].is_monotonic_decreasing
+    assert patterns.loc[patterns["missing_columns"] == (), "n_rows"].item() == df.notna().all(axis=1).sum()
+    assert len(reports) == -(-len(df) // 97) and reports[-1] == (len(df), path.stat().st_size, path.stat().st_size)
+
+
+def test_merged_partial_profiles_equal_a_single_pass(tmp_path):
+    path, df = _csv(tmp_path)
+    whole = profile_csv(path, chunksize=250)
+
+    head = profile_csv(path, chunksize=64, nrows=400)
+    tail = profile_csv(io.BytesIO(path.read_bytes()), chunksize=64, skiprows=range(1, 401))
+
+    assert head + tail == whole
+    assert MissingnessProfile().merge(whole) == whole
+
+
+def test_custom_indicators_count_as_missing():
+    source = io.BytesIO(b"a,b\n1,?\n?,2\n3,4\n")
+
+    profile = profile_csv(source, nan_indicator=["?"])
+
+    assert profile.nan_counts == {"a": 1, "b": 1}
+    assert profile.rows_with_na == 2 and profile.data_loss_percentage() == 66.67
@@ -0,0 +1,63 @@
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from sketches import HeavyHitters, QuantileSketch
+
+
+def _partitions(values, parts):
+    return np.array_split(values, parts)
+
+
+def test_quantile_sketch_is_exact_while_small():
+    values = np.random.default_rng(0).normal(size=1001)
+    sketch = QuantileSketch.from_values(np.append(values, [np.nan, np.inf]), size=2048)
+
+    for q in (0.0, 0.1, 0.5, 0.9, 1.0):
+        assert sketch.quantile(q) == np.quantile(values, q)
+    assert sketch.median() == pd.Series(values).median()
+    assert np.isnan(QuantileSketch().median())
+
+
+def test_merged_quantile_sketch_stays_within_its_rank_error():
+    values = np.random.default_rng(1).lognormal(size=200_000)
+    size = 512
+    sketches = [QuantileSketch.from_values(part, size) for part in _partitions(values, 40)]
+    # Merged pairwise: log2(40) levels of compression
+    while len(sketches) > 1:
+        sketches = [reduce(QuantileSketch.merge, sketches[i:i + 2]) for i in range(0, len(sketches), 2)]
+    merged = sketches[0]
+
+    assert merged.count == len(values)
+    ordered = np.sort(values)
+    levels = int(np.ceil(np.log2(40))) + 1
+    for q in (0.01, 0.25, 0.5, 0.75, 0.99):
+        rank = np.searchsorted(ordered, merged.quantile(q)) / len(values)
+        assert abs(rank - q) <= levels / size
+
+
+def test_heavy_hitters_retain_the_mode_within_the_count_bound():
+    rng = np.random.default_rng(2)
+    # One value at 5% of the rows, the rest spread thinly over many values
+    values = np.concatenate([np.full(10_000, -1), rng.integers(0, 5_000, size=190_000)])
+    rng.shuffle(values)
+    capacity = 64
+    parts = [HeavyHitters.from_series(pd.Series(part), capacity) for part in _partitions(values, 25)]
+    merged = reduce(HeavyHitters.merge, parts)
+
+    true = pd.Series(values).value_counts()
+    bound = len(values) / (capacity + 1)
+    assert len(merged.counts) <= capacity
+    assert merged.mode() == -1
+    for value, count in merged.counts.items():
+        assert true[value] - bound <= count <= true[value]
+
+
+def test_heavy_hitters_are_exact_while_under_capacity():
+    column = pd.Series(["b", "a", None, "b", "a", "c"])
+    sketch = HeavyHitters.from_series(column[:3]) + HeavyHitters.from_series(column[3:])
+
+    assert sketch.counts == {"a": 2, "b": 2, "c": 1}
+    assert sketch.mode() == column.mode()[0] == "a"
+    assert HeavyHitters().mode() is None
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import visualizations as VG
+from missingness import missingness_index
+
+
+def _values(n=20_000, seed=0):
+    return np.random.default_rng(seed).gamma(2.0, size=n)
+
+
+def test_histogram_summary_matches_numpy_and_a_gaussian_kde():
+    from scipy.stats import gaussian_kde
+
+    values = _values()
+    counts, edges, kde_x, kde_y = VG.histogram_summary(values)
+
+    expected, expected_edges = np.histogram(values, bins=20)
+    np.testing.assert_allclose(edges, expected_edges)
+    # Values on a bin edge may land on either side of it in the finer binning
+    assert np.abs(counts - expected).sum() <= 2 and counts.sum() == len(values)
+
+    reference = gaussian_kde(values)(kde_x) * len(values) * (edges[1] - edges[0])
+    inside = (kde_x > edges[0] + 0.5) & (kde_x < edges[-1] - 0.5)
+    np.testing.assert_allclose(kde_y[inside], reference[inside], rtol=0.05, atol=0.002 * reference.max())
+
+    assert VG.histogram_summary(np.full(10, 3.0))[2:] == (None, None)
+
+
+def test_box_summary_matches_matplotlib():
+    from matplotlib.cbook import boxplot_stats
+
+    values = _values()
+    summary = VG.box_summary(np.sort(values))
+    expected = boxplot_stats(values)[0]
+
+    for key in ("med", "q1", "q3", "whislo", "whishi"):
+        assert summary[key] == pytest.approx(expected[key])
+    assert len(summary["fliers"]) == min(len(expected["fliers"]), VG.MAX_FLIERS)
+    assert set(summary["fliers"]) <= set(expected["fliers"])
+
+
+def test_qq_summary_matches_scipy_probplot():
+    from scipy.stats import probplot
+
+    values = _values(n=300)
+    theoretical, sample, slope, intercept = VG.qq_summary(np.sort(values))
+    (expected_x, expected_y), (expected_slope, expected_intercept, _) = probplot(values)
+
+    np.testing.assert_allclose(theoretical, expected_x)
+    np.testing.assert_allclose(sample, expected_y)
+    assert (slope, intercept) == pytest.approx((expected_slope, expected_intercept))
+    assert len(VG.qq_summary(np.sort(_values()))[0]) <= VG.QQ_POINTS
+
+
+def test_matrix_summary_gives_the_missing_share_per_row_band():
+    df = pd.DataFrame({"a": [np.nan, 1.0, np.nan, 1.0], "b": [1.0, 1.0, np.nan, np.nan]})
+
+    fraction = VG.matrix_summary(missingness_index(df), rows=2)
+
+    np.testing.assert_allclose(fraction, [[0.5, 0.0], [0.5, 1.0]])
+    np.testing.assert_allclose(VG.matrix_summary(missingness_index(df)), df.isnull().to_numpy())
+
+
+@pytest.mark.parametrize("method", VG.NUMERIC_METHODS + VG.CATEGORICAL_METHODS)
+def test_distribution_png_renders_every_method(method):
+    rng = np.random.default_rng(0)
+    if method in VG.NUMERIC_METHODS:
+        column = pd.Series(rng.normal(size=1_000), name="x")
+    else:
+        column = pd.Series(rng.choice(["a", "b", "c"], size=1_000), name="kind", dtype="category")
+
+    assert VG.distribution_png(column, method).startswith(b"\x89PNG")
+
+
+@pytest.mark.parametrize("method", VG.MISSINGNESS_METHODS)
+def test_missingness_png_renders_every_method(method):
+    df = pd.DataFrame({"a": [np.nan, 1.0, 2.0], "b": ["x", None, "y"]})
+    assert VG.missingness_png(df, method).startswith(b"\x89PNG")
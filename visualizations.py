@@ -2,16 +2,124 @@
 Description :   Generates visual comparisons like before/after histograms, boxplots, QQ plots, etc., to help users
                 visually validate cleaning methods.
 
+                Every plot is drawn from a pre-aggregated summary (binned counts, quantiles, value counts), never
+                from the raw rows, so plotting a 10M-row column costs about as much as plotting a small one.
+                Figures are built outside pyplot's global figure registry and are freed when dropped; use the
+                *_png functions to render straight to PNG bytes that can be cached. matplotlib, seaborn, scipy and
+                squarify are imported on the first plot, so importing this module stays cheap.
+
 Methods:    visualize_numeric_distribution(df: pd.DataFrame, column_name: str, method: str)
             visualize_categorical_distribution(df: pd.DataFrame, column_name: str, method: str):
+            visualize_missingness(df: pd.DataFrame, method: str)
+            distribution_png(column: pd.Series, method: str) -> bytes
+            missingness_png(df: pd.DataFrame, method: str) -> bytes
 """
+import io
 
-import matplotlib.pyplot as plt
-import seaborn as sns
-import scipy.stats as stats
+import numpy as np
 import pandas as pd
-import squarify
 
+from instrumentation import instrument
+from missingness import missingness_index
+
+NUMERIC_METHODS = ['box', 'hist', 'qq']
+CATEGORICAL_METHODS = ['pie', 'bar', 'heatmap', 'treemap']
+MISSINGNESS_METHODS = ['matrix', 'patterns']
+
+# Upper bounds on what is ever drawn, whatever the number of rows
+QQ_POINTS = 500
+MAX_FLIERS = 1000
+MATRIX_ROWS = 500
+MAX_PATTERNS = 20
+
+
+def _finite_values(column: pd.Series) -> np.ndarray:
+    values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+    return values[np.isfinite(values)]
+
+
+def _quantiles(ordered: np.ndarray, q) -> np.ndarray:
+    # Linear interpolation between order statistics, as np.quantile's default
+    position = np.asarray(q) * (len(ordered) - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+@instrument
+def histogram_summary(values: np.ndarray, bins: int = 20, subdivisions: int = 26):
+    """
+    Binned counts plus a Gaussian KDE (Scott's bandwidth) evaluated on a finer grid of binned counts and scaled
+    to the histogram's counts. Both come from a single binning pass.
+
+    Returns:
+    - counts, edges: Histogram of `bins` equal-width bins.
+    - kde_x, kde_y: KDE curve, or None when the data has no spread.
+    """
+    low, high = values.min(), values.max()
+    if low == high:
+        counts, edges = np.histogram(values, bins=bins)
+        return counts, edges, None, None
+
+    grid = bins * subdivisions
+    fine_counts, fine_edges = np.histogram(values, bins=grid, range=(low, high))
+    counts = fine_counts.reshape(bins, subdivisions).sum(axis=1)
+    edges = fine_edges[::subdivisions]
+
+    step = fine_edges[1] - fine_edges[0]
+    bandwidth = values.std() * len(values) ** (-1 / 5)
+    half_width = int(np.ceil(4 * bandwidth / step))
+    kernel = np.exp(-0.5 * (np.arange(-half_width, half_width + 1) * step / bandwidth) ** 2)
+    kernel /= kernel.sum()
+
+    smoothed = np.convolve(fine_counts, kernel, mode="full")[half_width:half_width + grid]
+    kde_x = (fine_edges[:-1] + fine_edges[1:]) / 2
+    kde_y = smoothed * subdivisions
+    return counts, edges, kde_x, kde_y
+
+
+@instrument
+def box_summary(ordered: np.ndarray) -> dict:
+    """
+    From sorted values: quartiles, 1.5 IQR whiskers and a capped, evenly spaced selection of fliers, in matplotlib's bxp format.
+    """
+    q1, median, q3 = _quantiles(ordered, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    first = np.searchsorted(ordered, q1 - 1.5 * iqr, side="left")
+    last = np.searchsorted(ordered, q3 + 1.5 * iqr, side="right") - 1
+    fliers = np.concatenate((ordered[:first], ordered[last + 1:]))
+    if len(fliers) > MAX_FLIERS:
+        fliers = fliers[np.linspace(0, len(fliers) - 1, MAX_FLIERS).astype(int)]
+    return {"med": median, "q1": q1, "q3": q3, "whislo": ordered[first], "whishi": ordered[last], "fliers": fliers}
+
+
+@instrument
+def qq_summary(ordered: np.ndarray, points: int = QQ_POINTS):
+    """
+    From sorted values: normal Q-Q points at up to `points` evenly spaced order statistics, using the same plotting positions as
+    scipy.stats.probplot, plus the least-squares line through them.
+
+    Returns:
+    - theoretical, sample: Q-Q points.
+    - slope, intercept: Fitted line.
+    """
+    n = len(ordered)
+    ranks = np.unique(np.linspace(1, n, min(points, n)).round().astype(np.int64))
+    sample = ordered[ranks - 1]
+
+    # Filliben's estimate of the order statistic medians
+    positions = (ranks - 0.3175) / (n + 0.365)
+    positions[ranks == n] = 0.5 ** (1.0 / n)
+    positions[ranks == 1] = 1 - 0.5 ** (1.0 / n)
+    from scipy.special import ndtri  # inverse of the standard normal CDF, as scipy.stats.norm.ppf
+
+    theoretical = ndtri(positions)
+
+    slope, intercept = np.polyfit(theoretical, sample, 1) if len(ranks) > 1 else (0.0, sample.mean())
+    return theoretical, sample, slope, intercept
+
+
+@instrument
 def visualize_numeric_distribution(df: pd.DataFrame, column_name: str, method: str):
     """
     Visualizes the distribution of a numeric column from the global DataFrame.
@@ -20,77 +128,205 @@ def visualize_numeric_distribution(df: pd.DataFrame, column_name: str, method: s
     - column_name (str): Name of the column in the global df.
     - method (str): One of 'box', 'hist', or 'qq'.
     """
-    column = df[column_name]
-    fig, ax = plt.subplots(figsize=(6, 4))  # create figure and axes
+    if method not in NUMERIC_METHODS:
+        raise ValueError("Invalid method. Use 'box', 'hist', or 'qq'.")
+
+    from matplotlib.figure import Figure
+
+    # Box and Q-Q read order statistics straight from one sort, which beats repeated selection on large columns
+    values = _finite_values(df[column_name])
+    fig = Figure(figsize=(6, 4))
+    ax = fig.subplots()
 
-    if method == "box":
-        sns.boxplot(x=column, color="skyblue", ax=ax)
+    if len(values) == 0:
+        ax.text(0.5, 0.5, "No observed values", ha="center", va="center", transform=ax.transAxes)
+        ax.set_title(column_name)
+
+    elif method == "box":
+        ax.bxp([box_summary(np.sort(values))], vert=False, showfliers=True, patch_artist=True,
+               boxprops={"facecolor": "skyblue"}, flierprops={"marker": "d", "markersize": 4})
+        ax.set_yticks([])
         ax.set_title(f"Box Plot - {column_name}")
         ax.set_xlabel(column_name)
 
     elif method == "hist":
-        sns.histplot(column, kde=True, bins=20, color="orange", edgecolor="black", ax=ax)
+        counts, edges, kde_x, kde_y = histogram_summary(values)
+        ax.stairs(counts, edges, fill=True, color="orange", alpha=0.75)
+        ax.stairs(counts, edges, color="black", linewidth=0.8)
+        if kde_x is not None:
+            ax.plot(kde_x, kde_y, color="darkorange")
         ax.set_title(f"Histogram with PDF - {column_name}")
         ax.set_xlabel(column_name)
         ax.set_ylabel("Frequency")
 
     elif method == "qq":
-        stats.probplot(column, dist="norm", plot=ax)
+        theoretical, sample, slope, intercept = qq_summary(np.sort(values))
+        ax.plot(theoretical, sample, "o", color="tab:blue", markersize=3)
+        ax.plot(theoretical, slope * theoretical + intercept, "r-")
+        ax.set_xlabel("Theoretical quantiles")
+        ax.set_ylabel("Ordered Values")
         ax.set_title(f"Q-Q Plot - {column_name}")
 
-    else:
-        raise ValueError("Invalid method. Use 'box', 'hist', or 'qq'.")
-
     ax.grid(True, linestyle="--", alpha=0.5)
     fig.tight_layout()
 
     return fig
 
 
+@instrument
 def visualize_categorical_distribution(df: pd.DataFrame, column_name: str, method: str):
     """
     Visualizes distribution of a categorical or mixed column from the global DataFrame.
 
     Parameters:
     - column_name (str): Name of the column in the global df.
-    - method (str): One of 'pie', 'bar', or 'heatmap'.
+    - method (str): One of 'pie', 'bar', 'heatmap' or 'treemap'.
     """
-    column = df[column_name]
-    fig, ax = plt.subplots(figsize=(6, 4))
+    if method not in CATEGORICAL_METHODS:
+        raise ValueError("Invalid method. Use 'pie', 'bar', 'heatmap' or 'treemap'.")
+
+    from matplotlib.figure import Figure
+    import seaborn as sns
+
+    # Categories with no rows (e.g. after CCA) are left out, as with an object column
+    counts = df[column_name].value_counts()
+    counts = counts[counts > 0]
 
     if method == 'pie':
-        counts = column.value_counts()
-        fig, ax = plt.subplots(figsize=(6, 6))
+        fig = Figure(figsize=(6, 6))
+        ax = fig.subplots()
         ax.pie(counts, labels=counts.index, autopct='%1.1f%%', startangle=90)
         ax.set_title(f"Pie Chart - {column_name}")
         ax.axis('equal')
 
     elif method == 'bar':
-        counts = column.value_counts()
-        sns.barplot(x=counts.index, y=counts.values, palette="pastel", ax=ax)
+        fig = Figure(figsize=(6, 4))
+        ax = fig.subplots()
+        palette = sns.color_palette("pastel", len(counts))
+        ax.bar(counts.index.astype(str), counts.values, color=palette)
         ax.set_title(f"Bar Plot - {column_name}")
         ax.set_xlabel(column_name)
         ax.set_ylabel("Count")
         ax.grid(True, linestyle="--", alpha=0.5)
 
     elif method == 'heatmap':
-        cross_tab = pd.crosstab(index=df[column_name], columns="count")
-        fig, ax = plt.subplots(figsize=(4, len(cross_tab) * 0.4 + 1))
+        cross_tab = counts.sort_index().to_frame(name="count")
+        fig = Figure(figsize=(4, len(cross_tab) * 0.4 + 1))
+        ax = fig.subplots()
         sns.heatmap(cross_tab, annot=True, fmt='d', cmap="YlGnBu", cbar=False, ax=ax)
         ax.set_title(f"Heatmap - Frequency of {column_name}")
         ax.set_ylabel(column_name)
 
     elif method == 'treemap':
-        counts = column.value_counts()
-        sizes = counts.values
+        import squarify
+
         labels = [f"{label}\n{count}" for label, count in zip(counts.index, counts.values)]
-        fig, ax = plt.subplots(figsize=(6, 4))
-        squarify.plot(sizes=sizes, label=labels, alpha=0.8, pad=True, ax=ax, color=sns.color_palette("pastel"))
+        fig = Figure(figsize=(6, 4))
+        ax = fig.subplots()
+        squarify.plot(sizes=counts.values, label=labels, alpha=0.8, pad=True, ax=ax,
+                      color=sns.color_palette("pastel"))
         ax.set_title(f"Treemap - Frequency of {column_name}")
         ax.axis('off')
 
+    fig.tight_layout()
+    return fig
+
+
+@instrument
+def matrix_summary(index, rows: int = MATRIX_ROWS) -> np.ndarray:
+    """
+    Missing fraction of every column within `rows` consecutive row bands, from a missingness index: rows are
+    counted per (band, pattern), then the pattern table turns those counts into missing counts per column.
+
+    Returns:
+    - np.ndarray: Array (bands, columns) of fractions in [0, 1].
+    """
+    bands = max(1, min(rows, index.n_rows))
+    n_patterns = len(index.pattern_counts)
+    band = np.arange(index.n_rows, dtype=np.int64) * bands // max(index.n_rows, 1)
+    per_pattern = np.bincount(band * n_patterns + index.row_patterns, minlength=bands * n_patterns)
+    per_pattern = per_pattern.reshape(bands, n_patterns)
+    missing = per_pattern @ index.pattern_masks.astype(np.int64)
+    return missing / np.maximum(per_pattern.sum(axis=1), 1)[:, None]
+
+
+@instrument
+def visualize_missingness(df: pd.DataFrame, method: str):
+    """
+    Visualizes where values are missing, from the dataframe's missingness index.
+
+    Parameters:
+    - df (pd.DataFrame): Dataframe to inspect.
+    - method (str): 'matrix' (missing share of every column along the rows, like missingno's matrix) or
+      'patterns' (the most frequent missingness patterns as a heatmap, with their row counts).
+    """
+    if method not in MISSINGNESS_METHODS:
+        raise ValueError("Invalid method. Use 'matrix' or 'patterns'.")
+
+    from matplotlib.figure import Figure
+
+    index = missingness_index(df)
+    width = max(6, len(index.columns) * 0.5)
+
+    if method == 'matrix':
+        fraction = matrix_summary(index)
+        fig = Figure(figsize=(width, 5))
+        ax = fig.subplots()
+        # Scaled to the densest band, so sparse missingness stays visible
+        image = ax.imshow(fraction, aspect="auto", cmap="Greys", vmin=0, vmax=max(fraction.max(), 1e-9),
+                          interpolation="nearest", extent=(-0.5, len(index.columns) - 0.5, index.n_rows, 0))
+        fig.colorbar(image, ax=ax, label="Missing share of rows")
+        ax.set_ylabel("Row")
+        ax.set_title(f"Missingness Matrix - {index.rows_with_missing():,} of {index.n_rows:,} rows incomplete")
+
     else:
-        raise ValueError("Invalid method. Use 'pie', 'bar', or 'heatmap'.")
+        order = np.argsort(-index.pattern_counts, kind="stable")[:MAX_PATTERNS]
+        fig = Figure(figsize=(width, len(order) * 0.35 + 1.5))
+        ax = fig.subplots()
+        ax.imshow(index.pattern_masks[order], aspect="auto", cmap="Greys", vmin=0, vmax=1,
+                  interpolation="nearest")
+        ax.set_yticks(range(len(order)))
+        ax.set_yticklabels([f"{count:,}" for count in index.pattern_counts[order]])
+        ax.set_ylabel("Rows with the pattern")
+        ax.set_title(f"Missingness Patterns - top {len(order)} of {len(index.pattern_counts)}")
 
+    ax.set_xticks(range(len(index.columns)))
+    ax.set_xticklabels([str(col) for col in index.columns], rotation=90)
     fig.tight_layout()
-    return fig
\ No newline at end of file
+    return fig
+
+
+@instrument
+def figure_to_png(fig, dpi: int = 100) -> bytes:
+    """
+    Renders a figure to PNG bytes.
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi)
+    return buffer.getvalue()
+
+
+@instrument
+def distribution_png(column: pd.Series, method: str) -> bytes:
+    """
+    Renders the distribution of one column to PNG bytes. The output depends only on the column's values and
+    the method, so it can be cached on (column fingerprint, method), e.g. with cache.ResultCache.call.
+
+    Parameters:
+    - column (pd.Series): Column to plot; its name is used in the titles.
+    - method (str): One of NUMERIC_METHODS for numeric columns or CATEGORICAL_METHODS otherwise.
+    """
+    df = column.to_frame()
+    if method in NUMERIC_METHODS:
+        fig = visualize_numeric_distribution(df, column.name, method)
+    else:
+        fig = visualize_categorical_distribution(df, column.name, method)
+    return figure_to_png(fig)
+
+
+@instrument
+def missingness_png(df: pd.DataFrame, method: str) -> bytes:
+    """
+    Renders visualize_missingness to PNG bytes; cacheable on (frame fingerprint, method) like distribution_png.
+    """
+    return figure_to_png(visualize_missingness(df, method))